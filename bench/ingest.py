@@ -0,0 +1,70 @@
+"""CSV ingest throughput: one pd.read_csv call (the previous path) against
+read_csv_spool fanning the file out across the process pool.
+
+    python bench/ingest.py --rows 2000000 --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def write_csv(path: str, rows: int):
+    rng = np.random.default_rng(0)
+    pd.DataFrame({
+        "id": np.arange(rows),
+        "value": rng.normal(size=rows),
+        "amount": rng.uniform(0, 1000, rows).round(2),
+        "category": rng.choice(["alpha", "beta", "gamma", "delta"], rows),
+        "flag": rng.integers(0, 2, rows).astype(bool),
+    }).to_csv(path, index=False)
+
+def best_of(repeat: int, func) -> float:
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    return min(seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-mb", type=float, default=16,
+                        help="chunk size; files of at least one chunk are split")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    os.environ["EDA_PROCESS_POOL_WORKERS"] = str(args.workers)
+    from services.csv_ingest import read_csv_spool
+    from services.executors import shutdown_process_pool
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.csv")
+        write_csv(path, args.rows)
+        megabytes = os.path.getsize(path) / 1e6
+        print(f"{args.rows} rows, {megabytes:.1f} MB, {args.workers} workers")
+
+        baseline = best_of(args.repeat, lambda: pd.read_csv(path))
+        print(f"pd.read_csv      {baseline:7.2f}s  {megabytes / baseline:8.1f} MB/s")
+
+        chunk_size = int(args.chunk_mb * 1024 * 1024)
+        stats = {}
+
+        def spool():
+            with open(path, "rb") as f:
+                stats.update(read_csv_spool(f, workers=args.workers, chunk_size=chunk_size,
+                                            min_parallel_bytes=chunk_size)[1])
+
+        spool()  # start the pool's workers outside the timing
+        parallel = best_of(args.repeat, spool)
+        print(f"read_csv_spool   {parallel:7.2f}s  {megabytes / parallel:8.1f} MB/s  "
+              f"({baseline / parallel:.2f}x, {stats['chunks']} chunks)")
+    shutdown_process_pool()
+
+if __name__ == "__main__":
+    main()
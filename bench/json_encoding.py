@@ -0,0 +1,72 @@
+"""Response encoding at 1M values: the previous per-value sanitize_dict walk plus
+json.dumps against services.json_encoding (dumps and streamed iter_json).
+
+    python bench/json_encoding.py --values 1000000
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.json_encoding import HAS_ORJSON, dumps, iter_json
+
+def sanitize_value(value):
+    """The replaced utils.sanitize_value"""
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            return None
+    return value
+
+def sanitize_dict(data):
+    """The replaced utils.sanitize_dict"""
+    if isinstance(data, dict):
+        return {k: sanitize_dict(v) for k, v in data.items()}
+    elif isinstance(data, list):
+        return [sanitize_dict(item) for item in data]
+    else:
+        return sanitize_value(data)
+
+def payloads(values: int):
+    rng = np.random.default_rng(0)
+    z_scores = rng.normal(size=values)
+    z_scores[::100] = np.nan
+    rows = values // 4
+    frame = pd.DataFrame({"a": rng.normal(size=rows), "b": rng.integers(0, 100, rows),
+                          "c": rng.choice(["x", "y", "z"], rows),
+                          "d": pd.date_range("2020-01-01", periods=rows, freq="min")})
+    frame.loc[::100, "a"] = np.nan
+    return {
+        "z_scores": ({"z_scores": z_scores.tolist()}, {"z_scores": z_scores}),
+        "records": ({"rows": frame.astype({"d": str}).to_dict(orient="records")}, {"rows": frame}),
+    }
+
+def best_of(repeat: int, func) -> float:
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    return min(seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--values", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(f"{args.values} values, orjson {'available' if HAS_ORJSON else 'not installed'}")
+    for name, (old_payload, new_payload) in payloads(args.values).items():
+        # The old path received plain lists and still had to be made JSON-safe
+        old = best_of(args.repeat, lambda: json.dumps(sanitize_dict(old_payload)).encode("utf-8"))
+        new = best_of(args.repeat, lambda: dumps(new_payload))
+        streamed = best_of(args.repeat, lambda: b"".join(iter_json(new_payload)))
+        print(f"{name:10} sanitize_dict {old:6.2f}s  dumps {new:6.2f}s ({old / new:5.1f}x)  "
+              f"iter_json {streamed:6.2f}s ({old / streamed:5.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# config.py
+# Runtime settings, overridable through environment variables
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Uploads are copied into a spooled temp file in chunks of this size
+UPLOAD_CHUNK_SIZE = int(os.getenv("EDA_UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+# Spooled uploads roll over from memory to disk above this size. Kept small: freeing a
+# large in-memory spool raises glibc's mmap threshold, after which the parser's column
+# buffers stay in the heap and peak RSS grows by about the size of the file
+UPLOAD_SPOOL_MAX_SIZE = int(os.getenv("EDA_UPLOAD_SPOOL_MAX_SIZE", 1024 * 1024))
+
+# Number of leading bytes used for encoding detection
+ENCODING_SAMPLE_SIZE = int(os.getenv("EDA_ENCODING_SAMPLE_SIZE", 64 * 1024))
+
+# Worker processes used for CPU-bound fan-out (parallel CSV parsing)
+PROCESS_POOL_WORKERS = int(os.getenv("EDA_PROCESS_POOL_WORKERS", os.cpu_count() or 1))
+
+# CSV files smaller than this are parsed on a single core
+PARALLEL_CSV_MIN_BYTES = int(os.getenv("EDA_PARALLEL_CSV_MIN_BYTES", 32 * 1024 * 1024))
+
+# Target size of each newline-aligned chunk handed to a parser process
+PARALLEL_CSV_CHUNK_SIZE = int(os.getenv("EDA_PARALLEL_CSV_CHUNK_SIZE", 16 * 1024 * 1024))
+
+# Compact dtypes (downcast numerics, categorical strings) right after parsing
+OPTIMIZE_DTYPES = os.getenv("EDA_OPTIMIZE_DTYPES", "1") == "1"
+
+# Object columns become 'category' when unique values / rows is at most this ratio
+CATEGORY_MAX_RATIO = float(os.getenv("EDA_CATEGORY_MAX_RATIO", 0.5))
+
+# Store remaining string columns as Arrow-backed strings (requires pyarrow)
+ARROW_STRINGS = os.getenv("EDA_ARROW_STRINGS", "0") == "1"
+
+# RAM budget for resident datasets; least recently used ones are spilled to disk beyond it
+DATASET_MEMORY_BUDGET = int(os.getenv("EDA_DATASET_MEMORY_BUDGET_MB", 2048)) * 1024 * 1024
+
+# Dataset catalog shared by every worker process
+DATABASE_URL = os.getenv("EDA_DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'eda.db')}")
+
+# Seconds a resident dataset is served without asking the catalog whether another
+# worker published a newer version (commits are still checked against the catalog)
+CATALOG_VERSION_CHECK_INTERVAL = float(os.getenv("EDA_CATALOG_VERSION_CHECK_INTERVAL", 1.0))
+
+# Shared directory holding dataset snapshots; evicted datasets are reloaded from here
+DATA_DIR = os.getenv("EDA_DATA_DIR", os.path.join(BASE_DIR, "data"))
+
+# Threads running CPU-heavy request handlers; bounds concurrent pandas/sklearn/matplotlib work
+CPU_WORKERS = int(os.getenv("EDA_CPU_WORKERS", os.cpu_count() or 1))
+
+# Rows parsed up front for the schema preview of a background ingest job
+INGEST_PREVIEW_ROWS = int(os.getenv("EDA_INGEST_PREVIEW_ROWS", 5000))
+
+# Minimum seconds between persisted progress updates of an ingest job
+INGEST_PROGRESS_INTERVAL = float(os.getenv("EDA_INGEST_PROGRESS_INTERVAL", 0.5))
+
+# Finished ingest jobs are kept for this many hours
+INGEST_JOB_RETENTION_HOURS = int(os.getenv("EDA_INGEST_JOB_RETENTION_HOURS", 24))
+
+# Keep parsed Excel workbooks as columnar snapshots keyed by content hash, so re-uploads skip parsing
+EXCEL_CACHE = os.getenv("EDA_EXCEL_CACHE", "1") == "1"
+
+# Directory of the Excel columnar cache and the number of parsed workbooks kept in it
+EXCEL_CACHE_DIR = os.getenv("EDA_EXCEL_CACHE_DIR", os.path.join(DATA_DIR, "excel-cache"))
+EXCEL_CACHE_ENTRIES = int(os.getenv("EDA_EXCEL_CACHE_ENTRIES", 32))
+
+# Dataset profiles: histogram bins, top values per column, and the size (rows x columns)
+# above which columns are profiled in blocks across the process pool
+PROFILE_HISTOGRAM_BINS = int(os.getenv("EDA_PROFILE_HISTOGRAM_BINS", 20))
+PROFILE_TOP_K = int(os.getenv("EDA_PROFILE_TOP_K", 10))
+PROFILE_PARALLEL_MIN_CELLS = int(os.getenv("EDA_PROFILE_PARALLEL_MIN_CELLS", 5_000_000))
+
+# Row windows: largest page served by /rows, rows per streamed batch, and the RAM
+# budget for cached sort orders (one int64 per row per sorted column and version)
+ROWS_MAX_LIMIT = int(os.getenv("EDA_ROWS_MAX_LIMIT", 100_000))
+ROWS_BATCH_SIZE = int(os.getenv("EDA_ROWS_BATCH_SIZE", 2000))
+SORT_CACHE_BUDGET = int(os.getenv("EDA_SORT_CACHE_BUDGET_MB", 256)) * 1024 * 1024
+
+# JSON responses holding at least this many array values are streamed, encoded in chunks of
+# JSON_STREAM_CHUNK_VALUES values instead of being rendered into one buffer
+JSON_STREAM_MIN_VALUES = int(os.getenv("EDA_JSON_STREAM_MIN_VALUES", 200_000))
+JSON_STREAM_CHUNK_VALUES = int(os.getenv("EDA_JSON_STREAM_CHUNK_VALUES", 65_536))
+
+# Approximate statistics: build per-column sketches at ingest (KLL quantiles with k items
+# per level, HyperLogLog with 2**precision registers, count-min width x depth for top values)
+SKETCHES_AT_INGEST = os.getenv("EDA_SKETCHES_AT_INGEST", "1") == "1"
+SKETCH_KLL_K = int(os.getenv("EDA_SKETCH_KLL_K", 200))
+SKETCH_HLL_PRECISION = int(os.getenv("EDA_SKETCH_HLL_PRECISION", 14))
+SKETCH_CMS_WIDTH = int(os.getenv("EDA_SKETCH_CMS_WIDTH", 2048))
+SKETCH_CMS_DEPTH = int(os.getenv("EDA_SKETCH_CMS_DEPTH", 4))
+SKETCH_TOP_K = int(os.getenv("EDA_SKETCH_TOP_K", 10))
+
+# Outlier detections kept server-side for /api/outliers/handle: RAM budget of the
+# in-process cache (masks are also saved next to the dataset's snapshots)
+DETECTION_CACHE_BUDGET = int(os.getenv("EDA_DETECTION_CACHE_MB", 64)) * 1024 * 1024
+
+# Batch outlier detection converts columns to float64 blocks of at most this many
+# bytes, so its working memory does not grow with the row count
+OUTLIER_BLOCK_BYTES = int(os.getenv("EDA_OUTLIER_BLOCK_MB", 64)) * 1024 * 1024
+
+# Saved detections kept per dataset on disk, least recently used removed first
+# (detections of older versions are always removed)
+DETECTIONS_PER_DATASET = int(os.getenv("EDA_DETECTIONS_PER_DATASET", 32))
+
+# Isolation forest: rows sampled to fit it, rows scored per chunk, parallel scoring
+# threads, and fitted forests (with their scores) kept per dataset version
+ISOLATION_FIT_ROWS = int(os.getenv("EDA_ISOLATION_FIT_ROWS", 100_000))
+ISOLATION_CHUNK_ROWS = int(os.getenv("EDA_ISOLATION_CHUNK_ROWS", 250_000))
+ISOLATION_N_JOBS = int(os.getenv("EDA_ISOLATION_N_JOBS", os.cpu_count() or 1))
+ISOLATION_CACHE_ENTRIES = int(os.getenv("EDA_ISOLATION_CACHE_ENTRIES", 8))
+
+# Fraction of rows an isolation forest flags unless the request sets one; sklearn's
+# "auto" offset flags about a fifth of plain Gaussian data
+ISOLATION_CONTAMINATION = float(os.getenv("EDA_ISOLATION_CONTAMINATION", 0.01))
+
+# Rendered charts kept per dataset version and chart spec (RAM budget of the LRU)
+CHART_CACHE_BUDGET = int(os.getenv("EDA_CHART_CACHE_MB", 64)) * 1024 * 1024
+
+# Chart rendering: pre-warmed worker processes (0 renders in the CPU thread pool) and the
+# seconds after which a render is killed. Each worker holds its own plotting stack
+# (~170 MB) in every app process, so the default stays small whatever the core count
+CHART_RENDER_WORKERS = int(os.getenv("EDA_CHART_RENDER_WORKERS", 2))
+CHART_RENDER_TIMEOUT = float(os.getenv("EDA_CHART_RENDER_TIMEOUT", 30))
+
+# Chart data reduction: line charts above CHART_LINE_MAX_POINTS rows are decimated
+# (lttb or minmax), scatter charts above CHART_SCATTER_MAX_POINTS become a 2-D density
+# of CHART_DENSITY_BINS bins per axis (a sample when there is a hue), and bar, box and
+# histogram charts above CHART_AGGREGATE_MIN_ROWS rows are drawn from pre-aggregated values
+CHART_LINE_MAX_POINTS = int(os.getenv("EDA_CHART_LINE_MAX_POINTS", 2000))
+CHART_LINE_REDUCTION = os.getenv("EDA_CHART_LINE_REDUCTION", "lttb")
+CHART_SCATTER_MAX_POINTS = int(os.getenv("EDA_CHART_SCATTER_MAX_POINTS", 50_000))
+CHART_DENSITY_BINS = int(os.getenv("EDA_CHART_DENSITY_BINS", 256))
+CHART_AGGREGATE_MIN_ROWS = int(os.getenv("EDA_CHART_AGGREGATE_MIN_ROWS", 100_000))
+
+# Batch chart requests: most charts per request and most columns in a pair grid
+CHART_BATCH_MAX_CHARTS = int(os.getenv("EDA_CHART_BATCH_MAX_CHARTS", 64))
+PAIR_GRID_MAX_COLUMNS = int(os.getenv("EDA_PAIR_GRID_MAX_COLUMNS", 8))
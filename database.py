@@ -0,0 +1,44 @@
+# database.py
+from datetime import datetime
+from sqlalchemy import create_engine, BigInteger, Column, DateTime, Integer, String, Text
+from sqlalchemy.orm import declarative_base, sessionmaker
+from config import DATABASE_URL
+
+connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(DATABASE_URL, connect_args=connect_args)
+SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+Base = declarative_base()
+
+class DatasetRecord(Base):
+    """Catalog row for one dataset; the frames themselves live in snapshot files"""
+    __tablename__ = "datasets"
+
+    id = Column(String(36), primary_key=True)
+    filename = Column(String(255))
+    actions = Column(Text, default="[]")
+    version = Column(Integer, nullable=False, default=0)
+    schema = Column(Text)
+    snapshot_path = Column(String(1024))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class IngestJobRecord(Base):
+    """Progress of a background upload, readable from any worker"""
+    __tablename__ = "ingest_jobs"
+
+    id = Column(String(36), primary_key=True)
+    filename = Column(String(255))
+    status = Column(String(16), nullable=False, default="queued")
+    phase = Column(String(32), nullable=False, default="queued")
+    bytes_total = Column(BigInteger, default=0)
+    bytes_read = Column(BigInteger, default=0)
+    rows = Column(BigInteger)
+    preview = Column(Text)
+    file_id = Column(String(36))
+    result = Column(Text)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+def init_db():
+    Base.metadata.create_all(bind=engine)
@@ -2,6 +2,11 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import logging
+from state import data_store
+from services.json_encoding import NaNSafeJSONResponse
+from services.chart_cache import charts
+from services.chart_render import renderer
+from services.executors import shutdown_process_pool
 
 # Import routers
 from routers.file_upload import router as upload_router
@@ -23,7 +28,9 @@ app = FastAPI(
     version="1.0.0",
     openapi_url="/api/openapi.json",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    # NaN/Inf become null instead of failing the response
+    default_response_class=NaNSafeJSONResponse
 )
 
 # Add CORS middleware
@@ -38,6 +45,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the dashboard read chart ETags and send them back in If-None-Match
+    expose_headers=["ETag", "X-Dataset-Version", "X-Chart-Reduction", "X-Chart-Timings"],
 )
 
 # Register routers
@@ -49,6 +58,20 @@ app.include_router(visualization_router, prefix="/api/visualization", tags=["Vis
 app.include_router(download_router, prefix="/api/download", tags=["Download"])
 app.include_router(report_router, prefix="/api/report", tags=["Report"])
 
+# Chart workers are started with the app so the first render finds them warm
+@app.on_event("startup")
+def start_chart_renderer():
+    renderer.warm()
+
+@app.on_event("shutdown")
+def stop_chart_renderer():
+    renderer.shutdown()
+
+# Spawned parser/profile workers would otherwise outlive a reload
+@app.on_event("shutdown")
+def stop_process_pool():
+    shutdown_process_pool()
+
 # Root endpoint
 @app.get("/", tags=["Root"])
 def root():
@@ -57,7 +80,8 @@ def root():
 # Health check
 @app.get("/health", tags=["Health"])
 def health_check():
-    return {"status": "healthy", "version": app.version}
+    return {"status": "healthy", "version": app.version, "data_store": data_store.stats(),
+            "chart_cache": charts.stats()}
 
 # Global exception handler
 @app.exception_handler(Exception)
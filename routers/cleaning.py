@@ -3,7 +3,15 @@ from pydantic import BaseModel
 from state import data_store
 import pandas as pd
 import logging
-from typing import List, Optional
+from services.dtype_optimizer import fillna_compact
+from services.dataset import working_copy, commit_version
+from services.catalog import DatasetConflictError
+from services.column_stats import column_stats
+from services.executors import run_cpu
+from services.locks import dataset_lock
+from services.json_encoding import render_json
+from services.imputation import apply_fills, fill_plan, fill_values
+from typing import Any, Dict, List, Optional
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -19,100 +27,180 @@ class FillMissingRequest(BaseModel):
     method: str
     custom_value: Optional[str] = None
 
+class FillMissingBatchRequest(BaseModel):
+    file_id: str
+    columns: Dict[str, str] = {}  # column -> mean/median/mode/custom
+    # column kind (numeric/categorical/datetime) -> method, for all other columns with missing values
+    rules: Dict[str, str] = {}
+    custom_values: Dict[str, Any] = {}  # by column, or by kind for rules
+    group_by: Optional[List[str]] = None  # fill from each row's group, e.g. group median
+
+def _remove_columns(request: RemoveColumnsRequest):
+    file_id = request.file_id
+    columns = request.columns
+    
+    if file_id not in data_store:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    df = data_store[file_id]["current_df"]
+    
+    # Validate columns exist in dataframe
+    missing_cols = [col for col in columns if col not in df.columns]
+    if missing_cols:
+        raise HTTPException(status_code=400, detail=f"Columns not found: {', '.join(missing_cols)}")
+    
+    # Remove columns
+    df = df.drop(columns=columns)
+    
+    # Publish new version and log action
+    action = f"Removed columns: {', '.join(columns)}"
+    entry = data_store[file_id]
+    commit_version(entry, df, action, touched=columns)
+    stats = column_stats(entry)
+    
+    return {
+        "status": "success",
+        "remaining_columns": list(df.columns),
+        "dtypes": {col: s["dtype"] for col, s in stats.items()},
+        "null_counts": {col: s["null_count"] for col, s in stats.items()},
+        "head": df.head().to_dict(orient="records"),
+        "shape": list(df.shape),
+        "action": action
+    }
+
 @router.post("/remove_columns")
 async def remove_columns(request: RemoveColumnsRequest):
     try:
-        file_id = request.file_id
-        columns = request.columns
-        
-        if file_id not in data_store:
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        df = data_store[file_id]["current_df"]
-        
-        # Validate columns exist in dataframe
-        missing_cols = [col for col in columns if col not in df.columns]
-        if missing_cols:
-            raise HTTPException(status_code=400, detail=f"Columns not found: {', '.join(missing_cols)}")
-        
-        # Remove columns
-        df = df.drop(columns=columns)
-        data_store[file_id]["current_df"] = df
-        
-        # Log action
-        action = f"Removed columns: {', '.join(columns)}"
-        data_store[file_id]["actions"].append(action)
-        
-        return {
-            "status": "success",
-            "remaining_columns": list(df.columns),
-            "dtypes": df.dtypes.astype(str).to_dict(),
-            "null_counts": df.isnull().sum().to_dict(),
-            "head": df.head().to_dict(orient="records"),
-            "shape": list(df.shape),
-            "action": action
-        }
+        async with dataset_lock(request.file_id).writer():
+            return await run_cpu(render_json, _remove_columns, request)
     except HTTPException:
         raise  # Re-raise HTTP exceptions
+    except DatasetConflictError as e:
+        # Another worker committed first; the client can retry against the new version
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.exception(f"Column removal error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Column removal failed: {str(e)}")
 
-@router.post("/fill_missing")
-async def fill_missing(request: FillMissingRequest):
-    try:
-        file_id = request.file_id
-        column = request.column
-        method = request.method
-        custom_value = request.custom_value
+def _fill_missing(request: FillMissingRequest):
+    file_id = request.file_id
+    column = request.column
+    method = request.method
+    custom_value = request.custom_value
+    
+    if file_id not in data_store:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    df = working_copy(data_store[file_id])
+    
+    # Validate column exists
+    if column not in df.columns:
+        raise HTTPException(status_code=400, detail=f"Column '{column}' not found")
+    
+    # Fill missing values with validation
+    if method == 'mean':
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            raise HTTPException(status_code=400, detail=f"Column '{column}' must be numeric for mean imputation")
+        df[column] = fillna_compact(df[column], df[column].mean())
         
-        if file_id not in data_store:
-            raise HTTPException(status_code=404, detail="File not found")
+    elif method == 'median':
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            raise HTTPException(status_code=400, detail=f"Column '{column}' must be numeric for median imputation")
+        df[column] = fillna_compact(df[column], df[column].median())
         
-        df = data_store[file_id]["current_df"]
+    elif method == 'mode':
+        mode_series = df[column].mode()
+        if len(mode_series) == 0:
+            raise HTTPException(status_code=400, detail=f"Column '{column}' has no mode value")
+        df[column] = fillna_compact(df[column], mode_series[0])
         
-        # Validate column exists
-        if column not in df.columns:
-            raise HTTPException(status_code=400, detail=f"Column '{column}' not found")
+    elif method == 'custom':
+        if custom_value is None:
+            raise HTTPException(status_code=400, detail="Custom value required for custom imputation")
+        df[column] = fillna_compact(df[column], custom_value)
         
-        # Fill missing values with validation
-        if method == 'mean':
-            if not pd.api.types.is_numeric_dtype(df[column]):
-                raise HTTPException(status_code=400, detail=f"Column '{column}' must be numeric for mean imputation")
-            df[column] = df[column].fillna(df[column].mean())
-            
-        elif method == 'median':
-            if not pd.api.types.is_numeric_dtype(df[column]):
-                raise HTTPException(status_code=400, detail=f"Column '{column}' must be numeric for median imputation")
-            df[column] = df[column].fillna(df[column].median())
-            
-        elif method == 'mode':
-            mode_series = df[column].mode()
-            if len(mode_series) == 0:
-                raise HTTPException(status_code=400, detail=f"Column '{column}' has no mode value")
-            df[column] = df[column].fillna(mode_series[0])
-            
-        elif method == 'custom':
-            if custom_value is None:
-                raise HTTPException(status_code=400, detail="Custom value required for custom imputation")
-            df[column] = df[column].fillna(custom_value)
-            
-        else:
-            raise HTTPException(status_code=400, detail=f"Invalid method: {method}")
-        
-        # Log action
-        action = f"Filled missing values in {column} using {method}"
-        data_store[file_id]["actions"].append(action)
-        
-        return {
-            "status": "success",
-            "null_counts": df.isnull().sum().to_dict(),
-            "head": df.head().to_dict(orient="records"),
-            "shape": list(df.shape),
-            "action": action
-        }
+    else:
+        raise HTTPException(status_code=400, detail=f"Invalid method: {method}")
+    
+    # Publish new version and log action
+    action = f"Filled missing values in {column} using {method}"
+    entry = data_store[file_id]
+    commit_version(entry, df, action, touched=[column])
+    
+    return {
+        "status": "success",
+        "null_counts": {col: s["null_count"] for col, s in column_stats(entry).items()},
+        "head": df.head().to_dict(orient="records"),
+        "shape": list(df.shape),
+        "action": action
+    }
+
+@router.post("/fill_missing")
+async def fill_missing(request: FillMissingRequest):
+    try:
+        async with dataset_lock(request.file_id).writer():
+            return await run_cpu(render_json, _fill_missing, request)
     except HTTPException:
         raise  # Re-raise HTTP exceptions
+    except DatasetConflictError as e:
+        # Another worker committed first; the client can retry against the new version
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.exception(f"Fill missing error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Fill missing failed: {str(e)}")
+
+def _fill_missing_batch(request: FillMissingBatchRequest):
+    file_id = request.file_id
+    if file_id not in data_store:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    entry = data_store[file_id]
+    df = working_copy(entry)
+    group_by = request.group_by or []
+    missing_cols = [col for col in group_by if col not in df.columns]
+    if missing_cols:
+        raise HTTPException(status_code=400, detail=f"Group columns not found: {', '.join(missing_cols)}")
+    if not request.columns and not request.rules:
+        raise HTTPException(status_code=400, detail="Provide columns and/or rules")
+
+    # Null counts come from the cached column stats instead of a fresh scan
+    null_counts = {col: s["null_count"] for col, s in column_stats(entry).items()}
+    try:
+        plan = fill_plan(df, null_counts, request.columns, request.rules, exclude=group_by)
+        values, grouped = fill_values(df, plan, request.custom_values, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filled = apply_fills(df, values, null_counts, grouped)
+
+    if plan:
+        grouping = f" by {', '.join(group_by)}" if group_by else ""
+        action = "Filled missing values" + grouping + ": " + ", ".join(f"{col} ({method})" for col, method in plan.items())
+        commit_version(entry, df, action, touched=list(plan))
+    else:
+        action = "No missing values to fill"
+
+    return {
+        "status": "success",
+        "version": entry.get("version", 0),
+        "methods": plan,
+        "fill_values": values,
+        "filled": filled,
+        "null_counts": {col: s["null_count"] for col, s in column_stats(entry).items()},
+        "head": df.head().to_dict(orient="records"),
+        "shape": list(df.shape),
+        "action": action
+    }
+
+@router.post("/fill_missing_batch")
+async def fill_missing_batch(request: FillMissingBatchRequest):
+    try:
+        async with dataset_lock(request.file_id).writer():
+            return await run_cpu(render_json, _fill_missing_batch, request)
+    except HTTPException:
+        raise  # Re-raise HTTP exceptions
+    except DatasetConflictError as e:
+        # Another worker committed first; the client can retry against the new version
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Batch fill missing error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Batch fill missing failed: {str(e)}")
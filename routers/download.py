@@ -3,16 +3,18 @@ from state import data_store
 import pandas as pd
 from io import BytesIO
 from fastapi.responses import StreamingResponse
+from services.executors import run_cpu
+from services.locks import dataset_lock
 
 
 router = APIRouter()
 
-@router.get("/{file_id}")
-async def download_cleaned_data(file_id: str):
+def _export_workbook(file_id: str):
     if file_id not in data_store:
         raise HTTPException(404, "File not found")
     
-    df = data_store[file_id]["current_df"]
+    data = data_store[file_id]
+    df = data["current_df"]
     output = BytesIO()
     
     with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
@@ -21,15 +23,21 @@ async def download_cleaned_data(file_id: str):
         metadata = pd.DataFrame({
             'Property': ['Original Filename', 'Processing Date', 'Actions Performed'],
             'Value': [
-                data_store[file_id]['filename'],
+                data['filename'],
                 pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
-                '; '.join(data_store[file_id]['actions'])
+                '; '.join(data['actions'])
             ]
         })
         metadata.to_excel(writer, index=False, sheet_name='Metadata')
     
     output.seek(0)
-    filename = f"cleaned_{data_store[file_id]['filename']}.xlsx"
+    return output, data['filename']
+
+@router.get("/{file_id}")
+async def download_cleaned_data(file_id: str):
+    async with dataset_lock(file_id).reader():
+        output, original_filename = await run_cpu(_export_workbook, file_id)
+    filename = f"cleaned_{original_filename}.xlsx"
     
     return StreamingResponse(
         output,
@@ -1,8 +1,20 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-import pandas as pd
-from io import BytesIO
-import chardet
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi.responses import JSONResponse
+import asyncio
+import io
+import logging
 import uuid
+from typing import List, Optional
+from services.file_handling import spool_upload
+from services.csv_ingest import read_csv_spool
+from services.excel_ingest import read_excel_spool, SheetNotFoundError
+from services.dtype_optimizer import optimize_dtypes
+from services.dataset import new_dataset
+from services.column_stats import column_stats
+from services.sketches import column_sketches
+from services.executors import run_cpu
+from services.ingest_jobs import create_job, get_job
+from config import OPTIMIZE_DTYPES, INGEST_PREVIEW_ROWS, SKETCHES_AT_INGEST
 
 # Import data store
 try:
@@ -11,47 +23,112 @@ except ImportError:
     data_store = {}
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Running background ingests; holding the tasks keeps them from being garbage collected
+_ingest_tasks = set()
+
+def _ingest_upload(spool, filename: str, progress=None, sheets: Optional[List[str]] = None):
+    """Parse a spooled upload, compact its dtypes and store it; runs in the CPU executor.
+    progress(phase, **fields) receives phase changes, counters and a schema preview."""
+    if filename.lower().endswith(('.xlsx', '.xls')):
+        df, ingest = read_excel_spool(spool, filename, sheets=sheets, progress=progress,
+                                      preview_rows=INGEST_PREVIEW_ROWS if progress else 0)
+    else:
+        df, ingest = read_csv_spool(spool, progress=progress,
+                                    preview_rows=INGEST_PREVIEW_ROWS if progress else 0)
+
+    memory = None
+    if OPTIMIZE_DTYPES:
+        if progress:
+            progress("type_optimization")
+        df, memory = optimize_dtypes(df)
+
+    entry = new_dataset(df, filename, memory=memory)
+    if SKETCHES_AT_INGEST:
+        # One pass now makes approx=true quantile/distinct/top-k queries free later
+        if progress:
+            progress("sketching")
+        column_sketches(entry)
+
+    if progress:
+        progress("storing")
+    stats = column_stats(entry)
+
+    # Generate file ID and store
+    file_id = str(uuid.uuid4())
+    data_store[file_id] = entry
+    return file_id, df, ingest, memory, stats
+
+async def _run_ingest_job(job, spool, filename: str, sheets: Optional[List[str]]):
+    try:
+        with spool:
+            file_id, df, ingest, memory, _ = await run_cpu(_ingest_upload, spool, filename, job.update, sheets)
+        job.finish(file_id, {"shape": list(df.shape), "ingest": ingest, "memory": memory})
+        logger.info(f"Ingest job {job.job_id} stored {filename} as {file_id}")
+    except Exception as e:
+        logger.error(f"Ingest job {job.job_id} failed: {str(e)}", exc_info=True)
+        job.fail(f"File processing error: {str(e)}")
 
 @router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), background: bool = False,
+                      sheets: Optional[List[str]] = Query(None)):
+    """Parse and store an upload. With background=true the file is only spooled
+    here; parsing continues in the worker pool and the response carries a job id
+    to poll at /api/upload/jobs/{job_id}. For workbooks, repeat sheets=<name> to
+    pick sheets (sheets=* for all); several sheets are stacked with a 'sheet' column."""
     try:
-        contents = await file.read()
-        if file.filename.lower().endswith(('.csv', '.txt')):
-            encoding = chardet.detect(contents)['encoding'] or 'utf-8'
+        if not file.filename.lower().endswith(('.csv', '.txt', '.xlsx', '.xls')):
+            raise HTTPException(status_code=400, detail="Unsupported file type. Supported: CSV, Excel")
+
+        if background:
+            spool = await spool_upload(file)
             try:
-                file_content = contents.decode(encoding)
+                size = spool.seek(0, io.SEEK_END)
+                spool.seek(0)
+                job = create_job(file.filename, size)
             except Exception:
-                file_content = contents.decode('utf-8', errors='replace')
-            file_like = BytesIO(file_content.encode('utf-8'))
-        else:
-            file_like = BytesIO(contents)
-
-        # Read into DataFrame
-        if file.filename.lower().endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file_like)
-        elif file.filename.lower().endswith(('.csv', '.txt')):
-            df = pd.read_csv(file_like)
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file type. Supported: CSV, Excel")
+                spool.close()
+                raise
+            task = asyncio.create_task(_run_ingest_job(job, spool, file.filename, sheets))
+            _ingest_tasks.add(task)
+            task.add_done_callback(_ingest_tasks.discard)
+            return JSONResponse(status_code=202, content={
+                "job_id": job.job_id,
+                "filename": file.filename,
+                "status": "queued",
+                "status_url": f"/api/upload/jobs/{job.job_id}"
+            })
 
-        # Generate file ID and store
-        file_id = str(uuid.uuid4())
-        data_store[file_id] = {
-            "original_df": df,
-            "current_df": df.copy(),
-            "filename": file.filename,  # ✅ Add filename here
-            "actions": []
-        }
+        # Spool the upload to disk in chunks instead of holding it in memory
+        with await spool_upload(file) as spool:
+            file_id, df, ingest, memory, stats = await run_cpu(_ingest_upload, spool, file.filename, sheets=sheets)
 
         return {
             "file_id": file_id,
             "filename": file.filename,
+            "version": 0,
             "columns": list(df.columns),
-            "dtypes": df.dtypes.astype(str).to_dict(),
-            "null_counts": df.isnull().sum().to_dict(),
+            "dtypes": {col: s["dtype"] for col, s in stats.items()},
+            "null_counts": {col: s["null_count"] for col, s in stats.items()},
             "head": df.head().to_dict(orient="records"),
-            "shape": list(df.shape)
+            "shape": list(df.shape),
+            "ingest": ingest,
+            "memory": memory
         }
 
+    except HTTPException:
+        raise
+    except SheetNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"File processing error: {str(e)}")
+
+@router.get("/upload/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Phase, bytes and rows processed, schema preview and, once done, the file_id"""
+    # A single indexed read; kept off the CPU pool so polling never queues behind an ingest
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job
@@ -1,103 +1,325 @@
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from state import data_store
 import pandas as pd
 import numpy as np
 import logging
+from services.dataset import working_copy, commit_version
+from services.catalog import DatasetConflictError
+from services.executors import run_cpu
+from services.locks import dataset_lock
+from services.sketches import column_sketches
+from services.json_encoding import render_json
+from services.outlier_detection import (BATCH_METHODS, GROUPED_METHODS, compact_mask, detect_batch,
+                                        grouped_outliers, isolation_forest, numeric_columns)
+from services.detections import DetectionConflictError, detection_mask, load_detection, store_detection
+from services.column_stats import json_scalar
+from config import ISOLATION_CONTAMINATION
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 class DetectRequest(BaseModel):
     file_id: str
-    column: str
+    column: Optional[str] = None
     method: str
+    approx: bool = False
+    sample_size: int = 20
+    include_indices: bool = False  # also return every outlier label (and the scores)
+    # isolation_forest: feature columns (default: column) and forest parameters
+    columns: Optional[List[str]] = None
+    contamination: Optional[float] = Field(None, gt=0, le=0.5)  # None: ISOLATION_CONTAMINATION
+    n_estimators: int = 100
+    max_samples: int = 256
+    # iqr/zscore/mad: bounds per group of these columns and/or over a trailing
+    # window of rows (in dataset order); threshold defaults to 1.5 / 3 / 3.5
+    group_by: Optional[List[str]] = None
+    window: Optional[int] = None
+    threshold: Optional[float] = None
+
+class BatchDetectRequest(BaseModel):
+    file_id: str
+    columns: Optional[List[str]] = None  # None or ["*"]: every numeric column
+    methods: List[str] = list(BATCH_METHODS)
+    z_threshold: float = 3.0
+    approx: bool = False
+    include_masks: bool = True
 
 class HandleRequest(BaseModel):
     file_id: str
     action: str
-    column: str
-    outlier_indices: list
+    column: Optional[str] = None
+    outlier_indices: Optional[list] = None
+    # Handle the rows of a stored detection instead of posting outlier_indices;
+    # column/method pick the mask when the detection holds several
+    detection_id: Optional[str] = None
+    method: Optional[str] = None
 
-@router.post("/detect")
-async def detect_outliers(request: DetectRequest):
-    try:
-        file_id = request.file_id
-        column = request.column
-        method = request.method
+def _store_detection(file_id: str, entry, rows: int, masks):
+    """Save [(column, method, (encoding, data), lower, upper)] and return the detection_id"""
+    records = [
+        {"column": str(column), "method": method, "encoding": encoding, "data": data,
+         "lower_bound": json_scalar(lower), "upper_bound": json_scalar(upper)}
+        for column, method, (encoding, data), lower, upper in masks
+    ]
+    return store_detection(file_id, entry.get("version", 0), rows, records, data_store.catalog.directory(file_id))
+
+def _detect_outliers(request: DetectRequest):
+    file_id = request.file_id
+    column = request.column
+    method = request.method
+    
+    if file_id not in data_store:
+        raise HTTPException(404, "File not found")
+    
+    entry = data_store[file_id]
+    df = entry["current_df"]
+    features = request.columns or ([column] if column is not None else [])
+    if not features:
+        raise HTTPException(400, "column is required")
+    missing = [col for col in features if col not in df.columns]
+    if missing:
+        raise HTTPException(400, f"Columns not found: {', '.join(missing)}")
+    column = features[0]
+    values = df[column]
+    
+    if request.group_by or request.window or method == 'mad':
+        if method not in GROUPED_METHODS:
+            raise HTTPException(400, f"group_by/window need one of: {', '.join(GROUPED_METHODS)}")
+        if request.approx:
+            # Sketches summarize whole columns, not groups or windows
+            raise HTTPException(400, "approx is not supported with group_by, window or mad")
+        missing = [col for col in request.group_by or [] if col not in df.columns]
+        if missing:
+            raise HTTPException(400, f"Group columns not found: {', '.join(missing)}")
+        if request.window is not None and request.window < 1:
+            raise HTTPException(400, "window must be at least 1")
+        if column not in set(numeric_columns(df)):
+            raise HTTPException(400, f"Column '{column}' must be numeric")
+        grouped = grouped_outliers(df, column, method, request.group_by, request.window, request.threshold)
+        mask = grouped["mask"]
+        # Bounds vary per row, so the detection can be removed or marked but not capped
+        lower_bound = upper_bound = None
+        extra = {"group_by": request.group_by, "window": request.window, "groups": grouped["groups"]}
+        if request.include_indices:
+            extra.update(lower_bounds=grouped["lower"], upper_bounds=grouped["upper"])
+
+    elif method == 'iqr':
+        if request.approx:
+            # Quartiles from the column's quantile sketch instead of sorting it
+            sketch = column_sketches(entry, [column])[column]
+            if sketch.quantiles is None:
+                raise HTTPException(400, f"Column '{column}' must be numeric")
+            Q1, Q3 = (np.nan if q is None else q for q in sketch.quantiles.quantiles((0.25, 0.75)))
+        else:
+            Q1 = values.quantile(0.25)
+            Q3 = values.quantile(0.75)
+        IQR = Q3 - Q1
+        lower_bound = Q1 - 1.5 * IQR
+        upper_bound = Q3 + 1.5 * IQR
+        mask = ((values < lower_bound) | (values > upper_bound)).to_numpy(dtype=bool, na_value=False)
+        extra = {
+            "approximate": request.approx,
+            # Q1/Q3 are within this fraction of n ranks of the exact quartiles
+            "rank_error": sketch.quantiles.rank_error() if request.approx else 0.0
+        }
         
-        if file_id not in data_store:
-            raise HTTPException(404, "File not found")
+    elif method == 'zscore':
+        mean, std = values.mean(), values.std()
+        z_scores = ((values - mean) / std).to_numpy(dtype=np.float64, na_value=np.nan)
+        mask = np.abs(z_scores) > 3
+        # The same rule in column units, used when outliers are capped
+        lower_bound, upper_bound = mean - 3 * std, mean + 3 * std
+        # Arrays go to the response encoder as-is; it masks NaN and streams large ones
+        extra = {"z_scores": z_scores} if request.include_indices else {}
+
+    elif method == 'isolation_forest':
+        numeric = set(numeric_columns(df))
+        not_numeric = [col for col in features if col not in numeric]
+        if not_numeric:
+            raise HTTPException(400, f"Columns must be numeric: {', '.join(not_numeric)}")
+        # Fitted once per version, columns and parameters; later calls reuse the scores
+        forest = isolation_forest(df, features, (file_id, entry.get("version", 0)),
+                                  n_estimators=request.n_estimators, max_samples=request.max_samples,
+                                  contamination=request.contamination or ISOLATION_CONTAMINATION)
+        mask = forest["mask"]
+        column = ",".join(features)
+        lower_bound = upper_bound = None
+        extra = {"columns": features, "contamination": forest["contamination"], "threshold": forest["threshold"],
+                 "fit_rows": forest["fit_rows"], "cached": forest["cached"], "seconds": forest["seconds"]}
+        if request.include_indices:
+            extra["scores"] = forest["scores"]
         
-        df = data_store[file_id]["current_df"]
+    else:
+        raise HTTPException(400, f"Unsupported method: {method}")
+
+    # The mask stays on the server; /handle takes its detection_id
+    positions = np.flatnonzero(mask)
+    detection_id = _store_detection(file_id, entry, len(df), [(column, method, compact_mask(mask), lower_bound, upper_bound)])
+    result = {
+        "detection_id": detection_id,
+        "version": entry.get("version", 0),
+        "outlier_count": len(positions),
+        "lower_bound": lower_bound,
+        "upper_bound": upper_bound,
+        "outlier_sample": df.index[positions[:request.sample_size]]
+    }
+    if request.include_indices:
+        result["outlier_indices"] = df.index[positions]
+    result.update(extra)
+    return result
         
-        if method == 'iqr':
-            Q1 = df[column].quantile(0.25)
-            Q3 = df[column].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-            outliers = df[(df[column] < lower_bound) | (df[column] > upper_bound)]
-            outlier_indices = outliers.index.tolist()
-            
-            return {
-                "outlier_count": len(outlier_indices),
-                "outlier_indices": outlier_indices,
-                "lower_bound": lower_bound,
-                "upper_bound": upper_bound
-            }
-            
-        elif method == 'zscore':
-            z_scores = (df[column] - df[column].mean()) / df[column].std()
-            outlier_indices = np.where(np.abs(z_scores) > 3)[0].tolist()
-            
-            return {
-                "outlier_count": len(outlier_indices),
-                "outlier_indices": outlier_indices,
-                "z_scores": z_scores.tolist()
-            }
-            
-        else:
-            raise ValueError(f"Unsupported method: {method}")
-            
+
+@router.post("/detect")
+async def detect_outliers(request: DetectRequest):
+    try:
+        async with dataset_lock(request.file_id).reader():
+            return await run_cpu(render_json, _detect_outliers, request)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Outlier detection error: {str(e)}")
         raise HTTPException(500, f"Outlier detection failed: {str(e)}")
 
-@router.post("/handle")
-async def handle_outliers(request: HandleRequest):
+def _detect_batch(request: BatchDetectRequest):
+    file_id = request.file_id
+    if file_id not in data_store:
+        raise HTTPException(404, "File not found")
+
+    entry = data_store[file_id]
+    df = entry["current_df"]
+    unknown = [m for m in request.methods if m not in BATCH_METHODS]
+    if unknown or not request.methods:
+        raise HTTPException(400, f"Unsupported methods: {', '.join(unknown)}. Use: {', '.join(BATCH_METHODS)}")
+
+    numeric = numeric_columns(df)
+    if not request.columns or request.columns == ["*"]:
+        columns = numeric
+    else:
+        missing = [col for col in request.columns if col not in df.columns]
+        if missing:
+            raise HTTPException(400, f"Columns not found: {', '.join(missing)}")
+        numeric_set = set(numeric)
+        not_numeric = [col for col in request.columns if col not in numeric_set]
+        if not_numeric:
+            raise HTTPException(400, f"Columns must be numeric: {', '.join(not_numeric)}")
+        columns = list(dict.fromkeys(request.columns))
+
+    quartiles = None
+    if request.approx and "iqr" in request.methods:
+        # Quartiles from the per-column sketches; the masks still cover every row
+        sketches = column_sketches(entry, columns)
+        quartiles = {col: [np.nan if q is None else q for q in sketches[col].quantiles.quantiles((0.25, 0.75))]
+                     for col in columns}
+
+    masks = {}
+    results = detect_batch(df, columns, request.methods, request.z_threshold, quartiles,
+                           request.include_masks, compact_masks=masks)
+    detection_id = _store_detection(file_id, entry, len(df), [
+        (col, method, masks[(col, method)], result["lower_bound"], result["upper_bound"])
+        for col, by_method in results.items() for method, result in by_method.items()
+    ])
+    return {
+        "file_id": file_id,
+        "detection_id": detection_id,
+        "version": entry.get("version", 0),
+        "rows": len(df),
+        "approximate": quartiles is not None,
+        # Masks address row positions of this version (see outlier_detection.compact_mask)
+        "columns": results
+    }
+
+@router.post("/detect_batch")
+async def detect_outliers_batch(request: BatchDetectRequest):
     try:
-        file_id = request.file_id
-        action = request.action
-        column = request.column
-        outlier_indices = request.outlier_indices
-        
-        if file_id not in data_store:
-            raise HTTPException(404, "File not found")
-        
-        df = data_store[file_id]["current_df"]
-        
+        async with dataset_lock(request.file_id).reader():
+            return await run_cpu(render_json, _detect_batch, request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Batch outlier detection error: {str(e)}", exc_info=True)
+        raise HTTPException(500, f"Batch outlier detection failed: {str(e)}")
+
+def _handle_detection(request: HandleRequest, entry, df: pd.DataFrame):
+    """Apply the action to the rows of a stored detection; returns (df, column, touched)"""
+    detection = load_detection(request.file_id, request.detection_id, data_store.catalog.directory(request.file_id))
+    if detection is None:
+        raise HTTPException(404, "Detection not found or expired")
+    try:
+        mask, record = detection_mask(detection, entry.get("version", 0), request.column, request.method)
+    except DetectionConflictError as e:
+        raise HTTPException(409, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    # Multivariate detections are labelled "a,b" and have no bounds to cap to
+    column = {str(col): col for col in df.columns}.get(record["column"], record["column"])
+
+    if request.action == 'remove':
+        return df[~mask], column, None
+    if request.action == 'cap':
+        if column not in df.columns or (record["lower_bound"] is None and record["upper_bound"] is None):
+            raise HTTPException(400, f"Outliers from {record['method']} on {record['column']} cannot be capped")
+        # Flagged rows are clipped to the bounds they were detected with
+        df[column] = df[column].where(~mask, df[column].clip(record["lower_bound"], record["upper_bound"]))
+        return df, column, [column]
+    if request.action == 'mark':
+        df['is_outlier'] = mask.astype(np.int8)
+        return df, column, ['is_outlier']
+    raise HTTPException(400, f"Unsupported action: {request.action}")
+
+def _handle_outliers(request: HandleRequest):
+    file_id = request.file_id
+    action = request.action
+    column = request.column
+    outlier_indices = request.outlier_indices
+    
+    if file_id not in data_store:
+        raise HTTPException(404, "File not found")
+    
+    entry = data_store[file_id]
+    df = working_copy(entry)
+    
+    if request.detection_id:
+        df, column, touched = _handle_detection(request, entry, df)
+    elif outlier_indices is None or column is None:
+        raise HTTPException(400, "Provide a detection_id, or column and outlier_indices")
+    else:
+        # Columns whose values change; removing rows changes all of them
+        touched = None
         if action == 'remove':
             df = df.drop(index=outlier_indices)
         elif action == 'cap':
             lower_bound = df[column].quantile(0.05)
             upper_bound = df[column].quantile(0.95)
-            df.loc[df[column] < lower_bound, column] = lower_bound
-            df.loc[df[column] > upper_bound, column] = upper_bound
+            # clip upcasts downcast integer columns instead of writing floats into them
+            df[column] = df[column].clip(lower_bound, upper_bound)
+            touched = [column]
         elif action == 'mark':
             df['is_outlier'] = 0
             df.loc[outlier_indices, 'is_outlier'] = 1
+            touched = ['is_outlier']
         else:
             raise ValueError(f"Unsupported action: {action}")
-        
-        data_store[file_id]["current_df"] = df
-        data_store[file_id]["actions"].append(f"Handled outliers in {column} using {action}")
-        
-        return {
-            "columns": list(df.columns),
-            "head": df.head().to_dict(orient="records"),
-            "action": f"Handled outliers in {column} using {action}"
-        }
+    
+    commit_version(entry, df, f"Handled outliers in {column} using {action}", touched)
+    
+    return {
+        "columns": list(df.columns),
+        "head": df.head().to_dict(orient="records"),
+        "action": f"Handled outliers in {column} using {action}"
+    }
+
+@router.post("/handle")
+async def handle_outliers(request: HandleRequest):
+    try:
+        async with dataset_lock(request.file_id).writer():
+            return await run_cpu(render_json, _handle_outliers, request)
+    except HTTPException:
+        raise
+    except DatasetConflictError as e:
+        # Another worker committed first; the client can retry against the new version
+        raise HTTPException(409, str(e))
     except Exception as e:
         logger.error(f"Outlier handling error: {str(e)}")
         raise HTTPException(500, f"Outlier handling failed: {str(e)}")
@@ -1,32 +1,150 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from state import data_store
 import logging
+from config import ROWS_MAX_LIMIT
+from services.executors import run_cpu
+from services.locks import dataset_lock
+from services.column_stats import column_stats
+from services.profiling import approximate_profile, cached_profile, compute_profile, store_profile
+from services.sketches import column_sketches
+from services.dtype_optimizer import HAS_PYARROW
+from services.json_encoding import render_json
+from services.row_access import iter_arrow, iter_ndjson, parse_sort, row_window, sort_order
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def _get_overview(file_id: str):
+    if file_id not in data_store:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    data = data_store[file_id]
+    df = data["current_df"]
+
+    # Cached per column; only columns changed since the last call are rescanned
+    stats = column_stats(data)
+    null_counts = {col: s["null_count"] for col, s in stats.items()}
+    dtypes = {col: s["dtype"] for col, s in stats.items()}
+
+    return {
+        "file_id": file_id,
+        "filename": data.get("filename", "Unknown"),  # ✅ Safe access
+        "version": data.get("version", 0),
+        "columns": list(df.columns),
+        "dtypes": dtypes,
+        "null_counts": null_counts,
+        "head": df.head().to_dict(orient="records"),
+        "shape": list(df.shape),
+        "memory": data.get("memory"),
+        "column_stats": stats
+    }
+
+
 @router.get("/{file_id}")
 async def get_overview(file_id: str):
     try:
-        if file_id not in data_store:
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        data = data_store[file_id]
-        df = data["current_df"]
-
-        null_counts = df.isnull().sum().to_dict()
-        dtypes = df.dtypes.astype(str).to_dict()
-
-        return {
-            "file_id": file_id,
-            "filename": data.get("filename", "Unknown"),  # ✅ Safe access
-            "columns": list(df.columns),
-            "dtypes": dtypes,
-            "null_counts": null_counts,
-            "head": df.head().to_dict(orient="records"),
-            "shape": list(df.shape)
-        }
-
+        async with dataset_lock(file_id).reader():
+            return await run_cpu(render_json, _get_overview, file_id)
     except Exception as e:
         logger.error(f"Overview error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
+
+def _get_profile(file_id: str, approx: bool = False):
+    if file_id not in data_store:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    data = data_store[file_id]
+    version = data.get("version", 0)
+    if approx:
+        # Sketches are built at ingest; only columns changed since are rescanned
+        profile = approximate_profile(column_sketches(data), len(data["current_df"]))
+        return {"file_id": file_id, "version": version, "cached": False, **profile}
+    directory = data_store.catalog.directory(file_id)
+
+    # Computed once per version and shared with other workers through the data directory
+    profile = cached_profile(file_id, version, directory)
+    cached = profile is not None
+    if profile is None:
+        snapshot = data_store.catalog.snapshot(file_id)
+        snapshot_path = snapshot[1] if snapshot is not None and snapshot[0] == version else None
+        profile = compute_profile(data["current_df"], snapshot_path)
+        store_profile(file_id, version, directory, profile)
+
+    return {"file_id": file_id, "version": version, "cached": cached, **profile}
+
+
+@router.get("/{file_id}/profile")
+async def get_profile(file_id: str, approx: bool = False):
+    try:
+        async with dataset_lock(file_id).reader():
+            return await run_cpu(render_json, _get_profile, file_id, approx)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Profile error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Profiling failed: {str(e)}")
+
+def _get_rows(file_id: str, offset: int, limit: int, columns: Optional[List[str]], sort: Optional[str]):
+    if file_id not in data_store:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    data = data_store[file_id]
+    df = data["current_df"]
+    version = data.get("version", 0)
+    labels = {str(col): col for col in df.columns}
+
+    selected = None
+    if columns:
+        missing = [col for col in columns if col not in labels]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(missing)}")
+        selected = [labels[col] for col in dict.fromkeys(columns)]
+
+    sort_column, ascending = parse_sort(sort)
+    order = None
+    if sort_column is not None:
+        if sort_column not in labels:
+            raise HTTPException(status_code=400, detail=f"Unknown sort column: {sort_column}")
+        # Sorted once per column and version; later pages only take their slice
+        order = sort_order(file_id, version, df[labels[sort_column]], ascending)
+
+    # The window shares memory with the version it was cut from, which is never
+    # modified in place, so it stays valid after the lock is released
+    window = row_window(df, offset, limit, selected, order)
+    return window, version, len(df)
+
+
+@router.get("/{file_id}/rows")
+async def get_rows(file_id: str,
+                   offset: int = Query(0, ge=0),
+                   limit: int = Query(100, ge=1, le=ROWS_MAX_LIMIT),
+                   columns: Optional[List[str]] = Query(None),
+                   sort: Optional[str] = None,
+                   format: str = Query("ndjson", pattern="^(ndjson|arrow)$"),
+                   index: bool = False):
+    if format == "arrow" and not HAS_PYARROW:
+        raise HTTPException(status_code=400, detail="Arrow output requires pyarrow on the server")
+    try:
+        async with dataset_lock(file_id).reader():
+            window, version, total = await run_cpu(_get_rows, file_id, offset, limit, columns, sort)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Rows error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Reading rows failed: {str(e)}")
+
+    if window.columns.duplicated().any():
+        raise HTTPException(status_code=400, detail="Column names must be unique to stream rows")
+    headers = {
+        "X-Total-Rows": str(total),
+        "X-Dataset-Version": str(version),
+        "X-Offset": str(offset),
+        "X-Row-Count": str(len(window))
+    }
+    # Batches are encoded lazily as the client reads
+    if format == "arrow":
+        return StreamingResponse(iter_arrow(window, index), media_type="application/vnd.apache.arrow.stream",
+                                 headers=headers)
+    return StreamingResponse(iter_ndjson(window, index), media_type="application/x-ndjson", headers=headers)
@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import FileResponse
 from state import data_store
 from services.report import generate_eda_report
+from services.executors import run_cpu
+from services.locks import dataset_lock, pyplot_lock
 import os
 import logging
 import uuid
@@ -9,6 +11,11 @@ import uuid
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def _generate_report(file_id: str, action_history: list, report_name: str):
+    # The report draws its figures with pyplot, which is not thread-safe
+    with pyplot_lock:
+        return generate_eda_report(data_store, file_id, action_history, report_name)
+
 @router.post("/generate/{file_id}")  # Changed endpoint path
 async def generate_report(file_id: str, action_history: list):
     if file_id not in data_store:
@@ -16,7 +23,8 @@ async def generate_report(file_id: str, action_history: list):
     try:
         # Generate unique report name
         report_name = f"report_{uuid.uuid4().hex}.pdf"
-        report_path = generate_eda_report(data_store, file_id, action_history, report_name)
+        async with dataset_lock(file_id).reader():
+            report_path = await run_cpu(_generate_report, file_id, action_history, report_name)
         
         if not os.path.exists(report_path):
             raise HTTPException(status_code=500, detail="Report generation failed")
@@ -1,14 +1,20 @@
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
-from io import BytesIO
 import pandas as pd
-import numpy as np
 import logging
-from fastapi import APIRouter, HTTPException, Response
-from pydantic import BaseModel
+import time
+import uuid
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from state import data_store
+from config import CHART_BATCH_MAX_CHARTS, CHART_DENSITY_BINS, CHART_SCATTER_MAX_POINTS, PAIR_GRID_MAX_COLUMNS
+from services.executors import run_cpu
+from services.locks import dataset_lock
+from services.chart_cache import CHART_MEDIA_TYPES, chart_etag, charts, etag_matches
+from services.chart_render import CHART_TYPES, ChartTimeoutError, chart_columns, renderer
+from services.chart_reduction import describe_reduction, plan_reduction
+from services.chart_data import chart_data
+from services.json_encoding import dumps
+from services.outlier_detection import numeric_columns
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -17,58 +23,342 @@ class VisualizationRequest(BaseModel):
     file_id: str
     chart_type: str
     x_col: str
-    y_col: str = None
-    hue_col: str = None
+    y_col: Optional[str] = None
+    hue_col: Optional[str] = None
+    # Figure size in inches at dpi, and image format (png or svg)
+    width: float = Field(10, gt=0, le=40)
+    height: float = Field(6, gt=0, le=40)
+    dpi: int = Field(100, ge=20, le=300)
+    format: str = "png"
+
+class ChartSpec(BaseModel):
+    chart_type: str
+    x_col: str
+    y_col: Optional[str] = None
+    hue_col: Optional[str] = None
+    width: float = Field(6, gt=0, le=40)
+    height: float = Field(4, gt=0, le=40)
+
+class BatchChartRequest(BaseModel):
+    file_id: str
+    charts: List[ChartSpec] = []
+    # numeric_histograms: a histogram per column; pair_grid: one grid image over the columns
+    preset: Optional[str] = None
+    columns: Optional[List[str]] = None  # preset columns (default: every numeric column)
+    hue_col: Optional[str] = None  # preset hue
+    # multipart: a JSON manifest part, then one image part per chart; composite: one image
+    output: str = "multipart"
+    grid_columns: int = Field(3, ge=1, le=12)  # composite cells per row
+    dpi: int = Field(100, ge=20, le=300)
+    format: str = "png"
+
+BATCH_PRESETS = ("numeric_histograms", "pair_grid")
+BATCH_OUTPUTS = ("multipart", "composite")
+
+class ChartDataRequest(BaseModel):
+    file_id: str
+    chart_type: str
+    x_col: str
+    y_col: Optional[str] = None
+    hue_col: Optional[str] = None
+
+def _chart_spec(request: VisualizationRequest) -> tuple:
+    """Everything besides the dataset version that determines the rendered image"""
+    return (request.chart_type, request.x_col, request.y_col or None, request.hue_col or None,
+            float(request.width), float(request.height), request.dpi, request.format)
+
+def _chart_frame(request):
+    """(dataset entry, current frame) after checking the file, columns and chart type"""
+    # Validate file_id exists
+    if request.file_id not in data_store:
+        raise HTTPException(
+            status_code=404,
+            detail="File not found or failed to generate chart"
+        )
+    file_data = data_store[request.file_id]
+    current_df = file_data["current_df"]
+
+    # Ensure current_df is a DataFrame
+    if isinstance(current_df, dict):
+        current_df = pd.DataFrame(current_df)
+        data_store[request.file_id]["current_df"] = current_df
+
+    # Validate columns
+    if request.x_col not in current_df.columns:
+        raise HTTPException(status_code=400, detail=f"Column '{request.x_col}' not found")
+    if request.y_col and request.y_col not in current_df.columns:
+        raise HTTPException(status_code=400, detail=f"Column '{request.y_col}' not found")
+    if request.hue_col and request.hue_col not in current_df.columns:
+        raise HTTPException(status_code=400, detail=f"Column '{request.hue_col}' not found")
+    if request.chart_type not in CHART_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported chart type: {request.chart_type}")
+    return file_data, current_df
+
+def _prepare_chart(request: VisualizationRequest, if_none_match: Optional[str] = None):
+    """Validate the request and answer it from the ETag or the chart cache when
+    possible; otherwise return what the renderer needs"""
+    file_data, current_df = _chart_frame(request)
+    if request.format not in CHART_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {request.format}. Use: {', '.join(CHART_MEDIA_TYPES)}")
+
+    # Charts are cached per dataset version, so a cleaning or outlier action
+    # (which commits a new version) changes the ETag and misses the cache
+    version = file_data.get("version", 0)
+    spec = _chart_spec(request)
+    render_spec = dict(zip(("chart_type", "x", "y", "hue", "width", "height", "dpi", "format"), spec))
+    # Large data is reduced before drawing; the plan only depends on size and dtypes
+    render_spec["reduction"] = plan_reduction(current_df, render_spec)
+    etag = chart_etag(request.file_id, version, spec)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "X-Dataset-Version": str(version),
+               "X-Chart-Reduction": describe_reduction(render_spec["reduction"])}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    media_type = CHART_MEDIA_TYPES[request.format]
+    content = charts.get(request.file_id, version, spec)
+    if content is not None:
+        return Response(content=content, media_type=media_type, headers=headers)
+
+    columns = chart_columns(render_spec)
+    # Workers map just these columns from the version's snapshot when there is one
+    snapshot = data_store.catalog.snapshot(request.file_id)
+    return {
+        "version": version,
+        "spec": spec,
+        "render_spec": render_spec,
+        "frame": current_df[columns],
+        "snapshot_path": snapshot[1] if snapshot is not None and snapshot[0] == version else None,
+        "positions": [current_df.columns.get_loc(col) for col in columns],
+        "media_type": media_type,
+        "headers": headers
+    }
+
 
 @router.post("/generate")
-async def generate_chart(request: VisualizationRequest):
+async def generate_chart(request: VisualizationRequest, if_none_match: Optional[str] = Header(None)):
     try:
-        # Validate file_id exists
-        if request.file_id not in data_store:
-            raise HTTPException(
-                status_code=404,
-                detail="File not found or failed to generate chart"
-            )
-        file_data = data_store[request.file_id]
-        current_df = file_data["current_df"]
-
-        # Ensure current_df is a DataFrame
-        if isinstance(current_df, dict):
-            current_df = pd.DataFrame(current_df)
-            data_store[request.file_id]["current_df"] = current_df
-
-        # Validate columns
-        if request.x_col not in current_df.columns:
-            raise HTTPException(status_code=400, detail=f"Column '{request.x_col}' not found")
-        if request.y_col and request.y_col not in current_df.columns:
-            raise HTTPException(status_code=400, detail=f"Column '{request.y_col}' not found")
-        if request.hue_col and request.hue_col not in current_df.columns:
-            raise HTTPException(status_code=400, detail=f"Column '{request.hue_col}' not found")
-
-        # Plot
-        plt.figure(figsize=(10, 6))
-        if request.chart_type == 'bar':
-            sns.barplot(data=current_df, x=request.x_col, y=request.y_col, hue=request.hue_col)
-        elif request.chart_type == 'line':
-            sns.lineplot(data=current_df, x=request.x_col, y=request.y_col, hue=request.hue_col)
-        elif request.chart_type == 'scatter':
-            sns.scatterplot(data=current_df, x=request.x_col, y=request.y_col, hue=request.hue_col)
-        elif request.chart_type == 'histogram':
-            sns.histplot(data=current_df, x=request.x_col, hue=request.hue_col, kde=True)
-        elif request.chart_type == 'box':
-            sns.boxplot(data=current_df, x=request.x_col, y=request.y_col, hue=request.hue_col)
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported chart type: {request.chart_type}")
-
-        buf = BytesIO()
-        plt.tight_layout()
-        plt.savefig(buf, format='png', dpi=100)
-        plt.close()
-        buf.seek(0)
-        return Response(content=buf.read(), media_type="image/png")
-
+        async with dataset_lock(request.file_id).reader():
+            job = await run_cpu(_prepare_chart, request, if_none_match)
+            if isinstance(job, Response):
+                return job
+            content = await renderer.render(job["render_spec"], job["frame"], job["snapshot_path"], job["positions"])
+        charts.put(request.file_id, job["version"], job["spec"], content)
+        return Response(content=content, media_type=job["media_type"], headers=job["headers"])
     except HTTPException as he:
         raise he
+    except ChartTimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Visualization error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Chart generation failed: {str(e)}")
+
+@router.get("/generate")
+async def get_chart(request: VisualizationRequest = Depends(), if_none_match: Optional[str] = Header(None)):
+    """Same chart as POST /generate, as a GET that browsers revalidate with If-None-Match"""
+    return await generate_chart(request, if_none_match)
+
+def _chart_data(request: ChartDataRequest, if_none_match: Optional[str] = None):
+    file_data, current_df = _chart_frame(request)
+    version = file_data.get("version", 0)
+    # Cached next to the rendered charts, under a spec no image can have
+    spec = ("data", request.chart_type, request.x_col, request.y_col or None, request.hue_col or None)
+    data_spec = dict(zip(("chart_type", "x", "y", "hue"), spec[1:]))
+    data_spec["reduction"] = plan_reduction(current_df, data_spec)
+    etag = chart_etag(request.file_id, version, spec)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "X-Dataset-Version": str(version),
+               "X-Chart-Reduction": describe_reduction(data_spec["reduction"])}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    content = charts.get(request.file_id, version, spec)
+    if content is None:
+        columns = chart_columns(data_spec)
+        try:
+            data = chart_data(current_df[columns], data_spec)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        content = dumps({
+            "file_id": request.file_id,
+            "version": version,
+            "chart_type": request.chart_type,
+            "x": request.x_col,
+            "y": request.y_col or None,
+            "hue": request.hue_col or None,
+            "rows": len(current_df),
+            "reduction": data_spec["reduction"],
+            **data
+        })
+        charts.put(request.file_id, version, spec, content)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+@router.post("/data")
+async def get_chart_data(request: ChartDataRequest, if_none_match: Optional[str] = Header(None)):
+    """Aggregates for client-side rendering: histogram bins, box five-number summaries,
+    bar means with 95% intervals, and (decimated) line and scatter series"""
+    try:
+        async with dataset_lock(request.file_id).reader():
+            return await run_cpu(_chart_data, request, if_none_match)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Chart data error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Chart data failed: {str(e)}")
+
+def _batch_specs(request: BatchChartRequest, df: pd.DataFrame) -> List[dict]:
+    """Render specs of the listed charts followed by the preset's"""
+    specs = [{"chart_type": chart.chart_type, "x": chart.x_col, "y": chart.y_col or None,
+              "hue": chart.hue_col or None, "width": float(chart.width), "height": float(chart.height)}
+             for chart in request.charts]
+    if request.preset == "numeric_histograms":
+        specs += [{"chart_type": "histogram", "x": col, "y": None, "hue": request.hue_col or None,
+                   "width": 6.0, "height": 4.0} for col in request.columns or numeric_columns(df)]
+    elif request.preset == "pair_grid":
+        columns = request.columns or numeric_columns(df)[:6]
+        if not 2 <= len(columns) <= PAIR_GRID_MAX_COLUMNS:
+            raise HTTPException(status_code=400, detail=f"A pair grid needs 2 to {PAIR_GRID_MAX_COLUMNS} columns")
+        # Each cell gets 2.2 inches; the grid shares values, bins and one row sample
+        size = 2.2 * len(columns)
+        specs.append({"chart_type": "pair_grid", "columns": list(columns), "hue": request.hue_col or None,
+                      "width": size, "height": size, "max_points": CHART_SCATTER_MAX_POINTS,
+                      "bins": CHART_DENSITY_BINS})
+    elif request.preset is not None:
+        raise HTTPException(status_code=400, detail=f"Unknown preset: {request.preset}. Use: {', '.join(BATCH_PRESETS)}")
+    for spec in specs:
+        spec.update(dpi=request.dpi, format=request.format)
+    return specs
+
+def _spec_key(spec: dict) -> tuple:
+    """Chart cache key of a render spec; single charts match the key /generate uses"""
+    if spec["chart_type"] == "pair_grid":
+        return ("pair_grid", tuple(spec["columns"]), spec["hue"], spec["width"], spec["height"],
+                spec["dpi"], spec["format"])
+    return (spec["chart_type"], spec["x"], spec["y"], spec["hue"], spec["width"], spec["height"],
+            spec["dpi"], spec["format"])
+
+def _prepare_batch(request: BatchChartRequest, if_none_match: Optional[str] = None):
+    """Validate every chart against one lookup of the dataset, plan reductions and
+    collect cached images; returns a 304 Response or the batch job"""
+    if request.file_id not in data_store:
+        raise HTTPException(status_code=404, detail="File not found")
+    file_data = data_store[request.file_id]
+    current_df = file_data["current_df"]
+    if request.output not in BATCH_OUTPUTS:
+        raise HTTPException(status_code=400, detail=f"Unsupported output: {request.output}. Use: {', '.join(BATCH_OUTPUTS)}")
+    if request.format not in CHART_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {request.format}. Use: {', '.join(CHART_MEDIA_TYPES)}")
+
+    specs = _batch_specs(request, current_df)
+    if not specs:
+        raise HTTPException(status_code=400, detail="Provide charts and/or a preset")
+    if len(specs) > CHART_BATCH_MAX_CHARTS:
+        raise HTTPException(status_code=400, detail=f"At most {CHART_BATCH_MAX_CHARTS} charts per batch")
+    unknown = sorted({spec["chart_type"] for spec in specs} - set(CHART_TYPES) - {"pair_grid"})
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported chart types: {', '.join(unknown)}")
+    # One projection serves every chart of the batch
+    columns = list(dict.fromkeys(col for spec in specs for col in chart_columns(spec)))
+    missing = [col for col in columns if col not in current_df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Columns not found: {', '.join(map(str, missing))}")
+    composite = request.output == "composite"
+    if composite and any(spec["chart_type"] == "pair_grid" for spec in specs):
+        raise HTTPException(status_code=400, detail="A pair grid is already one image; use output=multipart")
+    for spec in specs:
+        if spec["chart_type"] != "pair_grid":
+            spec["reduction"] = plan_reduction(current_df, spec)
+
+    version = file_data.get("version", 0)
+    keys = [_spec_key(spec) for spec in specs]
+    layout = {"columns": request.grid_columns, "width": max(spec["width"] for spec in specs),
+              "height": max(spec["height"] for spec in specs), "dpi": request.dpi, "format": request.format}
+    batch_key = ("batch", request.output, tuple(keys), tuple(sorted(layout.items())) if composite else None)
+    etag = chart_etag(request.file_id, version, batch_key)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "X-Dataset-Version": str(version)}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    snapshot = data_store.catalog.snapshot(request.file_id)
+    return {
+        "version": version,
+        "specs": specs,
+        "keys": keys,
+        "layout": layout,
+        "batch_key": batch_key,
+        "cached": charts.get(request.file_id, version, batch_key) if composite else
+                  [charts.get(request.file_id, version, key) for key in keys],
+        "frame": current_df[columns],
+        "snapshot_path": snapshot[1] if snapshot is not None and snapshot[0] == version else None,
+        "positions": [current_df.columns.get_loc(col) for col in columns],
+        "headers": headers
+    }
+
+def _multipart(parts: List[tuple]) -> tuple:
+    """(body, media type) of a multipart/mixed message of (headers, content) parts"""
+    boundary = uuid.uuid4().hex
+    chunks = []
+    for headers, content in parts:
+        head = "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        chunks.append(f"--{boundary}\r\n{head}\r\n".encode("utf-8") + content + b"\r\n")
+    chunks.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(chunks), f"multipart/mixed; boundary={boundary}"
+
+def _spec_summary(index: int, spec: dict) -> dict:
+    summary = {"index": index, "content_id": f"chart-{index}", "chart_type": spec["chart_type"]}
+    if spec["chart_type"] == "pair_grid":
+        summary.update(columns=spec["columns"], hue=spec["hue"])
+    else:
+        summary.update(x=spec["x"], y=spec["y"], hue=spec["hue"], reduction=describe_reduction(spec["reduction"]))
+    return summary
+
+@router.post("/batch")
+async def generate_charts(request: BatchChartRequest, if_none_match: Optional[str] = Header(None)):
+    """Render many charts over one validation and column projection, in parallel
+    across the renderer's workers, as a multipart message or a composite image"""
+    try:
+        start = time.perf_counter()
+        async with dataset_lock(request.file_id).reader():
+            job = await run_cpu(_prepare_batch, request, if_none_match)
+            if isinstance(job, Response):
+                return job
+            media_type = CHART_MEDIA_TYPES[request.format]
+            headers = job["headers"]
+            if request.output == "composite":
+                content, seconds = job["cached"], None
+                if content is None:
+                    content, seconds = await renderer.render_composite(
+                        job["specs"], job["layout"], job["frame"], job["snapshot_path"], job["positions"])
+                    charts.put(request.file_id, job["version"], job["batch_key"], content)
+                headers["X-Chart-Timings"] = dumps(seconds).decode("utf-8") if seconds else "cached"
+                return Response(content=content, media_type=media_type, headers=headers)
+
+            pending = [i for i, content in enumerate(job["cached"]) if content is None]
+            rendered = await renderer.render_many([job["specs"][i] for i in pending], job["frame"],
+                                                  job["snapshot_path"], job["positions"]) if pending else []
+        results = {i: {"content": content, "error": None, "seconds": None, "cached": True}
+                   for i, content in enumerate(job["cached"]) if content is not None}
+        for i, result in zip(pending, rendered):
+            results[i] = {**result, "cached": False}
+            if result["content"] is not None:
+                charts.put(request.file_id, job["version"], job["keys"][i], result["content"])
+
+        manifest = {"file_id": request.file_id, "version": job["version"], "charts": []}
+        parts = []
+        for i, spec in enumerate(job["specs"]):
+            result = results[i]
+            summary = _spec_summary(i, spec)
+            summary.update(status="ok" if result["content"] is not None else "error", cached=result["cached"],
+                           seconds=result["seconds"], error=result["error"],
+                           etag=chart_etag(request.file_id, job["version"], job["keys"][i]))
+            manifest["charts"].append(summary)
+            if result["content"] is not None:
+                parts.append(({"Content-Type": media_type, "Content-ID": f"<chart-{i}>",
+                               "ETag": summary["etag"]}, result["content"]))
+        manifest["seconds"] = round(time.perf_counter() - start, 4)
+        body, multipart_type = _multipart([({"Content-Type": "application/json"}, dumps(manifest))] + parts)
+        return Response(content=body, media_type=multipart_type, headers=headers)
+    except HTTPException:
+        raise
+    except ChartTimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch visualization error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Batch chart generation failed: {str(e)}")
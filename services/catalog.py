@@ -0,0 +1,141 @@
+import os
+import json
+import shutil
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+from sqlalchemy import select, update, delete
+from config import DATA_DIR
+from database import SessionLocal, DatasetRecord, init_db
+from services.column_stats import STATS_KEY
+from services.sketches import SKETCHES_KEY
+from services.snapshots import write_snapshot, read_snapshot, snapshot_files, remove_files
+
+logger = logging.getLogger(__name__)
+
+# Entry keys saved inside snapshots (meta in the manifest, objects in files of their
+# own that later versions reuse); everything else is a per-process cache
+SNAPSHOT_META_KEYS = ("memory", STATS_KEY)
+SNAPSHOT_OBJECT_KEYS = (SKETCHES_KEY,)
+
+class DatasetConflictError(Exception):
+    """Another worker published a newer version of the dataset first"""
+
+def frame_schema(df: pd.DataFrame) -> Dict[str, Any]:
+    return {
+        "columns": [str(col) for col in df.columns],
+        "dtypes": {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+        "shape": list(df.shape)
+    }
+
+class DatasetCatalog:
+    """SQLAlchemy-backed record of every dataset and its latest snapshot.
+
+    Snapshots are written to a directory shared by all workers, so any worker
+    can load any dataset by file_id. Versions are published with an optimistic
+    check, so two workers cannot silently overwrite each other's changes."""
+
+    def __init__(self, data_dir: str = DATA_DIR, session_factory=SessionLocal):
+        self.data_dir = data_dir
+        self._session_factory = session_factory
+        init_db()
+
+    def ids(self) -> List[str]:
+        with self._session_factory() as session:
+            return list(session.scalars(select(DatasetRecord.id)))
+
+    def version(self, file_id: str) -> Optional[int]:
+        with self._session_factory() as session:
+            return session.scalar(select(DatasetRecord.version).where(DatasetRecord.id == file_id))
+
+    def snapshot(self, file_id: str) -> Optional[Tuple[int, str]]:
+        """(version, manifest path) of the latest published version"""
+        with self._session_factory() as session:
+            row = session.execute(
+                select(DatasetRecord.version, DatasetRecord.snapshot_path).where(DatasetRecord.id == file_id)
+            ).first()
+        return tuple(row) if row is not None else None
+
+    def directory(self, file_id: str) -> str:
+        """Shared directory of the dataset's snapshots and derived files"""
+        return self._directory(file_id)
+
+    def publish(self, file_id: str, entry: Dict[str, Any], expected_version: Optional[int] = None) -> str:
+        """Snapshot the entry and point the catalog at it.
+        expected_version is the version being replaced, or None for a new dataset."""
+        version = entry.get("version", 0)
+        path, new_files = write_snapshot(self._directory(file_id), entry, version, SNAPSHOT_META_KEYS,
+                                         SNAPSHOT_OBJECT_KEYS)
+        values = {
+            "filename": entry.get("filename"),
+            "actions": json.dumps(entry.get("actions", [])),
+            "version": version,
+            "schema": json.dumps(frame_schema(entry["current_df"])),
+            "snapshot_path": path
+        }
+        try:
+            with self._session_factory() as session, session.begin():
+                if expected_version is None:
+                    session.add(DatasetRecord(id=file_id, **values))
+                else:
+                    result = session.execute(
+                        update(DatasetRecord)
+                        .where(DatasetRecord.id == file_id, DatasetRecord.version == expected_version)
+                        .values(**values)
+                    )
+                    if result.rowcount == 0:
+                        raise DatasetConflictError(
+                            f"Dataset {file_id} was modified by another worker; reload and retry"
+                        )
+        except Exception:
+            remove_files(new_files + [path])
+            raise
+        self._prune(file_id, version, path)
+        return path
+
+    def load(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Load the latest published version, or None if the dataset is unknown"""
+        # A concurrent publish may prune the snapshot we just looked up; look it up again
+        for _ in range(3):
+            with self._session_factory() as session:
+                record = session.get(DatasetRecord, file_id)
+            if record is None:
+                return None
+            try:
+                entry = read_snapshot(record.snapshot_path)
+            except FileNotFoundError:
+                continue
+            entry.update({
+                "filename": record.filename,
+                "actions": json.loads(record.actions or "[]"),
+                "version": record.version
+            })
+            return entry
+        raise RuntimeError(f"Snapshot for dataset {file_id} is missing")
+
+    def delete(self, file_id: str):
+        with self._session_factory() as session, session.begin():
+            session.execute(delete(DatasetRecord).where(DatasetRecord.id == file_id))
+        shutil.rmtree(self._directory(file_id), ignore_errors=True)
+
+    def _directory(self, file_id: str) -> str:
+        return os.path.join(self.data_dir, file_id)
+
+    def _prune(self, file_id: str, version: int, keep: str):
+        """Remove manifests of older versions and the column files only they used"""
+        directory = self._directory(file_id)
+        needed = snapshot_files(keep)
+        for name in os.listdir(directory):
+            if not name.endswith(".manifest"):
+                continue
+            try:
+                older = int(name[1:].split("-", 1)[0]) < version
+            except ValueError:
+                continue
+            if older:
+                path = os.path.join(directory, name)
+                try:
+                    stale = snapshot_files(path) - needed
+                except FileNotFoundError:
+                    continue
+                remove_files(stale | {path})
@@ -0,0 +1,77 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+from config import CHART_CACHE_BUDGET
+
+# Media types of the chart formats that can be rendered and cached
+CHART_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+def chart_etag(file_id: str, version: int, spec: Tuple) -> str:
+    """Strong ETag of a chart: rendering is deterministic for a dataset version and
+    spec, so the tag is known without rendering or looking up the cached image"""
+    digest = hashlib.sha1(repr((file_id, version, spec)).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value covers etag (weak comparison, lists, '*')"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+class ChartCache:
+    """LRU of rendered charts keyed by (file_id, version, spec).
+
+    Every cleaning or outlier action commits a new dataset version, so a cached
+    chart can never be served for changed data; storing a chart of a newer
+    version drops the older versions' charts of that dataset. Bytes are bounded
+    by budget_bytes."""
+
+    def __init__(self, budget_bytes: int = CHART_CACHE_BUDGET):
+        self.budget_bytes = budget_bytes
+        self._charts: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_id: str, version: int, spec: Tuple) -> Optional[bytes]:
+        key = (file_id, version, spec)
+        with self._lock:
+            content = self._charts.get(key)
+            if content is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._charts.move_to_end(key)
+            return content
+
+    def put(self, file_id: str, version: int, spec: Tuple, content: bytes):
+        with self._lock:
+            if len(content) > self.budget_bytes:
+                return
+            self._evict(key for key in self._charts if key[0] == file_id and key[1] < version)
+            key = (file_id, version, spec)
+            if key not in self._charts:
+                self._charts[key] = content
+                self._bytes += len(content)
+            while self._bytes > self.budget_bytes:
+                _, evicted = self._charts.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def invalidate(self, file_id: str):
+        """Forget every chart of a dataset"""
+        with self._lock:
+            self._evict(key for key in self._charts if key[0] == file_id)
+
+    def _evict(self, keys: Iterable[tuple]):
+        for key in list(keys):
+            self._bytes -= len(self._charts.pop(key))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"charts": len(self._charts), "bytes": self._bytes, "budget_bytes": self.budget_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+charts = ChartCache()
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict
+from services.chart_reduction import (bar_intervals, box_stats, density_grid, histogram_counts,
+                                      reduce_line, sample_rows, value_and_category)
+
+def _hue_series(df: pd.DataFrame, x: Any, y: Any, hue: Any) -> list:
+    """[{"hue", "x", "y"}] with one entry per hue level (a single one without hue)"""
+    if hue is None:
+        return [{"hue": None, "x": df[x], "y": df[y]}]
+    return [{"hue": level, "x": group[x], "y": group[y]}
+            for level, group in df.groupby(hue, sort=True, observed=True)]
+
+def chart_data(df: pd.DataFrame, spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Aggregates a client can draw the chart from, instead of a rendered image.
+
+    spec holds chart_type, x, y, hue and the planned reduction (see
+    chart_reduction.plan_reduction); histograms, boxes and bars are always
+    aggregated, line and scatter series only when the plan reduces them."""
+    chart_type, x, y, hue = spec["chart_type"], spec["x"], spec.get("y"), spec.get("hue")
+    plan = spec.get("reduction")
+    method = plan["method"] if plan else None
+    if chart_type in ("line", "scatter") and y is None:
+        raise ValueError(f"{chart_type} data needs a y column")
+    if chart_type in ("bar", "box") and y is None and hue is not None:
+        raise ValueError(f"{chart_type} data with a hue needs a y column")
+    if chart_type in ("bar", "box") and value_and_category(df, x, y) is None:
+        raise ValueError(f"{chart_type} data needs a numeric column among x and y")
+
+    if chart_type == "histogram":
+        if not pd.api.types.is_numeric_dtype(df[x]) or pd.api.types.is_bool_dtype(df[x]):
+            counts = df.groupby([x] + ([hue] if hue and hue != x else []), sort=True, observed=True).size()
+            return {"kind": "counts", "counts": counts.rename("count").reset_index()}
+        edges, levels, counts = histogram_counts(df, spec)
+        return {"kind": "histogram", "edges": edges,
+                "series": [{"hue": None if levels is None else levels[i], "counts": counts[i]}
+                           for i in range(len(counts))]}
+
+    if chart_type == "box":
+        stats, value, category, horizontal = box_stats(df, spec)
+        return {"kind": "box", "value": value, "category": category, "horizontal": horizontal,
+                "boxes": [{"category": box["key"][0], "hue": box["key"][1] if len(box["key"]) == 2 else None,
+                           "min": box["min"], "q1": box["q1"], "median": box["med"], "q3": box["q3"],
+                           "max": box["max"], "whisker_low": box["whislo"], "whisker_high": box["whishi"],
+                           "count": box["count"]} for box in stats]}
+
+    if chart_type == "bar":
+        bars, value, category = bar_intervals(df, spec)
+        return {"kind": "bar", "value": value, "category": category, "bars": bars}
+
+    if chart_type == "line":
+        # Mean y per x like the rendered line; decimated only when the plan says so
+        line = reduce_line(df, spec, plan if method in ("lttb", "minmax") else {"method": "lttb", "max_points": len(df)})
+        return {"kind": "line", "series": _hue_series(line, x, y, hue)}
+
+    if chart_type == "scatter":
+        if method == "density":
+            counts, x_edges, y_edges = density_grid(df, spec, plan)
+            # Row i holds the bins of x_edges[i]..x_edges[i + 1]
+            return {"kind": "density", "x_edges": x_edges, "y_edges": y_edges, "counts": counts.astype(np.int64)}
+        points = sample_rows(df, plan) if method == "sample" else df
+        return {"kind": "scatter", "series": _hue_series(points, x, y, hue)}
+
+    raise ValueError(f"Unsupported chart type: {chart_type}")
@@ -0,0 +1,246 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Optional, Sequence, Tuple
+from config import (CHART_LINE_MAX_POINTS, CHART_LINE_REDUCTION, CHART_SCATTER_MAX_POINTS,
+                    CHART_DENSITY_BINS, CHART_AGGREGATE_MIN_ROWS)
+
+# Data reductions applied in front of the chart engine, so render time depends on
+# the size of the picture rather than the row count
+
+def _is_numeric(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+def _is_axis(series: pd.Series) -> bool:
+    return pd.api.types.is_datetime64_any_dtype(series) or _is_numeric(series)
+
+def _axis_values(series: pd.Series) -> Optional[np.ndarray]:
+    """float64 positions of a numeric or datetime column, None for other dtypes"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy(dtype="datetime64[ns]")
+        out = values.view(np.int64).astype(np.float64)
+        out[np.isnat(values)] = np.nan
+        return out
+    if _is_numeric(series):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return None
+
+def value_and_category(df: pd.DataFrame, x: Any, y: Any) -> Optional[Tuple[Any, Any, bool]]:
+    """(numeric value column, category column, horizontal) the way seaborn orients
+    bar and box charts: y is the value when numeric, otherwise x. A numeric x on
+    its own is one horizontal bar or box, with no category column."""
+    if y is None:
+        return (x, None, True) if _is_numeric(df[x]) else None
+    if _is_numeric(df[y]):
+        return y, x, False
+    if _is_numeric(df[x]):
+        return x, y, True
+    return None
+
+def plan_reduction(df: pd.DataFrame, spec: Dict[str, Any], line_points: int = CHART_LINE_MAX_POINTS,
+                   line_method: str = CHART_LINE_REDUCTION, scatter_points: int = CHART_SCATTER_MAX_POINTS,
+                   density_bins: int = CHART_DENSITY_BINS,
+                   aggregate_rows: int = CHART_AGGREGATE_MIN_ROWS) -> Optional[Dict[str, Any]]:
+    """Reduction a chart needs at this size, or None to plot the rows as they are.
+
+    Decided from the row count and dtypes alone, so it is known (and reported)
+    without reading the data."""
+    rows = len(df)
+    chart_type, x, y, hue = spec["chart_type"], spec["x"], spec.get("y"), spec.get("hue")
+    if chart_type == "line":
+        if rows > line_points and y is not None:
+            return {"method": line_method, "rows": rows, "max_points": line_points}
+    elif chart_type == "scatter":
+        if rows > scatter_points and y is not None:
+            if hue is None and _is_axis(df[x]) and _is_axis(df[y]):
+                return {"method": "density", "rows": rows, "bins": density_bins}
+            return {"method": "sample", "rows": rows, "max_points": scatter_points}
+    elif rows > aggregate_rows:
+        if chart_type == "histogram" and _is_numeric(df[x]):
+            return {"method": "binned", "rows": rows}
+        # seaborn cannot split a single column by hue, so those are left to fail as they are
+        single_with_hue = y is None and hue is not None
+        if chart_type in ("bar", "box") and not single_with_hue and value_and_category(df, x, y) is not None:
+            return {"method": "aggregate" if chart_type == "bar" else "box_stats", "rows": rows}
+    return None
+
+def describe_reduction(plan: Optional[Dict[str, Any]]) -> str:
+    """Value of the X-Chart-Reduction response header"""
+    if plan is None:
+        return "none"
+    return "; ".join([plan["method"]] + [f"{key}={value}" for key, value in plan.items() if key != "method"])
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: positions of n_out points of a line sorted by x
+    that keep its visual shape. First and last points are always kept."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # n_out - 2 buckets between the fixed end points, and each bucket's mean point
+    bounds = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    sizes = np.diff(bounds)
+    mean_x = np.add.reduceat(x[:n - 1], bounds[:-1]) / sizes
+    mean_y = np.add.reduceat(y[:n - 1], bounds[:-1]) / sizes
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        cx, cy = (mean_x[i + 1], mean_y[i + 1]) if i + 1 < len(sizes) else (x[-1], y[-1])
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Positions of the minimum and maximum of each of n_out / 2 equal buckets"""
+    n = len(y)
+    buckets = max(1, n_out // 2)
+    if n <= n_out:
+        return np.arange(n)
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(buckets, size)
+    # Trailing buckets past the end are all NaN; nanarg* needs at least one value
+    filled = ~np.isnan(blocks).all(axis=1)
+    offsets = np.arange(buckets)[filled] * size
+    lows = offsets + np.nanargmin(blocks[filled], axis=1)
+    highs = offsets + np.nanargmax(blocks[filled], axis=1)
+    return np.unique(np.concatenate((lows, highs)))
+
+def reduce_line(df: pd.DataFrame, spec: Dict[str, Any], plan: Dict[str, Any]) -> pd.DataFrame:
+    """Mean y per x (the line seaborn draws, without its bootstrapped band), then
+    LTTB or min/max decimation of each hue's line to its share of max_points.
+    Non-numeric x values are spaced evenly in sorted order."""
+    x, y, hue = spec["x"], spec["y"], spec.get("hue")
+    keys = [hue, x] if hue else [x]
+    line = df[keys + [y]].dropna().groupby(keys, sort=True, observed=True)[y].mean().reset_index()
+    groups = [group for _, group in line.groupby(hue, sort=False, observed=True)] if hue else [line]
+    points = max(3, plan["max_points"] // max(1, len(groups)))
+    reduced = []
+    for group in groups:
+        values = group[y].to_numpy(dtype=np.float64)
+        if plan["method"] == "minmax":
+            positions = minmax_indices(values, points)
+        else:
+            xs = _axis_values(group[x])
+            positions = lttb_indices(np.arange(len(group), dtype=np.float64) if xs is None else xs, values, points)
+        reduced.append(group.iloc[positions])
+    return pd.concat(reduced, ignore_index=True) if reduced else line
+
+def sample_rows(df: pd.DataFrame, plan: Dict[str, Any]) -> pd.DataFrame:
+    """Fixed-seed uniform sample, so the same version always renders the same image"""
+    return df.sample(n=plan["max_points"], random_state=0)
+
+def density_grid(df: pd.DataFrame, spec: Dict[str, Any], plan: Dict[str, Any]):
+    """(counts, x edges, y edges) of a 2-D histogram over the finite points"""
+    x, y = _axis_values(df[spec["x"]]), _axis_values(df[spec["y"]])
+    finite = np.isfinite(x) & np.isfinite(y)
+    return np.histogram2d(x[finite], y[finite], bins=plan["bins"])
+
+def histogram_counts(df: pd.DataFrame, spec: Dict[str, Any]):
+    """(bin edges, hue levels or None, counts of shape (levels, bins)) over the finite
+    values, with numpy's "auto" bins capped at 1000"""
+    x, hue = spec["x"], spec.get("hue")
+    values = df[x].to_numpy(dtype=np.float64, na_value=np.nan)
+    finite = np.isfinite(values)
+    edges = np.histogram_bin_edges(values[finite], bins="auto")
+    if len(edges) > 1001:
+        edges = np.histogram_bin_edges(values[finite], bins=1000)
+    bins = np.clip(np.searchsorted(edges, values[finite], side="right") - 1, 0, len(edges) - 2)
+    if hue is None:
+        return edges, None, np.bincount(bins, minlength=len(edges) - 1)[np.newaxis]
+    # One bincount over (hue code, bin) pairs instead of a histogram per hue level
+    codes, levels = pd.factorize(df[hue][finite], sort=True)
+    present = codes >= 0
+    counts = np.bincount(codes[present] * (len(edges) - 1) + bins[present],
+                         minlength=len(levels) * (len(edges) - 1)).reshape(len(levels), len(edges) - 1)
+    return edges, levels, counts
+
+def binned_histogram(df: pd.DataFrame, spec: Dict[str, Any]) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Counts per bin (and hue) as a small weighted frame, with the bin edges"""
+    x, hue = spec["x"], spec.get("hue")
+    edges, levels, counts = histogram_counts(df, spec)
+    centers = (edges[:-1] + edges[1:]) / 2
+    frame = {x: np.tile(centers, len(counts))}
+    if levels is not None:
+        frame[hue] = np.repeat(np.asarray(levels, dtype=object), len(centers))
+    frame["count"] = counts.ravel()
+    return pd.DataFrame(frame), edges
+
+def _group_keys(category: Any, hue: Any) -> list:
+    """Columns a bar or box chart groups by: none for a single column"""
+    return [key for key in dict.fromkeys([category, hue or category]) if key is not None]
+
+def aggregate_bars(df: pd.DataFrame, spec: Dict[str, Any]) -> pd.DataFrame:
+    """Mean value per category (and hue): the bar heights seaborn would draw"""
+    value, category, _ = value_and_category(df, spec["x"], spec.get("y"))
+    keys = _group_keys(category, spec.get("hue"))
+    if not keys:
+        return pd.DataFrame({value: [df[value].mean()]})
+    return df.groupby(keys, sort=True, observed=True)[value].mean().reset_index()
+
+def bar_intervals(df: pd.DataFrame, spec: Dict[str, Any]) -> Tuple[pd.DataFrame, Any, Any]:
+    """Mean, count and normal-approximation 95% interval per category (and hue), from one
+    grouped aggregation; (frame, value column, category column)"""
+    value, category, _ = value_and_category(df, spec["x"], spec.get("y"))
+    keys = _group_keys(category, spec.get("hue"))
+    if keys:
+        bars = df.groupby(keys, sort=True, observed=True)[value].agg(["mean", "count", "std"])
+    else:
+        bars = df[value].agg(["mean", "count", "std"]).to_frame().T.astype({"count": np.int64})
+    margin = 1.96 * bars["std"] / np.sqrt(bars["count"])
+    bars["ci_low"], bars["ci_high"] = bars["mean"] - margin, bars["mean"] + margin
+    return bars.drop(columns="std").reset_index(drop=not keys), value, category
+
+def box_stats(df: pd.DataFrame, spec: Dict[str, Any]):
+    """Matplotlib bxp() statistics per category (and hue), from grouped quantiles.
+    Whiskers reach the furthest values within 1.5 IQR; fliers are not drawn.
+    Each box is keyed by (category,) or (category, hue), and a single column's box by (None,)."""
+    value, category, horizontal = value_and_category(df, spec["x"], spec.get("y"))
+    keys = _group_keys(category, spec.get("hue"))
+    frame = df[keys + [value]].dropna()
+    grouped = frame.groupby(keys or np.zeros(len(frame), dtype=np.int8), sort=True, observed=True)[value]
+    quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    extremes = grouped.agg(["count", "min", "max"])
+    codes = grouped.ngroup().to_numpy()
+    values = frame[value].to_numpy(dtype=np.float64)
+    q1, med, q3 = (quartiles[q].to_numpy() for q in (0.25, 0.5, 0.75))
+    iqr = q3 - q1
+    lows = pd.Series(np.where(values >= (q1 - 1.5 * iqr)[codes], values, np.nan)).groupby(codes).min()
+    highs = pd.Series(np.where(values <= (q3 + 1.5 * iqr)[codes], values, np.nan)).groupby(codes).max()
+    stats = []
+    for i, key in enumerate(quartiles.index):
+        key = key if isinstance(key, tuple) else (key if keys else None,)
+        stats.append({"key": key, "q1": q1[i], "med": med[i], "q3": q3[i],
+                      "whislo": lows.iloc[i], "whishi": highs.iloc[i], "fliers": [],
+                      "count": int(extremes["count"].iloc[i]), "min": extremes["min"].iloc[i],
+                      "max": extremes["max"].iloc[i]})
+    return stats, value, category, horizontal
+
+def pair_grid_data(df: pd.DataFrame, columns: Sequence[Any], hue: Any = None, max_points: int = CHART_SCATTER_MAX_POINTS,
+                   bins: int = CHART_DENSITY_BINS) -> Dict[str, Any]:
+    """Everything a pair grid draws, computed once per column rather than per cell:
+    float values, histogram edges and counts per hue level, hue codes, and the rows
+    every scatter cell plots (one fixed-seed sample when there are too many). Large
+    grids without a hue draw densities instead of scatters."""
+    values = {col: _axis_values(df[col]) for col in columns}
+    codes, levels = (None, [None]) if hue is None else pd.factorize(df[hue], sort=True)
+    edges, counts = {}, {}
+    for col in columns:
+        finite = np.isfinite(values[col])
+        edges[col] = np.histogram_bin_edges(values[col][finite], bins=min(bins, 50))
+        if codes is None:
+            counts[col] = [np.histogram(values[col][finite], bins=edges[col])[0]]
+        else:
+            counts[col] = [np.histogram(values[col][finite & (codes == level)], bins=edges[col])[0]
+                           for level in range(len(levels))]
+    dense = len(df) > max_points
+    rows = np.arange(len(df))
+    if dense and codes is not None:
+        rows = np.sort(np.random.default_rng(0).choice(len(df), max_points, replace=False))
+    if codes is not None:
+        # Rows without a hue are left out, as seaborn does
+        rows = rows[codes[rows] >= 0]
+    return {"values": values, "codes": codes, "levels": list(levels), "edges": edges, "counts": counts,
+            "rows": rows, "density": dense and codes is None}
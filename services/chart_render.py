@@ -0,0 +1,379 @@
+import asyncio
+import logging
+import os
+import multiprocessing
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from config import CHART_RENDER_WORKERS, CHART_RENDER_TIMEOUT
+from services.executors import run_cpu
+from services.snapshots import read_columns
+from services.chart_reduction import (aggregate_bars, binned_histogram, box_stats, density_grid,
+                                      pair_grid_data, reduce_line, sample_rows)
+
+logger = logging.getLogger(__name__)
+
+# chart_type -> (seaborn function, whether it takes a y column)
+CHART_TYPES = {
+    "bar": ("barplot", True),
+    "line": ("lineplot", True),
+    "scatter": ("scatterplot", True),
+    "histogram": ("histplot", False),
+    "box": ("boxplot", True),
+}
+
+class ChartTimeoutError(Exception):
+    """A render ran longer than the timeout and its worker was killed"""
+
+def chart_columns(spec: Dict[str, Any]) -> list:
+    """Columns a chart reads, without duplicates"""
+    if spec["chart_type"] == "pair_grid":
+        return list(dict.fromkeys([*spec["columns"], *([spec["hue"]] if spec.get("hue") else [])]))
+    return list(dict.fromkeys(col for col in (spec["x"], spec.get("y"), spec.get("hue")) if col))
+
+def render_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> bytes:
+    """Render a chart with the object-oriented Figure API.
+
+    No pyplot state is involved, so renders in different threads or processes
+    do not interfere. spec holds chart_type, x, y, hue, width, height, dpi and
+    format, plus the reduction planned for large data (see chart_reduction)."""
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(spec["width"], spec["height"]))
+    if spec["chart_type"] == "pair_grid":
+        _draw_pair_grid(fig, df, spec)
+    else:
+        draw_chart(fig, fig.subplots(), df, spec)
+    fig.tight_layout()
+    return _save(fig, spec)
+
+def _save(fig, spec: Dict[str, Any]) -> bytes:
+    buf = BytesIO()
+    # Without a date SVG output is byte-identical across renders
+    fig.savefig(buf, format=spec["format"], dpi=spec["dpi"],
+                metadata={"Date": None} if spec["format"] == "svg" else None)
+    return buf.getvalue()
+
+def draw_chart(fig, ax, df: pd.DataFrame, spec: Dict[str, Any]):
+    """Draw one chart into ax, applying its planned reduction"""
+    import seaborn as sns
+
+    plan = spec.get("reduction")
+    method = plan["method"] if plan else None
+    if method == "density":
+        _draw_density(fig, ax, df, spec, plan)
+        return
+    if method == "box_stats":
+        _draw_box_stats(ax, df, spec)
+        return
+    function, takes_y = CHART_TYPES[spec["chart_type"]]
+    kwargs = {"data": df, "x": spec["x"], "hue": spec.get("hue")}
+    if takes_y:
+        kwargs["y"] = spec.get("y")
+    else:
+        kwargs["kde"] = True
+    if method in ("lttb", "minmax"):
+        # Already one mean value per x; no bootstrapped band to compute
+        kwargs.update(data=reduce_line(df, spec, plan), errorbar=None)
+    elif method == "sample":
+        kwargs["data"] = sample_rows(df, plan)
+    elif method == "aggregate":
+        kwargs.update(data=aggregate_bars(df, spec), errorbar=None)
+    elif method == "binned":
+        kwargs["data"], edges = binned_histogram(df, spec)
+        # The same bins over the pre-counted centers, each weighted by its count
+        kwargs.update(weights="count", bins=len(edges) - 1, binrange=(edges[0], edges[-1]))
+    getattr(sns, function)(ax=ax, **kwargs)
+
+def render_composite(df: pd.DataFrame, specs: Sequence[Dict[str, Any]], layout: Dict[str, Any]):
+    """Draw several charts as the cells of one image; returns (bytes, seconds per chart).
+    layout holds columns, cell width/height, dpi and format."""
+    from matplotlib.figure import Figure
+
+    ncols = min(layout["columns"], len(specs))
+    nrows = -(-len(specs) // ncols)
+    fig = Figure(figsize=(layout["width"] * ncols, layout["height"] * nrows))
+    axes = fig.subplots(nrows, ncols, squeeze=False).ravel()
+    seconds = []
+    for ax, spec in zip(axes, specs):
+        start = time.perf_counter()
+        draw_chart(fig, ax, df, spec)
+        seconds.append(round(time.perf_counter() - start, 4))
+    for ax in axes[len(specs):]:
+        ax.set_visible(False)
+    fig.tight_layout()
+    return _save(fig, layout), seconds
+
+def _draw_pair_grid(fig, df: pd.DataFrame, spec: Dict[str, Any]):
+    """Histograms on the diagonal and scatter (or density) plots elsewhere, from
+    column values, bins and one row sample computed once for the whole grid"""
+    import seaborn as sns
+    from matplotlib.colors import LogNorm
+
+    columns, hue = spec["columns"], spec.get("hue")
+    grid = pair_grid_data(df, columns, hue, spec["max_points"], spec["bins"])
+    colors = sns.color_palette(n_colors=max(1, len(grid["levels"])))
+    axes = fig.subplots(len(columns), len(columns), squeeze=False)
+    for i, row in enumerate(columns):
+        for j, col in enumerate(columns):
+            ax = axes[i][j]
+            if i == j:
+                edges = grid["edges"][col]
+                for level, counts in enumerate(grid["counts"][col]):
+                    ax.stairs(counts, edges, fill=True, alpha=0.5, color=colors[level])
+            elif grid["density"]:
+                x, y = grid["values"][col], grid["values"][row]
+                finite = np.isfinite(x) & np.isfinite(y)
+                counts, x_edges, y_edges = np.histogram2d(x[finite], y[finite], bins=spec["bins"])
+                ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0), norm=LogNorm(), cmap="viridis")
+            else:
+                rows = grid["rows"]
+                point_colors = None if grid["codes"] is None else np.asarray(colors)[grid["codes"][rows]]
+                ax.scatter(grid["values"][col][rows], grid["values"][row][rows], s=4, c=point_colors,
+                           alpha=0.6, linewidths=0)
+            if i == len(columns) - 1:
+                ax.set_xlabel(str(col))
+            if j == 0:
+                ax.set_ylabel(str(row))
+    if hue is not None:
+        from matplotlib.patches import Patch
+        fig.legend(handles=[Patch(color=color, label=str(level)) for level, color in zip(grid["levels"], colors)],
+                   title=str(hue), loc="upper right")
+
+def _draw_density(fig, ax, df: pd.DataFrame, spec: Dict[str, Any], plan: Dict[str, Any]):
+    """Log-scaled 2-D histogram in place of a scatter of every point"""
+    from matplotlib.colors import LogNorm
+    counts, x_edges, y_edges = density_grid(df, spec, plan)
+    mesh = ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0), norm=LogNorm(), cmap="viridis")
+    fig.colorbar(mesh, ax=ax, label="points")
+    ax.set_xlabel(str(spec["x"]))
+    ax.set_ylabel(str(spec["y"]))
+
+def _draw_box_stats(ax, df: pd.DataFrame, spec: Dict[str, Any]):
+    """Boxes from per-group statistics, laid out like seaborn's dodged boxes"""
+    import seaborn as sns
+    from matplotlib.patches import Patch
+    stats, value, category, horizontal = box_stats(df, spec)
+    # A hue other than the category dodges boxes; the same column just colors them
+    dodge = all(len(box["key"]) == 2 for box in stats)
+    categories = list(dict.fromkeys(box["key"][0] for box in stats))
+    hues = list(dict.fromkeys(box["key"][-1] for box in stats)) if spec.get("hue") else [None]
+    colors = sns.color_palette(n_colors=len(hues))
+    width = 0.8 / len(hues) if dodge else 0.8
+    positions = [categories.index(box["key"][0]) + ((hues.index(box["key"][1]) - (len(hues) - 1) / 2) * width
+                                                    if dodge else 0) for box in stats]
+    artists = ax.bxp(stats, positions=positions, widths=width * 0.9, vert=not horizontal,
+                     showfliers=False, patch_artist=True, manage_ticks=False)
+    for box, patch in zip(stats, artists["boxes"]):
+        patch.set_facecolor(colors[hues.index(box["key"][-1]) if spec.get("hue") else 0])
+    set_ticks, set_value_label, set_category_label = (
+        (ax.set_yticks, ax.set_xlabel, ax.set_ylabel) if horizontal else (ax.set_xticks, ax.set_ylabel, ax.set_xlabel))
+    set_value_label(str(value))
+    if category is None:
+        # A single column's box, drawn unlabelled like seaborn's
+        set_ticks([])
+    else:
+        set_ticks(range(len(categories)), [str(c) for c in categories])
+        set_category_label(str(category))
+    if spec.get("hue"):
+        ax.legend(handles=[Patch(facecolor=color, label=str(h)) for h, color in zip(hues, colors)],
+                  title=str(spec["hue"]))
+
+def _warm_worker(pids=None):
+    """Process initializer: report the worker's pid, import the plotting stack,
+    load the font cache and draw once, so the first real render pays none of it"""
+    if pids is not None:
+        pids.put(os.getpid())
+    # seaborn writes into arrays pandas hands out read-only under copy-on-write;
+    # workers only render, so they can run without it
+    pd.set_option("mode.copy_on_write", False)
+    # Suppress seaborn/pandas deprecation warnings
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    import matplotlib
+    matplotlib.use("Agg")
+    import seaborn  # noqa: F401
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(1, 1))
+    fig.subplots().set_title("warm-up 0123456789")
+    fig.savefig(BytesIO(), format="png")
+
+def _ready() -> bool:
+    return True
+
+def _map_projection(snapshot_path: Optional[str], positions: Sequence[int],
+                    frame: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """The projected columns: mapped from the snapshot, or the frame sent along when
+    the version has no snapshot"""
+    return read_columns(snapshot_path, positions) if frame is None else frame
+
+def _render_projection(spec: Dict[str, Any], snapshot_path: Optional[str], positions: Sequence[int],
+                       frame: Optional[pd.DataFrame]) -> bytes:
+    """Worker task: map only the chart's columns and render"""
+    return render_chart(_map_projection(snapshot_path, positions, frame), spec)
+
+def _render_batch(specs: Sequence[Dict[str, Any]], snapshot_path: Optional[str], positions: Sequence[int],
+                  frame: Optional[pd.DataFrame]) -> List[Dict[str, Any]]:
+    """Worker task: map the batch's columns once and render each chart, timing it;
+    a failing chart reports its error without failing the others"""
+    df = _map_projection(snapshot_path, positions, frame)
+    results = []
+    for spec in specs:
+        start = time.perf_counter()
+        try:
+            content, error = render_chart(df, spec), None
+        except Exception as e:
+            content, error = None, str(e)
+        results.append({"content": content, "error": error, "seconds": round(time.perf_counter() - start, 4)})
+    return results
+
+def _render_composite(payload: Tuple[Sequence[Dict[str, Any]], Dict[str, Any]], snapshot_path: Optional[str],
+                      positions: Sequence[int], frame: Optional[pd.DataFrame]):
+    """Worker task: map the columns once and draw every chart into one image"""
+    specs, layout = payload
+    return render_composite(_map_projection(snapshot_path, positions, frame), specs, layout)
+
+class ChartRenderer:
+    """Pool of pre-warmed worker processes rendering charts.
+
+    Workers receive a snapshot path and column positions and memory-map just
+    those columns, so no dataset is pickled across. A render exceeding the
+    timeout kills the pool's workers and a fresh pool is started; renders that
+    were in flight on it are retried once. With workers=0 charts are rendered
+    in the CPU thread pool instead."""
+
+    def __init__(self, workers: int = CHART_RENDER_WORKERS, timeout: float = CHART_RENDER_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Per pool: the queue its workers report their pids on, and the pids seen so far
+        self._pid_queues: Dict[ProcessPoolExecutor, Any] = {}
+        self._pids: Dict[ProcessPoolExecutor, set] = {}
+        self._lock = threading.Lock()
+
+    def pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn avoids forking a process that already runs event-loop and pool threads
+                context = multiprocessing.get_context("spawn")
+                pids = context.SimpleQueue()
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker,
+                                                 initargs=(pids,), mp_context=context)
+                self._pid_queues[self._pool], self._pids[self._pool] = pids, set()
+                # Workers start on demand; one task each brings all of them up now
+                for _ in range(self.workers):
+                    self._pool.submit(_ready)
+                logger.info(f"Started chart renderer with {self.workers} workers")
+            return self._pool
+
+    def warm(self):
+        if self.workers > 0:
+            self.pool()
+
+    def worker_pids(self, pool: Optional[ProcessPoolExecutor] = None) -> set:
+        """Pids of the workers a pool (by default the current one) has started"""
+        with self._lock:
+            pool = self._pool if pool is None else pool
+            pids = self._pids.get(pool, set())
+            queue = self._pid_queues.get(pool)
+            while queue is not None and not queue.empty():
+                pids.add(queue.get())
+            return set(pids)
+
+    def _forget(self, pool: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+            self._pids.pop(pool, None)
+            queue = self._pid_queues.pop(pool, None)
+        if queue is not None:
+            queue.close()
+
+    def _kill(self, pool: ProcessPoolExecutor):
+        # The executor cannot cancel a running task; killing its workers can. Only
+        # live children are killed, so a pid reused by another process is never hit.
+        pids = self.worker_pids(pool)
+        self._forget(pool)
+        for process in multiprocessing.active_children():
+            if process.pid in pids:
+                process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, task, payload: Any, frame: pd.DataFrame, snapshot_path: Optional[str],
+                   positions: Optional[Sequence[int]], timeout: float):
+        """Run a worker task on payload; frame holds the projected columns and is only
+        sent to a worker when there is no snapshot to map them from"""
+        if self.workers <= 0:
+            return await run_cpu(task, payload, None, None, frame)
+        retry_broken = True
+        while True:
+            pool = self.pool()
+            future = pool.submit(task, payload, snapshot_path, positions, None if snapshot_path else frame)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Chart render exceeded {timeout}s; restarting renderer workers")
+                self._kill(pool)
+                self.warm()
+                raise ChartTimeoutError(f"Chart rendering exceeded {timeout} seconds")
+            except BrokenProcessPool:
+                # Another render timed out and took this pool down
+                self._kill(pool)
+                if not retry_broken:
+                    raise
+                retry_broken = False
+            except FileNotFoundError:
+                if snapshot_path is None:
+                    raise
+                # A newer version was published and pruned the files; send the columns instead
+                logger.info("Snapshot changed while rendering; sending the columns to the worker")
+                snapshot_path = None
+
+    async def render(self, spec: Dict[str, Any], frame: pd.DataFrame, snapshot_path: Optional[str] = None,
+                     positions: Optional[Sequence[int]] = None) -> bytes:
+        """Render one chart from the projected columns (see _run)"""
+        return await self._run(_render_projection, spec, frame, snapshot_path, positions, self.timeout)
+
+    async def render_many(self, specs: Sequence[Dict[str, Any]], frame: pd.DataFrame,
+                          snapshot_path: Optional[str] = None,
+                          positions: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+        """Render charts over one shared projection, spread across the workers.
+
+        Each worker maps the projection once for its share of the charts. Returns
+        {"content", "error", "seconds"} per spec, in order; a share that exceeds the
+        timeout (per chart it holds) reports every chart in it as timed out."""
+        shares = [list(range(start, len(specs), max(1, self.workers))) for start in range(max(1, self.workers))]
+        shares = [share for share in shares if share]
+
+        async def run_share(share):
+            try:
+                return await self._run(_render_batch, [specs[i] for i in share], frame, snapshot_path,
+                                       positions, self.timeout * len(share))
+            except ChartTimeoutError as e:
+                return [{"content": None, "error": str(e), "seconds": None} for _ in share]
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(specs)
+        for share, rendered in zip(shares, await asyncio.gather(*(run_share(share) for share in shares))):
+            for i, result in zip(share, rendered):
+                results[i] = result
+        return results
+
+    async def render_composite(self, specs: Sequence[Dict[str, Any]], layout: Dict[str, Any], frame: pd.DataFrame,
+                               snapshot_path: Optional[str] = None, positions: Optional[Sequence[int]] = None):
+        """Render charts into one image in a single worker; returns (bytes, seconds per chart)"""
+        return await self._run(_render_composite, (specs, layout), frame, snapshot_path, positions,
+                               self.timeout * len(specs))
+
+    def shutdown(self):
+        with self._lock:
+            pool = self._pool
+        if pool is not None:
+            self._forget(pool)
+            pool.shutdown(cancel_futures=True)
+
+renderer = ChartRenderer()
@@ -0,0 +1,96 @@
+import math
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterable, Optional
+
+# Entry key holding {column: stats} for the current version; saved in snapshots
+STATS_KEY = "column_stats"
+
+# Hashes kept by the k-minimum-values distinct estimator (~3% standard error)
+DISTINCT_SKETCH_SIZE = 1024
+SKETCH_CHUNK_ROWS = 1 << 20
+
+def json_scalar(value: Any) -> Any:
+    """numpy/pandas scalar -> JSON-friendly Python value (None for NaN/NaT)"""
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+def estimate_distinct(series: pd.Series, k: int = DISTINCT_SKETCH_SIZE) -> int:
+    """Distinct non-null values: exact for categoricals and below k values, otherwise
+    estimated from the k smallest 64-bit hashes (k-minimum-values sketch)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        return int(np.count_nonzero(np.bincount(codes[codes >= 0], minlength=1)))
+    hashes = pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy()
+    sketch = np.empty(0, dtype=np.uint64)
+    for start in range(0, len(hashes), SKETCH_CHUNK_ROWS):
+        chunk = hashes[start:start + SKETCH_CHUNK_ROWS]
+        if len(sketch) == k:
+            # Only hashes below the current k-th smallest can change the sketch
+            chunk = chunk[chunk < sketch[-1]]
+        sketch = np.sort(pd.unique(np.concatenate((sketch, chunk))))[:k]
+    if len(sketch) < k:
+        return int(len(sketch))
+    return int(round((k - 1) / (float(sketch[-1]) / float(np.iinfo(np.uint64).max))))
+
+def compute_column_stats(series: pd.Series) -> Dict[str, Any]:
+    """One full pass over a column: nulls, range, mean, distinct estimate and memory"""
+    null_count = int(series.isna().sum())
+    stats = {
+        "dtype": str(series.dtype),
+        "rows": len(series),
+        "null_count": null_count,
+        "min": None,
+        "max": None,
+        "mean": None,
+        "distinct": estimate_distinct(series) if null_count < len(series) else 0,
+        "memory": int(series.memory_usage(deep=True, index=False))
+    }
+    numeric = pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+    if null_count < len(series) and (numeric or pd.api.types.is_datetime64_any_dtype(series)):
+        stats["min"] = json_scalar(series.min())
+        stats["max"] = json_scalar(series.max())
+        if numeric:
+            stats["mean"] = json_scalar(series.mean())
+    return stats
+
+def column_stats(entry: Dict[str, Any], columns: Optional[Iterable[Any]] = None) -> Dict[Any, Dict[str, Any]]:
+    """Stats of the current version, computing only columns without a valid cached value.
+
+    A cached value is reused while its dtype and row count still match, so a
+    missed invalidation can at worst serve stats for the same shape of data."""
+    df = entry["current_df"]
+    cached = entry.get(STATS_KEY) or {}
+    fresh = {}
+    for col in df.columns:
+        stats = cached.get(col)
+        series = df[col]
+        if stats is None or stats["dtype"] != str(series.dtype) or stats["rows"] != len(series):
+            stats = compute_column_stats(series)
+        fresh[col] = stats
+    # Replacing the dict also drops stats of removed columns
+    entry[STATS_KEY] = fresh
+    if columns is None:
+        return fresh
+    return {col: fresh[col] for col in columns}
+
+def invalidate_column_stats(entry: Dict[str, Any], columns: Optional[Iterable[Any]] = None):
+    """Forget cached stats for the given columns, or for all of them"""
+    cached = entry.get(STATS_KEY)
+    if not cached:
+        return
+    if columns is None:
+        entry[STATS_KEY] = {}
+        return
+    # Copy so a snapshot of the previous version never sees the change
+    cached = dict(cached)
+    for col in columns:
+        cached.pop(col, None)
+    entry[STATS_KEY] = cached
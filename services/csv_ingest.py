@@ -0,0 +1,221 @@
+import csv
+import io
+import time
+from collections import deque
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from config import (
+    ENCODING_SAMPLE_SIZE,
+    PARALLEL_CSV_MIN_BYTES,
+    PARALLEL_CSV_CHUNK_SIZE,
+    PROCESS_POOL_WORKERS,
+)
+from services.encoding_utils import candidate_encodings
+from services.executors import get_process_pool
+
+logger = logging.getLogger(__name__)
+
+SNIFF_DELIMITERS = ',;\t|'
+
+def _no_progress(phase: str, **fields):
+    pass
+
+class _ProgressReader(io.BufferedIOBase):
+    """Binary file wrapper that reports how many bytes the parser has consumed"""
+
+    def __init__(self, fileobj, progress):
+        self._fileobj = fileobj
+        self._progress = progress
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fileobj.read(size)
+        self._progress("parsing", bytes_read=self._fileobj.tell())
+        return data
+
+    read1 = read
+
+    def readline(self, size: int = -1) -> bytes:
+        return self._fileobj.readline(size)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._fileobj.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._fileobj.tell()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+class ChunkAlignmentError(Exception):
+    """A newline-aligned chunk did not split cleanly into records (e.g. quoted newlines)"""
+
+def sniff_delimiter(text: str) -> str:
+    """Guess the delimiter from a decoded sample, defaulting to a comma"""
+    header = text.split('\n', 1)[0]
+    try:
+        sep = csv.Sniffer().sniff(text, delimiters=SNIFF_DELIMITERS).delimiter
+    except csv.Error:
+        return ','
+    return sep if sep in header else ','
+
+def _count_records(data: bytes) -> int:
+    """Count non-blank lines in a chunk without splitting it into Python objects"""
+    buf = np.frombuffer(data, dtype=np.uint8)
+    newlines = np.flatnonzero(buf == ord('\n'))
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(buf)]))
+    lengths = ends - starts
+    # Strip the '\r' of CRLF line endings before treating a line as blank
+    has_cr = lengths > 0
+    has_cr[has_cr] = buf[ends[has_cr] - 1] == ord('\r')
+    return int(np.count_nonzero(lengths - has_cr > 0))
+
+def _parse_chunk(data: bytes, columns: List[str], dtypes: Dict[str, type],
+                 sep: str, encoding: str) -> pd.DataFrame:
+    """Parse one newline-aligned chunk in a worker process"""
+    df = pd.read_csv(io.BytesIO(data), sep=sep, encoding=encoding, header=None,
+                     names=columns, dtype=dtypes, index_col=False)
+    if len(df) != _count_records(data):
+        raise ChunkAlignmentError("Chunk boundary fell inside a quoted field")
+    return df
+
+def _iter_chunks(fileobj, chunk_size: int):
+    """Yield chunks of roughly chunk_size bytes that end on a newline"""
+    while True:
+        data = fileobj.read(chunk_size)
+        if not data:
+            return
+        if not data.endswith(b'\n'):
+            data += fileobj.readline()
+        yield data
+
+def _infer_schema(sample: pd.DataFrame) -> Dict[str, type]:
+    """Pin text columns to str so every chunk agrees on them; numerics are left to each chunk"""
+    return {col: str for col in sample.columns if sample[col].dtype == object}
+
+def _merge_chunks(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate parsed chunks, refusing to mix numeric and non-numeric inferences"""
+    for col in frames[0].columns:
+        kinds = {frame[col].dtype for frame in frames}
+        numeric = all(pd.api.types.is_numeric_dtype(k) and not pd.api.types.is_bool_dtype(k) for k in kinds)
+        if len(kinds) > 1 and not numeric:
+            raise ChunkAlignmentError(f"Column '{col}' inferred as {sorted(map(str, kinds))} across chunks")
+    return pd.concat(frames, ignore_index=True, copy=False)
+
+def _read_parallel(fileobj, encoding: str, sep: str, workers: int, chunk_size: int,
+                   progress=_no_progress) -> Optional[Tuple[pd.DataFrame, int]]:
+    """Split the file at newlines and parse the chunks in the process pool.
+    Returns None when the layout is not safe to split, so the caller parses sequentially."""
+    # Only ASCII-compatible encodings keep '\n' as a single, unambiguous byte
+    if '\n'.encode(encoding) != b'\n':
+        return None
+
+    fileobj.seek(0)
+    header = fileobj.readline()
+    sample_bytes = header + fileobj.read(ENCODING_SAMPLE_SIZE)
+    sample_bytes = sample_bytes[:sample_bytes.rfind(b'\n') + 1]
+    fileobj.seek(len(header))
+    columns = list(pd.read_csv(io.BytesIO(header), sep=sep, encoding=encoding, nrows=0).columns)
+    sample = pd.read_csv(io.BytesIO(sample_bytes), sep=sep, encoding=encoding)
+    if list(sample.columns) != columns or not isinstance(sample.index, pd.RangeIndex):
+        return None
+    dtypes = _infer_schema(sample)
+
+    # Keep a bounded number of chunks in flight so the file is never fully in memory
+    pool = get_process_pool()
+    pending, frames = deque(), []
+    bytes_read, rows = len(header), 0
+
+    def collect():
+        nonlocal bytes_read, rows
+        future, size = pending.popleft()
+        frames.append(future.result())
+        bytes_read += size
+        rows += len(frames[-1])
+        progress("parsing", bytes_read=bytes_read, rows=rows)
+
+    try:
+        for data in _iter_chunks(fileobj, chunk_size):
+            pending.append((pool.submit(_parse_chunk, data, columns, dtypes, sep, encoding), len(data)))
+            if len(pending) >= 2 * workers:
+                collect()
+        while pending:
+            collect()
+        if not frames:
+            return sample.iloc[:0], 0
+        return _merge_chunks(frames), len(frames)
+    except (ChunkAlignmentError, pd.errors.ParserError) as e:
+        logger.info(f"Parallel CSV parse not possible, falling back to one core: {str(e)}")
+        return None
+    finally:
+        for future, _ in pending:
+            future.cancel()
+
+def read_csv_spool(fileobj, encodings=None, workers: int = PROCESS_POOL_WORKERS,
+                   chunk_size: int = PARALLEL_CSV_CHUNK_SIZE,
+                   min_parallel_bytes: int = PARALLEL_CSV_MIN_BYTES,
+                   progress=None, preview_rows: int = 0) -> Tuple[pd.DataFrame, Dict]:
+    """Parse a seekable binary CSV file, fanning large files out across processes.
+
+    Follows the read_csv_with_fallback strategy: the detected encoding is tried
+    first, then the default encodings, then a lenient utf-8 parse that skips bad
+    lines. Returns the DataFrame and ingest stats including throughput in MB/s.
+
+    progress(phase, **fields), if given, is called with the current phase and
+    bytes_read / rows as they advance; with preview_rows it also receives a
+    preview DataFrame of the first rows before the full parse starts."""
+    progress = progress or _no_progress
+    start = time.perf_counter()
+    fileobj.seek(0, io.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    progress("encoding_detection", bytes_read=0)
+    sample = fileobj.read(ENCODING_SAMPLE_SIZE)
+
+    df, used_encoding, sep, chunks = None, None, ',', 1
+    for encoding in candidate_encodings(sample, encodings):
+        try:
+            sep = sniff_delimiter(sample.decode(encoding, errors='ignore'))
+            if preview_rows:
+                fileobj.seek(0)
+                progress("encoding_detection", preview=pd.read_csv(fileobj, sep=sep, encoding=encoding,
+                                                                   nrows=preview_rows))
+            progress("parsing")
+            result = None
+            if workers > 1 and size >= min_parallel_bytes:
+                result = _read_parallel(fileobj, encoding, sep, workers, chunk_size, progress)
+            if result is not None:
+                df, chunks = result
+            else:
+                fileobj.seek(0)
+                df = pd.read_csv(_ProgressReader(fileobj, progress), sep=sep, encoding=encoding)
+            used_encoding = encoding
+            break
+        except (UnicodeDecodeError, LookupError, pd.errors.ParserError) as e:
+            logger.debug(f"Failed with {encoding}: {str(e)}")
+
+    if df is None:
+        # Fallback with error tolerance
+        fileobj.seek(0)
+        used_encoding = 'utf-8'
+        progress("parsing")
+        df = pd.read_csv(fileobj, sep=sep, encoding=used_encoding,
+                         encoding_errors='replace', on_bad_lines='skip')
+    progress("parsing", bytes_read=size, rows=len(df))
+
+    seconds = time.perf_counter() - start
+    stats = {
+        "bytes": size,
+        "seconds": round(seconds, 4),
+        "mb_per_s": round(size / (1024 * 1024) / seconds, 2) if seconds > 0 else None,
+        "encoding": used_encoding,
+        "delimiter": sep,
+        "chunks": chunks,
+    }
+    logger.info(f"Parsed {size} bytes in {chunks} chunk(s) at {stats['mb_per_s']} MB/s")
+    return df, stats
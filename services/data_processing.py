@@ -1,25 +1,10 @@
 import pandas as pd
 import numpy as np
 from scipy import stats
-from sklearn.ensemble import IsolationForest
-import math
-
-# Sanitization functions for JSON compatibility
-def sanitize_value(value):
-    """Replace NaN/Inf values with None for JSON compatibility"""
-    if isinstance(value, float):
-        if math.isnan(value) or math.isinf(value):
-            return None
-    return value
-
-def sanitize_dict(data):
-    """Recursively sanitize a dictionary or list"""
-    if isinstance(data, dict):
-        return {k: sanitize_dict(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [sanitize_dict(item) for item in data]
-    else:
-        return sanitize_value(data)
+from services.dtype_optimizer import fillna_compact
+from services.dataset import working_copy, commit_version
+from services.json_encoding import jsonable
+from services.outlier_detection import isolation_forest
 
 # Data processing functions
 def remove_columns(data_store, file_id: str, columns: list):
@@ -27,7 +12,7 @@ def remove_columns(data_store, file_id: str, columns: list):
         return None
     
     data = data_store[file_id]
-    df = data["current_df"].copy()
+    df = working_copy(data)
     
     # Check if columns exist
     missing_cols = [col for col in columns if col not in df.columns]
@@ -38,14 +23,13 @@ def remove_columns(data_store, file_id: str, columns: list):
     df = df.drop(columns=columns)
     
     # Update data store
-    data["current_df"] = df
-    data["actions"].append(f"Removed columns: {', '.join(columns)}")
+    commit_version(data, df, f"Removed columns: {', '.join(columns)}", touched=columns)
     
-    return sanitize_dict({
+    return jsonable({
         "remaining_columns": list(df.columns),
         "dtypes": df.dtypes.astype(str).to_dict(),
         "null_counts": df.isnull().sum().to_dict(),
-        "head": df.head(10).to_dict(orient="records"),
+        "head": df.head(10),
         "shape": list(df.shape)
     })
 
@@ -54,18 +38,18 @@ def fill_missing(data_store, file_id: str, column: str, method: str, custom_valu
         return None
     
     data = data_store[file_id]
-    df = data["current_df"].copy()
+    df = working_copy(data)
     
     if column not in df.columns:
         raise ValueError(f"Column '{column}' not found")
     
     null_count = df[column].isnull().sum()
     if null_count == 0:
-        return sanitize_dict({
+        return jsonable({
             "message": "No missing values found",
             "action": f"No missing values in column '{column}'",
             "null_counts": df.isnull().sum().to_dict(),
-            "head": df.head(10).to_dict(orient="records"),
+            "head": df.head(10),
             "shape": list(df.shape)
         })
     
@@ -99,20 +83,19 @@ def fill_missing(data_store, file_id: str, column: str, method: str, custom_valu
             raise ValueError(f"Invalid method '{method}' for column type")
         
         # Fill missing values
-        df[column] = df[column].fillna(fill_value)
+        df[column] = fillna_compact(df[column], fill_value)
         action_msg = f"Filled {null_count} missing values in '{column}' with {method}"
         if method == 'custom':
             action_msg += f" (value: {fill_value})"
         
         # Update data store
-        data["current_df"] = df
-        data["actions"].append(action_msg)
+        commit_version(data, df, action_msg, touched=[column])
         
-        return sanitize_dict({
+        return jsonable({
             "message": "Missing values filled successfully",
             "action": action_msg,
             "null_counts": df.isnull().sum().to_dict(),
-            "head": df.head(10).to_dict(orient="records"),
+            "head": df.head(10),
             "shape": list(df.shape)
         })
         
@@ -139,7 +122,7 @@ def detect_outliers(data_store, file_id: str, column: str, method: str):
             lower_bound = Q1 - 1.5 * IQR
             upper_bound = Q3 + 1.5 * IQR
             outliers = df[(df[column] < lower_bound) | (df[column] > upper_bound)]
-            return sanitize_dict({
+            return jsonable({
                 "outlier_count": len(outliers),
                 "outlier_indices": outliers.index.tolist(),
                 "lower_bound": float(lower_bound),
@@ -149,18 +132,16 @@ def detect_outliers(data_store, file_id: str, column: str, method: str):
         elif method == 'zscore':
             z_scores = np.abs(stats.zscore(df[column]))
             outliers = df[z_scores > 3]
-            return sanitize_dict({
+            return jsonable({
                 "outlier_count": len(outliers),
                 "outlier_indices": outliers.index.tolist()
             })
         
         elif method == 'isolation_forest':
-            clf = IsolationForest(contamination=0.05, random_state=42)
-            preds = clf.fit_predict(df[[column]])
-            outliers = df[preds == -1]
-            return sanitize_dict({
-                "outlier_count": len(outliers),
-                "outlier_indices": outliers.index.tolist()
+            forest = isolation_forest(df, [column], contamination=0.05)
+            return jsonable({
+                "outlier_count": int(forest["mask"].sum()),
+                "outlier_indices": df.index[forest["mask"]]
             })
         
         raise ValueError("Invalid detection method")
@@ -172,12 +153,14 @@ def handle_outliers(data_store, file_id: str, action: str, column: str, outlier_
         return None
         
     data = data_store[file_id]
-    df = data["current_df"].copy()
+    df = working_copy(data)
     
     if column not in df.columns:
         raise ValueError("Column not found")
     
     try:
+        # Columns whose values change; removing rows changes all of them
+        touched = None
         if action == 'remove':
             df = df.drop(index=outlier_indices)
             action_msg = f"Removed {len(outlier_indices)} outliers from '{column}'"
@@ -188,24 +171,27 @@ def handle_outliers(data_store, file_id: str, action: str, column: str, outlier_
             IQR = Q3 - Q1
             lower_bound = Q1 - 1.5 * IQR
             upper_bound = Q3 + 1.5 * IQR
-            df.loc[outlier_indices, column] = df.loc[outlier_indices, column].clip(lower_bound, upper_bound)
+            # Assign the whole column so downcast integers upcast instead of truncating
+            is_outlier = df.index.isin(outlier_indices)
+            df[column] = df[column].where(~is_outlier, df[column].clip(lower_bound, upper_bound))
             action_msg = f"Capped {len(outlier_indices)} outliers in '{column}'"
+            touched = [column]
         
         elif action == 'mark':
             df['is_outlier'] = 0
             df.loc[outlier_indices, 'is_outlier'] = 1
             action_msg = f"Marked {len(outlier_indices)} outliers in '{column}'"
+            touched = ['is_outlier']
         
         else:
             raise ValueError("Invalid action")
         
-        data["current_df"] = df
-        data["actions"].append(action_msg)
+        commit_version(data, df, action_msg, touched)
         
-        return sanitize_dict({
+        return jsonable({
             "message": "Outliers handled successfully",
             "action": action_msg,
-            "head": df.head(10).to_dict(orient="records"),
+            "head": df.head(10),
             "shape": list(df.shape)
         })
     except Exception as e:
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterable, Optional, Tuple
+from services.column_stats import invalidate_column_stats
+from services.sketches import SKETCHES_KEY, invalidate_sketches
+
+# With copy-on-write, shallow copies share column buffers and a column is only
+# duplicated when an operation writes to it, so versions cost what they change
+pd.set_option("mode.copy_on_write", True)
+
+FRAME_KEYS = ("original_df", "current_df")
+
+def new_dataset(df: pd.DataFrame, filename: str, **extra: Any) -> Dict[str, Any]:
+    """Build a data_store entry whose original and current frames share every column"""
+    entry = {
+        "original_df": df,
+        "current_df": df.copy(deep=False),
+        "filename": filename,
+        "actions": [],
+        "version": 0
+    }
+    entry.update(extra)
+    return entry
+
+def working_copy(entry: Dict[str, Any]) -> pd.DataFrame:
+    """Shallow copy of the current version for an operation to modify"""
+    return entry["current_df"].copy(deep=False)
+
+def commit_version(entry: Dict[str, Any], df: pd.DataFrame, action: str,
+                   touched: Optional[Iterable[Any]] = None) -> int:
+    """Publish df as the next version of the dataset and record the action.
+    touched lists the columns whose values changed (None: all of them, e.g. when
+    rows were removed) so only their cached statistics and sketches are dropped."""
+    invalidate_column_stats(entry, touched)
+    invalidate_sketches(entry, touched)
+    entry["current_df"] = df
+    entry["actions"].append(action)
+    entry["version"] = entry.get("version", 0) + 1
+    return entry["version"]
+
+def column_buffer_key(series: pd.Series) -> Tuple[str, int]:
+    """Identify the buffer behind a column so versions sharing it are counted once"""
+    values = series.values
+    if isinstance(values, pd.Categorical):
+        values = values.codes
+    if isinstance(values, np.ndarray):
+        return str(values.dtype), values.__array_interface__["data"][0]
+    return str(series.dtype), id(values)
+
+def is_memory_mapped(series: pd.Series) -> bool:
+    """True when the column is a view of a snapshot file rather than process memory"""
+    values = series.values
+    if isinstance(values, pd.Categorical):
+        values = values.codes
+    while isinstance(values, np.ndarray):
+        if isinstance(values, np.memmap):
+            return True
+        values = values.base
+    return False
+
+def entry_nbytes(entry: Dict[str, Any]) -> int:
+    """Deep memory of an entry's frames and column sketches, counting shared column
+    buffers once. Memory-mapped columns live in the shared page cache and are not counted."""
+    seen = {}
+    total = sum(sketch.nbytes for sketch in (entry.get(SKETCHES_KEY) or {}).values())
+    for key in FRAME_KEYS:
+        df = entry.get(key)
+        if df is None:
+            continue
+        total += int(df.index.memory_usage(deep=True))
+        for col in df.columns:
+            series = df[col]
+            buffer_key = column_buffer_key(series)
+            if buffer_key not in seen:
+                # Holding the series keeps id()-based keys from being reused
+                seen[buffer_key] = series
+                if not is_memory_mapped(series):
+                    total += int(series.memory_usage(deep=True, index=False))
+    return total
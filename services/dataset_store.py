@@ -0,0 +1,181 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Dict, Optional
+from config import CATALOG_VERSION_CHECK_INTERVAL, DATASET_MEMORY_BUDGET
+from services.dataset import FRAME_KEYS, entry_nbytes
+from services.catalog import DatasetCatalog, DatasetConflictError
+from services.snapshots import read_snapshot
+
+logger = logging.getLogger(__name__)
+
+class DatasetEntry(dict):
+    """data_store entry that tells its store when a frame is replaced or a version is committed"""
+
+    def __init__(self, data: Dict[str, Any], on_change=None):
+        super().__init__(data)
+        self._on_change = on_change
+
+    def __setitem__(self, key, value):
+        previous = self.get(key)
+        super().__setitem__(key, value)
+        if self._on_change is not None and (key in FRAME_KEYS or key == "version"):
+            self._on_change(self, key, previous)
+
+class DatasetStore(MutableMapping):
+    """Mapping of file_id -> dataset entry, backed by the dataset catalog.
+
+    Every new dataset and committed version is published to the catalog, so
+    any worker process can serve any file_id. Resident entries act as a cache
+    in front of it: they are measured with memory_usage(deep=True), counting
+    column buffers shared between original_df and current_df once and skipping
+    columns memory-mapped from snapshots, and least
+    recently used entries are dropped back to their snapshot when the total
+    exceeds the budget. An entry is reloaded when another worker has published
+    a newer version; the catalog is asked at most every version_check_interval
+    seconds per dataset.
+
+    Snapshots are written and loaded outside the store's lock, which only guards
+    the resident map, so persisting one dataset never blocks access to another.
+    Requests on the same dataset are serialized by its dataset_lock."""
+
+    def __init__(self, budget_bytes: int = DATASET_MEMORY_BUDGET, catalog: Optional[DatasetCatalog] = None,
+                 version_check_interval: float = CATALOG_VERSION_CHECK_INTERVAL):
+        self.budget_bytes = budget_bytes
+        self.catalog = catalog or DatasetCatalog()
+        self.version_check_interval = version_check_interval
+        self._resident: "OrderedDict[str, DatasetEntry]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        # When each resident entry's version was last confirmed against the catalog
+        self._checked: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.spills = 0
+
+    def __getitem__(self, file_id: str) -> DatasetEntry:
+        with self._lock:
+            entry = self._resident.get(file_id)
+            if entry is not None and time.monotonic() - self._checked.get(file_id, 0.0) < self.version_check_interval:
+                return self._hit(file_id)
+        if entry is not None:
+            latest = self.catalog.version(file_id)
+            with self._lock:
+                if latest is None:
+                    self._drop(file_id)
+                    raise KeyError(file_id)
+                if self._resident.get(file_id) is entry and latest == entry.get("version", 0):
+                    self._checked[file_id] = time.monotonic()
+                    return self._hit(file_id)
+            logger.info(f"Dataset {file_id} moved to version {latest} in another worker; reloading")
+        loaded = self.catalog.load(file_id)
+        if loaded is None:
+            raise KeyError(file_id)
+        entry = self._wrap(file_id, loaded)
+        size = entry_nbytes(entry)
+        with self._lock:
+            self.misses += 1
+            return self._admit(file_id, entry, size)
+
+    def __setitem__(self, file_id: str, value: Dict[str, Any]):
+        entry = self._wrap(file_id, value)
+        self._map_frames(entry, self.catalog.publish(file_id, entry))
+        size = entry_nbytes(entry)
+        with self._lock:
+            self._admit(file_id, entry, size)
+
+    def __delitem__(self, file_id: str):
+        if file_id not in self:
+            raise KeyError(file_id)
+        with self._lock:
+            self._drop(file_id)
+        self.catalog.delete(file_id)
+
+    def __contains__(self, file_id) -> bool:
+        return file_id in self._resident or self.catalog.version(file_id) is not None
+
+    def __iter__(self):
+        return iter(self.catalog.ids())
+
+    def __len__(self) -> int:
+        return len(self.catalog.ids())
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters and occupancy, e.g. for the health endpoint"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "spills": self.spills,
+            "resident": len(self._resident),
+            "resident_bytes": self.resident_bytes,
+            "budget_bytes": self.budget_bytes
+        }
+
+    def _wrap(self, file_id: str, value: Dict[str, Any]) -> DatasetEntry:
+        return DatasetEntry(value, on_change=lambda e, key, previous, fid=file_id: self._changed(fid, e, key, previous))
+
+    def _hit(self, file_id: str) -> DatasetEntry:
+        self.hits += 1
+        self._resident.move_to_end(file_id)
+        return self._resident[file_id]
+
+    def _admit(self, file_id: str, entry: DatasetEntry, size: int) -> DatasetEntry:
+        self._resident[file_id] = entry
+        self._resident.move_to_end(file_id)
+        self._sizes[file_id] = size
+        self._checked[file_id] = time.monotonic()
+        self._enforce_budget(keep=file_id)
+        return entry
+
+    def _changed(self, file_id: str, entry: DatasetEntry, key: str, previous: Any):
+        if key != "version":
+            size = entry_nbytes(entry)
+            with self._lock:
+                if self._resident.get(file_id) is entry:
+                    self._sizes[file_id] = size
+                    self._enforce_budget(keep=file_id)
+            return
+        # Published even if the entry was evicted while a request held it; the
+        # optimistic check still refuses it if another copy committed first
+        try:
+            path = self.catalog.publish(file_id, entry, expected_version=previous)
+        except DatasetConflictError:
+            # Our copy is stale; the next access reloads the winning version
+            with self._lock:
+                if self._resident.get(file_id) is entry:
+                    self._drop(file_id)
+            raise
+        self._map_frames(entry, path)
+        size = entry_nbytes(entry)
+        with self._lock:
+            self._admit(file_id, entry, size)
+
+    def _map_frames(self, entry: DatasetEntry, path: str):
+        """Swap freshly published frames for their memory-mapped snapshot, so this
+        worker shares the same pages as every other worker serving the dataset"""
+        mapped = read_snapshot(path)
+        for key in FRAME_KEYS:
+            if key in mapped:
+                dict.__setitem__(entry, key, mapped[key])
+
+    def _enforce_budget(self, keep: Optional[str] = None):
+        for file_id in list(self._resident):
+            if self.resident_bytes <= self.budget_bytes:
+                return
+            if file_id != keep:
+                self._drop(file_id)
+                self.spills += 1
+                logger.info(f"Evicted dataset {file_id}; it will be reloaded from its snapshot")
+        if self.resident_bytes > self.budget_bytes:
+            logger.warning(f"Dataset {keep} alone exceeds the memory budget of {self.budget_bytes} bytes")
+
+    def _drop(self, file_id: str):
+        self._resident.pop(file_id, None)
+        self._sizes.pop(file_id, None)
+        self._checked.pop(file_id, None)
@@ -0,0 +1,139 @@
+import os
+import glob
+import json
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from typing import Any, Dict, List, Optional
+from config import DETECTION_CACHE_BUDGET, DETECTIONS_PER_DATASET
+from services.outlier_detection import expand_mask
+
+logger = logging.getLogger(__name__)
+
+# Subdirectory of a dataset's directory holding saved detections
+DETECTIONS_DIR = "detections"
+
+class DetectionConflictError(Exception):
+    """The dataset changed after the detection was made"""
+
+# Detections made by this process, most recently used last
+_detections: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_detections_bytes = 0
+_detections_lock = threading.Lock()
+
+def _nbytes(detection: Dict[str, Any]) -> int:
+    return sum(mask["data"].nbytes for mask in detection["masks"])
+
+def _remember(detection: Dict[str, Any]):
+    global _detections_bytes
+    with _detections_lock:
+        if detection["detection_id"] in _detections:
+            return
+        _detections[detection["detection_id"]] = detection
+        _detections_bytes += _nbytes(detection)
+        while _detections_bytes > DETECTION_CACHE_BUDGET and len(_detections) > 1:
+            _, evicted = _detections.popitem(last=False)
+            _detections_bytes -= _nbytes(evicted)
+
+def _path(directory: str, version: int, detection_id: str) -> str:
+    return os.path.join(directory, DETECTIONS_DIR, f"v{version}-{detection_id}.npz")
+
+def _prune_saved(directory: str, version: int):
+    """Remove saved detections of older versions and all but the most recently used
+    DETECTIONS_PER_DATASET of the current one"""
+    current = []
+    for path in glob.glob(os.path.join(directory, DETECTIONS_DIR, "v*-*.npz")):
+        try:
+            if int(os.path.basename(path)[1:].split("-", 1)[0]) < version:
+                os.remove(path)
+            else:
+                current.append((os.path.getmtime(path), path))
+        except (ValueError, OSError):
+            continue
+    current.sort()
+    for _, path in current[:max(0, len(current) - DETECTIONS_PER_DATASET)]:
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+
+def _touch(directory: str, detection: Dict[str, Any]):
+    """Mark a saved detection as used, so pruning keeps it over older ones"""
+    try:
+        os.utime(_path(directory, detection["version"], detection["detection_id"]))
+    except OSError:
+        pass
+
+def store_detection(file_id: str, version: int, rows: int, masks: List[Dict[str, Any]],
+                    directory: str) -> str:
+    """Keep the masks of one detect call under a new detection_id.
+
+    Each mask is {"column", "method", "encoding", "data", "count", "lower_bound",
+    "upper_bound"} with data in compact_mask() form. The detection is cached in
+    memory and saved next to the dataset so other workers can resolve it;
+    detections of older versions, and the least recently used ones beyond
+    DETECTIONS_PER_DATASET, are removed."""
+    detection_id = uuid.uuid4().hex
+    detection = {"detection_id": detection_id, "file_id": file_id, "version": version,
+                 "rows": rows, "masks": masks}
+    _remember(detection)
+    path = _path(directory, version, detection_id)
+    meta = {key: value for key, value in detection.items() if key != "masks"}
+    meta["masks"] = [{k: v for k, v in mask.items() if k != "data"} for mask in masks]
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **{f"m{i}": mask["data"] for i, mask in enumerate(masks)})
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logger.warning(f"Could not save detection {detection_id} of {file_id}: {str(e)}")
+    _prune_saved(directory, version)
+    return detection_id
+
+def load_detection(file_id: str, detection_id: str, directory: str) -> Optional[Dict[str, Any]]:
+    """Detection made by this or another worker, or None if unknown or expired"""
+    with _detections_lock:
+        detection = _detections.get(detection_id)
+        if detection is not None:
+            _detections.move_to_end(detection_id)
+    if detection is None:
+        # The id is a uuid hex, so it cannot escape the directory
+        paths = glob.glob(os.path.join(directory, DETECTIONS_DIR, f"v*-{os.path.basename(detection_id)}.npz"))
+        if not paths:
+            return None
+        try:
+            with np.load(paths[0]) as saved:
+                detection = json.loads(str(saved["meta"]))
+                for i, mask in enumerate(detection["masks"]):
+                    mask["data"] = saved[f"m{i}"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable detection {paths[0]}: {str(e)}")
+            return None
+        _remember(detection)
+    if detection["file_id"] != file_id:
+        return None
+    _touch(directory, detection)
+    return detection
+
+def detection_mask(detection: Dict[str, Any], version: int, column: Optional[str] = None,
+                   method: Optional[str] = None):
+    """(row mask, mask record) of one column/method of a detection.
+
+    column and method may be omitted when the detection holds a single match.
+    Raises DetectionConflictError when the dataset is no longer at the
+    detection's version, ValueError when the selection is unknown or ambiguous."""
+    if detection["version"] != version:
+        raise DetectionConflictError(
+            f"Dataset changed since detection {detection['detection_id']} "
+            f"(version {detection['version']}, now {version}); run detection again"
+        )
+    matches = [mask for mask in detection["masks"]
+               if (column is None or mask["column"] == column) and (method is None or mask["method"] == method)]
+    if len(matches) != 1:
+        available = ", ".join(f"{m['column']}/{m['method']}" for m in detection["masks"])
+        problem = "matches no mask" if not matches else "is ambiguous"
+        raise ValueError(f"Selection {column or '*'}/{method or '*'} {problem}; available: {available}")
+    mask = matches[0]
+    return expand_mask(mask["encoding"], mask["data"], detection["rows"]), mask
@@ -0,0 +1,85 @@
+import logging
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Tuple
+from config import CATEGORY_MAX_RATIO, ARROW_STRINGS
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+def _downcast_float(series: pd.Series) -> pd.Series:
+    """Use float32 only when every value survives the round trip"""
+    if series.dtype == np.float32:
+        return series
+    candidate = series.astype(np.float32)
+    if np.array_equal(candidate.to_numpy(dtype=np.float64), series.to_numpy(dtype=np.float64), equal_nan=True):
+        return candidate
+    return series
+
+def _compact_object(series: pd.Series, category_max_ratio: float, arrow_strings: bool) -> pd.Series:
+    """Turn low-cardinality text into categories and, optionally, the rest into Arrow strings"""
+    non_null = series.count()
+    if non_null == 0:
+        return series
+    if series.nunique(dropna=True) / non_null <= category_max_ratio:
+        return series.astype('category')
+    if arrow_strings and HAS_PYARROW and pd.api.types.infer_dtype(series, skipna=True) == 'string':
+        return series.astype('string[pyarrow]')
+    return series
+
+def optimize_dtypes(df: pd.DataFrame, category_max_ratio: float = CATEGORY_MAX_RATIO,
+                    arrow_strings: bool = ARROW_STRINGS) -> Tuple[pd.DataFrame, Dict]:
+    """Shrink a freshly parsed frame to the smallest safe dtypes.
+    Returns the compacted frame and a per-column memory report in bytes."""
+    before = df.memory_usage(deep=True, index=False)
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            pass
+        elif pd.api.types.is_integer_dtype(series):
+            series = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            series = _downcast_float(series)
+        elif series.dtype == object:
+            series = _compact_object(series, category_max_ratio, arrow_strings)
+        columns[col] = series
+    optimized = pd.DataFrame(columns, index=df.index, copy=False)
+    after = optimized.memory_usage(deep=True, index=False)
+
+    report = {
+        "columns": {
+            str(col): {
+                "before": int(before[col]),
+                "after": int(after[col]),
+                "dtype": str(optimized[col].dtype)
+            } for col in df.columns
+        },
+        "total_before": int(before.sum()),
+        "total_after": int(after.sum())
+    }
+    logger.info(f"Compacted frame from {report['total_before']} to {report['total_after']} bytes")
+    return optimized, report
+
+def fillna_compact(series: pd.Series, value: Any) -> pd.Series:
+    """fillna that keeps compacted dtypes: new categories are registered and
+    numeric fill values are cast to the column's width instead of upcasting it.
+    value may also be a Series of per-row fill values aligned with series."""
+    per_row = isinstance(value, pd.Series)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        values = value.dropna().unique() if per_row else [value]
+        new = pd.Index(values).difference(series.cat.categories)
+        if len(new):
+            series = series.cat.add_categories(new)
+        return series.fillna(value.astype(object) if per_row else value)
+    if pd.api.types.is_float_dtype(series):
+        if per_row and pd.api.types.is_numeric_dtype(value):
+            return series.fillna(value.astype(series.dtype))
+        if isinstance(value, (int, float, np.number)):
+            return series.fillna(series.dtype.type(value))
+    return series.fillna(value)
@@ -11,15 +11,22 @@ def detect_encoding(contents, min_confidence=0.7):
     logger.info(f"Encoding detection: {result['encoding']} (confidence: {result['confidence']})")
     return result['encoding'] if result['confidence'] > min_confidence else 'utf-8'
 
-def read_csv_with_fallback(contents, encodings=None):
-    """Robust CSV reader with multiple fallback strategies"""
+def candidate_encodings(contents, encodings=None):
+    """Encodings to try in order: the detected one first, then the defaults"""
     # Default encoding priority
-    encodings = encodings or ['utf-8', 'ISO-8859-1', 'cp1252', 'latin1']
+    encodings = list(encodings or ['utf-8', 'ISO-8859-1', 'cp1252', 'latin1'])
     
-    # Try detected encoding first
-    primary_enc = detect_encoding(contents)
+    # Try detected encoding first; an ASCII sample says nothing about the rest of the file
+    primary_enc = detect_encoding(contents) or 'utf-8'
+    if primary_enc.lower() == 'ascii':
+        primary_enc = 'utf-8'
     if primary_enc not in encodings:
         encodings.insert(0, primary_enc)
+    return encodings
+
+def read_csv_with_fallback(contents, encodings=None):
+    """Robust CSV reader with multiple fallback strategies"""
+    encodings = candidate_encodings(contents, encodings)
     
     # Attempt reading with each encoding
     for encoding in encodings:
@@ -0,0 +1,314 @@
+import os
+import glob
+import math
+import time
+import shutil
+import hashlib
+import logging
+from array import array
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from config import EXCEL_CACHE, EXCEL_CACHE_DIR, EXCEL_CACHE_ENTRIES
+from services.snapshots import write_snapshot, read_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Column added when several sheets are stacked into one frame
+SHEET_COLUMN = "sheet"
+
+# Rows between progress reports while streaming a sheet
+PROGRESS_ROWS = 10000
+
+# Integers beyond this cannot round-trip through the float64 buffer
+_MAX_EXACT_INT = 2 ** 53
+
+class SheetNotFoundError(ValueError):
+    """A requested sheet does not exist in the workbook"""
+
+def _no_progress(phase: str, **fields):
+    pass
+
+class _ColumnBuilder:
+    """Accumulates one column's cells in a typed buffer while the sheet streams.
+
+    Numbers go to a float64 array (remembering whether all were integers),
+    booleans to a byte array (-1 marking a blank) and datetimes to a list; a
+    column only falls back to Python objects once it actually mixes kinds."""
+
+    __slots__ = ("kind", "numbers", "flags", "items", "all_int", "length")
+
+    def __init__(self, length: int = 0):
+        self.kind = "empty"
+        self.numbers = array("d")
+        self.flags = array("b")
+        self.items: List[Any] = []
+        self.all_int = True
+        self.length = 0
+        for _ in range(length):
+            self.append(None)
+
+    def append(self, value: Any):
+        self.length += 1
+        if value is None:
+            if self.kind == "number":
+                self.numbers.append(math.nan)
+            elif self.kind == "bool":
+                self.flags.append(-1)
+            elif self.kind in ("datetime", "object"):
+                self.items.append(pd.NaT if self.kind == "datetime" else np.nan)
+            return
+        if isinstance(value, bool):
+            kind = "bool"
+        elif isinstance(value, (int, float)):
+            kind = "number" if not isinstance(value, int) or abs(value) <= _MAX_EXACT_INT else "object"
+        elif isinstance(value, (datetime, date)):
+            kind = "datetime"
+        else:
+            kind = "object"
+        if self.kind == "empty":
+            self._start(kind)
+        elif kind != self.kind and self.kind != "object":
+            self._to_objects()
+
+        if self.kind == "number":
+            self.numbers.append(value)
+            # read_excel also turns integral floats (3.0) into ints
+            self.all_int = self.all_int and (isinstance(value, int) or value.is_integer())
+        elif self.kind == "bool":
+            self.flags.append(value)
+        else:
+            self.items.append(value)
+
+    def _start(self, kind: str):
+        # Cells before the first value were all empty
+        leading = self.length - 1
+        self.kind = kind
+        if kind == "number":
+            self.numbers.extend([math.nan] * leading)
+        elif kind == "bool":
+            self.flags.extend([-1] * leading)
+        elif leading:
+            self.items.extend([pd.NaT if kind == "datetime" else np.nan] * leading)
+
+    def _to_objects(self):
+        if self.kind == "number":
+            self.items = [
+                np.nan if math.isnan(v) else (int(v) if self.all_int else v)
+                for v in self.numbers
+            ]
+            self.numbers = array("d")
+        elif self.kind == "bool":
+            self.items = [np.nan if v < 0 else bool(v) for v in self.flags]
+            self.flags = array("b")
+        elif self.kind == "datetime":
+            self.items = [np.nan if v is pd.NaT else v for v in self.items]
+        self.kind = "object"
+
+    def pad(self, length: int):
+        while self.length < length:
+            self.append(None)
+
+    def truncate(self, length: int):
+        """Drop trailing cells (e.g. empty rows after the data)"""
+        if self.length <= length:
+            return
+        del self.numbers[length:], self.flags[length:], self.items[length:]
+        self.length = length
+
+    def finish(self) -> Any:
+        if self.kind == "number":
+            values = np.frombuffer(self.numbers, dtype=np.float64)
+            if self.all_int and not np.isnan(values).any():
+                return values.astype(np.int64)
+            return values.copy()
+        if self.kind == "bool":
+            flags = np.frombuffer(self.flags, dtype=np.int8)
+            if not (flags < 0).any():
+                return flags.astype(bool)
+            # Booleans with blanks become True/False/NaN objects
+            self._to_objects()
+        if self.kind == "datetime":
+            try:
+                return pd.to_datetime(pd.Series(self.items, dtype=object)).values
+            except (pd.errors.OutOfBoundsDatetime, OverflowError):
+                # Dates outside the datetime64[ns] range stay Python objects
+                self._to_objects()
+        if self.kind == "empty":
+            return np.full(self.length, np.nan)
+        values = np.empty(self.length, dtype=object)
+        values[:] = self.items
+        return values
+
+def _header_labels(row: Sequence[Any]) -> List[Any]:
+    """Column labels as pandas would name them: blanks become 'Unnamed: i', duplicates get '.n'"""
+    labels, seen = [], {}
+    for i, value in enumerate(row):
+        label = f"Unnamed: {i}" if value is None else value
+        if label in seen:
+            seen[label] += 1
+            label = f"{label}.{seen[label]}"
+        seen.setdefault(label, 0)
+        labels.append(label)
+    return labels
+
+def _read_sheet(ws, progress, preview_rows: int, rows_before: int) -> pd.DataFrame:
+    """Stream one worksheet into typed column buffers"""
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    labels = _header_labels(header)
+    builders = [_ColumnBuilder() for _ in labels]
+    length, kept = 0, 0
+    preview: Optional[List[Sequence[Any]]] = [] if preview_rows else None
+
+    for row in rows:
+        if len(row) > len(labels):
+            # Data wider than the header gets unnamed columns, as in read_excel
+            for i in range(len(labels), len(row)):
+                labels.append(f"Unnamed: {i}")
+                builders.append(_ColumnBuilder(length))
+        for builder, value in zip(builders, row):
+            builder.append(value)
+        length += 1
+        for builder in builders[len(row):]:
+            builder.pad(length)
+        if any(value is not None for value in row):
+            kept = length
+        if preview is not None:
+            preview.append(row)
+            if len(preview) == preview_rows:
+                progress("parsing", preview=pd.DataFrame(preview, columns=labels[:max(map(len, preview))]))
+                preview = None
+        if length % PROGRESS_ROWS == 0:
+            progress("parsing", rows=rows_before + length)
+
+    if preview:
+        progress("parsing", preview=pd.DataFrame(preview, columns=labels[:max(map(len, preview))]))
+    # Trailing empty rows are formatting, not data
+    columns = {}
+    for i, builder in enumerate(builders):
+        builder.truncate(kept)
+        columns[i] = builder.finish()
+    df = pd.DataFrame(columns, copy=False)
+    df.columns = labels
+    return df
+
+def _select_sheets(sheet_names: List[str], sheets: Optional[Sequence[str]]) -> List[str]:
+    if not sheets:
+        return sheet_names[:1]
+    if list(sheets) == ["*"]:
+        return list(sheet_names)
+    missing = [name for name in sheets if name not in sheet_names]
+    if missing:
+        raise SheetNotFoundError(
+            f"Sheets not found: {', '.join(missing)}. Available: {', '.join(sheet_names)}"
+        )
+    return list(dict.fromkeys(sheets))
+
+def _stack_sheets(frames: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """One frame per sheet, or all of them stacked with a column naming the source sheet"""
+    if len(frames) == 1:
+        return next(iter(frames.values()))
+    labelled = []
+    for name, frame in frames.items():
+        frame = frame.copy(deep=False)
+        frame.insert(0, SHEET_COLUMN if SHEET_COLUMN not in frame.columns else f"_{SHEET_COLUMN}", name)
+        labelled.append(frame)
+    return pd.concat(labelled, ignore_index=True, copy=False)
+
+def content_hash(fileobj, chunk_size: int = 1024 * 1024) -> str:
+    """sha256 of a seekable binary file, read in chunks"""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+def _cache_directory(cache_dir: str, digest: str, sheets: Optional[Sequence[str]]) -> str:
+    selection = hashlib.sha1("\x00".join(sheets or ()).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{digest}-{selection}")
+
+def _load_cached(directory: str) -> Optional[Dict[str, Any]]:
+    manifests = sorted(glob.glob(os.path.join(directory, "*.manifest")))
+    if not manifests:
+        return None
+    try:
+        entry = read_snapshot(manifests[0])
+    except (OSError, EOFError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable Excel cache entry {directory}: {str(e)}")
+        return None
+    os.utime(directory)
+    return entry
+
+def _store_cached(directory: str, df: pd.DataFrame, sheets: List[str], cache_dir: str):
+    try:
+        write_snapshot(directory, {"current_df": df, "sheets": sheets}, 0, meta_keys=("sheets",))
+    except OSError as e:
+        logger.warning(f"Could not cache parsed workbook: {str(e)}")
+        return
+    # Keep only the most recently used workbooks
+    entries = sorted(glob.glob(os.path.join(cache_dir, "*")), key=os.path.getmtime, reverse=True)
+    for stale in entries[EXCEL_CACHE_ENTRIES:]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+def read_excel_spool(fileobj, filename: str = "", sheets: Optional[Sequence[str]] = None,
+                     progress=None, preview_rows: int = 0, use_cache: bool = EXCEL_CACHE,
+                     cache_dir: str = EXCEL_CACHE_DIR) -> Tuple[pd.DataFrame, Dict]:
+    """Parse a seekable binary Excel file with openpyxl in read-only streaming mode.
+
+    sheets selects sheets by name (default: the first one, ["*"]: all of them);
+    several sheets are stacked with a 'sheet' column. With use_cache the parsed
+    frame is kept as a columnar snapshot keyed by the file's content hash, so
+    uploading the same workbook again maps it instead of parsing it. Legacy .xls
+    files go through pandas. Returns the DataFrame and ingest stats."""
+    progress = progress or _no_progress
+    start = time.perf_counter()
+    size = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(0)
+    stats: Dict[str, Any] = {"bytes": size, "cache_hit": False}
+
+    if filename.lower().endswith(".xls"):
+        progress("parsing")
+        if not sheets:
+            sheet_name = 0
+        else:
+            sheet_name = None if list(sheets) == ["*"] else list(sheets)
+        frames = pd.read_excel(fileobj, sheet_name=sheet_name)
+        df = _stack_sheets(frames) if isinstance(frames, dict) else frames
+        stats.update(engine="pandas", sheets=list(frames) if isinstance(frames, dict) else None)
+    else:
+        directory = None
+        if use_cache:
+            directory = _cache_directory(cache_dir, content_hash(fileobj), sheets)
+            cached = _load_cached(directory)
+            if cached is not None:
+                df = cached["current_df"]
+                stats.update(engine="cache", sheets=cached.get("sheets"), cache_hit=True)
+                if preview_rows:
+                    progress("parsing", preview=df.head(preview_rows))
+        if not stats["cache_hit"]:
+            progress("parsing")
+            workbook = load_workbook(fileobj, read_only=True, data_only=True, keep_links=False)
+            try:
+                selected = _select_sheets(workbook.sheetnames, sheets)
+                frames, rows = {}, 0
+                for name in selected:
+                    frames[name] = _read_sheet(workbook[name], progress, preview_rows if not frames else 0, rows)
+                    rows += len(frames[name])
+            finally:
+                workbook.close()
+            df = _stack_sheets(frames)
+            stats.update(engine="openpyxl-stream", sheets=selected)
+            if directory is not None:
+                _store_cached(directory, df, selected, cache_dir)
+
+    progress("parsing", bytes_read=size, rows=len(df))
+    seconds = time.perf_counter() - start
+    stats.update(seconds=round(seconds, 4), rows=len(df))
+    logger.info(f"Read {len(df)} Excel rows from {stats['sheets']} via {stats['engine']} in {stats['seconds']}s")
+    return df, stats
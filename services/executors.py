@@ -0,0 +1,41 @@
+import asyncio
+import functools
+import multiprocessing
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from config import PROCESS_POOL_WORKERS, CPU_WORKERS
+
+logger = logging.getLogger(__name__)
+
+_process_pool = None
+_thread_pool = None
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """Bounded pool that keeps CPU-heavy handler work off the event loop"""
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="eda-cpu")
+    return _thread_pool
+
+async def run_cpu(func, *args, **kwargs):
+    """Run a blocking function in the CPU pool; calls beyond CPU_WORKERS queue up"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread_pool(), functools.partial(func, *args, **kwargs))
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Shared process pool for CPU-bound fan-out, created on first use"""
+    global _process_pool
+    if _process_pool is None:
+        # spawn avoids forking a process that already runs event-loop and pool threads
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PROCESS_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"Started process pool with {PROCESS_POOL_WORKERS} workers")
+    return _process_pool
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
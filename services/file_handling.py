@@ -1,35 +1,43 @@
 import pandas as pd
-import chardet
 import re
 import os
+import tempfile
+from config import UPLOAD_CHUNK_SIZE, UPLOAD_SPOOL_MAX_SIZE
+from services.csv_ingest import read_csv_spool
+from services.excel_ingest import read_excel_spool
 
 def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'csv', 'xlsx', 'xls', 'txt'}
 
+async def spool_upload(upload, chunk_size: int = UPLOAD_CHUNK_SIZE,
+                       max_size: int = UPLOAD_SPOOL_MAX_SIZE) -> tempfile.SpooledTemporaryFile:
+    """Copy an UploadFile into a spooled temp file chunk by chunk"""
+    spool = tempfile.SpooledTemporaryFile(max_size=max_size)
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
 def robust_read_csv(file_path: str) -> pd.DataFrame:
-    encodings = ['utf-8', 'latin1', 'windows-1252', 'iso-8859-1']
     with open(file_path, 'rb') as f:
-        raw_data = f.read(10000)
-        detected = chardet.detect(raw_data)
-        if detected['confidence'] > 0.7 and detected['encoding']:
-            encodings.insert(0, detected['encoding'])
-    for encoding in encodings:
-        try:
-            for sep in [',', ';', '\t']:
-                try:
-                    return pd.read_csv(file_path, encoding=encoding, sep=sep, on_bad_lines='skip')
-                except:
-                    continue
-        except:
-            continue
-    return pd.read_csv(file_path, encoding='utf-8', errors='replace', on_bad_lines='skip')
+        df, _ = read_csv_spool(f)
+    return df
 
 def read_file(file_path: str, filename: str) -> pd.DataFrame:
     ext = filename.lower().split('.')[-1]
     if ext in ['csv', 'txt']:
         return robust_read_csv(file_path)
     elif ext in ['xlsx', 'xls']:
-        return pd.read_excel(file_path)
+        with open(file_path, 'rb') as f:
+            df, _ = read_excel_spool(f, filename)
+        return df
     else:
         raise ValueError("Unsupported file format")
 
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+from services.dtype_optimizer import fillna_compact
+
+# Imputation methods; mean and median need numeric columns, custom a value
+FILL_METHODS = ("mean", "median", "mode", "custom")
+# Column kinds a rule can target
+RULE_KINDS = ("numeric", "categorical", "datetime")
+
+def column_kind(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "categorical"
+    if pd.api.types.is_numeric_dtype(series):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "datetime"
+    return "categorical"
+
+def fill_plan(df: pd.DataFrame, null_counts: Mapping[Any, int], columns: Optional[Mapping[Any, str]] = None,
+              rules: Optional[Mapping[str, str]] = None, exclude: Sequence[Any] = ()) -> Dict[Any, str]:
+    """{column: method} for the columns that have missing values.
+
+    Explicit column methods win; rules map a column kind to a method for every
+    other column with missing values. Raises ValueError for unknown columns,
+    kinds or methods and for mean/median on non-numeric columns."""
+    columns = dict(columns or {})
+    rules = dict(rules or {})
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"Columns not found: {', '.join(map(str, missing))}")
+    unknown = [kind for kind in rules if kind not in RULE_KINDS]
+    if unknown:
+        raise ValueError(f"Unknown column kinds: {', '.join(unknown)}. Use: {', '.join(RULE_KINDS)}")
+    invalid = sorted({m for m in (*columns.values(), *rules.values()) if m not in FILL_METHODS})
+    if invalid:
+        raise ValueError(f"Invalid methods: {', '.join(invalid)}. Use: {', '.join(FILL_METHODS)}")
+
+    for col, method in columns.items():
+        if method in ("mean", "median") and column_kind(df[col]) != "numeric":
+            raise ValueError(f"Column '{col}' must be numeric for {method} imputation")
+
+    plan = {}
+    for col in df.columns:
+        if not null_counts.get(col):
+            continue
+        method = columns.get(col)
+        if method is None and col not in exclude:
+            kind = column_kind(df[col])
+            method = rules.get(kind)
+            if method in ("mean", "median") and kind != "numeric":
+                raise ValueError(f"Rule {kind}: {method} needs numeric columns")
+        if method is not None:
+            plan[col] = method
+    return plan
+
+def _group_mode(df: pd.DataFrame, column: Any, keys: List[Any]) -> pd.Series:
+    """Per-row most frequent value of column within its group (NaN for all-null groups)"""
+    counts = df.groupby(keys + [column], observed=True, dropna=False, sort=False).size()
+    counts = counts[counts.index.get_level_values(column).notna()].rename("_count").reset_index()
+    # Most frequent first; ties go to the value seen first, like Series.mode on sorted values
+    top = counts.sort_values("_count", ascending=False, kind="stable").drop_duplicates(keys)
+    modes = df[keys].merge(top[keys + [column]], on=keys, how="left")[column]
+    modes.index = df.index
+    return modes
+
+def fill_values(df: pd.DataFrame, plan: Mapping[Any, str], custom_values: Optional[Mapping[Any, Any]] = None,
+                group_by: Optional[Sequence[Any]] = None) -> Tuple[Dict[Any, Any], Dict[Any, pd.Series]]:
+    """Fill values of every planned column, computed per method over all its columns at once.
+
+    Returns ({column: column-wide value}, {column: per-row group values}); group
+    values are only computed with group_by, and the column-wide value covers
+    groups with no value of their own. custom_values is keyed by column or kind."""
+    custom_values = custom_values or {}
+    by_method: Dict[str, List[Any]] = {}
+    for col, method in plan.items():
+        by_method.setdefault(method, []).append(col)
+
+    values: Dict[Any, Any] = {}
+    grouped: Dict[Any, pd.Series] = {}
+    keys = list(group_by or [])
+    for method, cols in by_method.items():
+        if method == "custom":
+            for col in cols:
+                value = custom_values.get(col, custom_values.get(column_kind(df[col])))
+                if value is None:
+                    raise ValueError(f"Custom value required for column '{col}'")
+                if isinstance(value, str) and column_kind(df[col]) == "numeric":
+                    try:
+                        value = float(value)
+                    except ValueError:
+                        raise ValueError(f"Custom value for column '{col}' must be numeric")
+                values[col] = value
+            continue
+        block = df[cols]
+        if method == "mode":
+            modes = block.mode(dropna=True)
+            values.update({col: modes[col].iloc[0] if len(modes) else None for col in cols})
+        else:
+            # One reduction over the block of every column using this method
+            values.update(getattr(block, method)().items())
+        cols = [col for col in cols if col not in keys]
+        if keys and cols:
+            if method == "mode":
+                grouped.update({col: _group_mode(df, col, keys) for col in cols})
+            else:
+                transformed = df[cols].groupby([df[key] for key in keys], observed=True, dropna=False,
+                                            sort=False).transform(method)
+                grouped.update(transformed.items())
+    return values, grouped
+
+def apply_fills(df: pd.DataFrame, values: Mapping[Any, Any], null_counts: Mapping[Any, int],
+                grouped: Optional[Mapping[Any, pd.Series]] = None) -> Dict[Any, int]:
+    """Fill df's columns in place (group values first, then column-wide values);
+    returns the number of values filled per column given its prior null count"""
+    grouped = grouped or {}
+    filled = {}
+    for col, value in values.items():
+        series = df[col]
+        if col in grouped:
+            series = fillna_compact(series, grouped[col])
+        if value is not None and not (isinstance(value, float) and np.isnan(value)):
+            series = fillna_compact(series, value)
+        df[col] = series
+        filled[col] = int(null_counts[col]) - int(series.isna().sum())
+    return filled
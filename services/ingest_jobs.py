@@ -0,0 +1,114 @@
+import json
+import time
+import uuid
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+import pandas as pd
+from sqlalchemy import delete, update
+from config import INGEST_PROGRESS_INTERVAL, INGEST_JOB_RETENTION_HOURS
+from database import SessionLocal, IngestJobRecord
+from services.json_encoding import dumps
+
+PREVIEW_HEAD_ROWS = 5
+
+def schema_preview(df: pd.DataFrame) -> Dict[str, Any]:
+    """Columns, inferred dtypes and a few rows of a partially read file"""
+    return {
+        "columns": [str(col) for col in df.columns],
+        "dtypes": {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+        "rows_sampled": len(df),
+        # Encoded with the response encoder, which writes missing values as null
+        "head": df.head(PREVIEW_HEAD_ROWS)
+    }
+
+class IngestJob:
+    """Progress of one background upload.
+
+    The parsing thread reports phases and counters through update(); they are
+    written to the ingest_jobs table (at most every INGEST_PROGRESS_INTERVAL
+    seconds, plus on every phase change) so the status endpoint works from any
+    worker."""
+
+    def __init__(self, job_id: str, filename: str, bytes_total: int, session_factory=SessionLocal):
+        self.job_id = job_id
+        self.filename = filename
+        self.bytes_total = bytes_total
+        self._session_factory = session_factory
+        self._phase = "queued"
+        self._pending: Dict[str, Any] = {}
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, phase: Optional[str] = None, **fields: Any):
+        """Record progress; accepts bytes_read, rows and a preview DataFrame"""
+        with self._lock:
+            changed = phase is not None and phase != self._phase
+            if changed:
+                self._phase = phase
+                self._pending["phase"] = phase
+                self._pending["status"] = "running"
+            if fields.get("preview") is not None:
+                self._pending["preview"] = dumps(schema_preview(fields["preview"])).decode("utf-8")
+                changed = True
+            for key in ("bytes_read", "rows"):
+                if fields.get(key) is not None:
+                    self._pending[key] = fields[key]
+            if changed or time.monotonic() - self._last_flush >= INGEST_PROGRESS_INTERVAL:
+                self._flush()
+
+    def finish(self, file_id: str, result: Dict[str, Any]):
+        with self._lock:
+            self._pending.update(status="completed", phase="done", file_id=file_id,
+                                 bytes_read=self.bytes_total, result=dumps(result).decode("utf-8"))
+            self._flush()
+
+    def fail(self, error: str):
+        with self._lock:
+            self._pending.update(status="failed", error=error)
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        with self._session_factory() as session, session.begin():
+            session.execute(
+                update(IngestJobRecord).where(IngestJobRecord.id == self.job_id).values(**self._pending)
+            )
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+def create_job(filename: str, bytes_total: int, session_factory=SessionLocal) -> IngestJob:
+    """Register a queued job and drop finished ones past their retention"""
+    job_id = str(uuid.uuid4())
+    cutoff = datetime.utcnow() - timedelta(hours=INGEST_JOB_RETENTION_HOURS)
+    with session_factory() as session, session.begin():
+        session.execute(
+            delete(IngestJobRecord)
+            .where(IngestJobRecord.status.in_(("completed", "failed")), IngestJobRecord.updated_at < cutoff)
+        )
+        session.add(IngestJobRecord(id=job_id, filename=filename, bytes_total=bytes_total))
+    return IngestJob(job_id, filename, bytes_total, session_factory)
+
+def get_job(job_id: str, session_factory=SessionLocal) -> Optional[Dict[str, Any]]:
+    """Status of a job as returned by the status endpoint, or None if unknown"""
+    with session_factory() as session:
+        record = session.get(IngestJobRecord, job_id)
+    if record is None:
+        return None
+    return {
+        "job_id": record.id,
+        "filename": record.filename,
+        "status": record.status,
+        "phase": record.phase,
+        "bytes_total": record.bytes_total,
+        "bytes_read": record.bytes_read,
+        "progress": round(record.bytes_read / record.bytes_total, 4) if record.bytes_total else None,
+        "rows": record.rows,
+        "preview": json.loads(record.preview) if record.preview else None,
+        "file_id": record.file_id,
+        "result": json.loads(record.result) if record.result else None,
+        "error": record.error,
+        "created_at": record.created_at.isoformat() if record.created_at else None,
+        "updated_at": record.updated_at.isoformat() if record.updated_at else None
+    }
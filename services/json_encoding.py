@@ -0,0 +1,185 @@
+import json
+import math
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Any, Iterator, Mapping, Optional
+from config import JSON_STREAM_MIN_VALUES, JSON_STREAM_CHUNK_VALUES
+
+try:
+    import orjson
+    HAS_ORJSON = True
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+except ImportError:
+    HAS_ORJSON = False
+
+def _array_values(values) -> list:
+    """ndarray/Series/Index -> list of JSON-ready Python values.
+
+    Missing and non-finite values are masked to None on the whole array before
+    the single tolist() conversion, instead of checking values one by one."""
+    if isinstance(values, (pd.Series, pd.Index)):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        values = values.to_numpy()
+    values = np.asarray(values)
+    kind = values.dtype.kind
+    if kind in "iub":
+        return values.tolist()
+    if kind == "f":
+        invalid = ~np.isfinite(values)
+        if not invalid.any():
+            return values.tolist()
+        values = values.astype(object)
+        values[invalid] = None
+        return values.tolist()
+    if kind == "M":
+        missing = np.isnat(values)
+        present = values[~missing]
+        # Coarsest exact unit, so whole seconds print like Timestamp.isoformat()
+        for unit in ("s", "ms", "us"):
+            coarse = values.astype(f"datetime64[{unit}]")
+            if (coarse[~missing] == present).all():
+                values = coarse
+                break
+        strings = np.datetime_as_string(values).astype(object)
+        strings[missing] = None
+        return strings.tolist()
+    if kind == "m":
+        out = np.array([None if pd.isna(v) else str(pd.Timedelta(v)) for v in values], dtype=object)
+        return out.tolist()
+    out = values.astype(object, copy=True)
+    out[pd.isna(out)] = None
+    return [jsonable(v) if v is not None and not isinstance(v, (str, int)) else v for v in out.tolist()]
+
+def frame_records(df: pd.DataFrame) -> list:
+    """DataFrame -> list of row dicts, converting column by column"""
+    keys = [_key(col) for col in df.columns]
+    columns = [_array_values(df.iloc[:, i]) for i in range(df.shape[1])]
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+def _key(key: Any) -> Any:
+    if isinstance(key, str):
+        return key
+    if isinstance(key, np.generic):
+        key = key.item()
+    if isinstance(key, (pd.Timestamp, datetime, date)):
+        return key.isoformat()
+    if isinstance(key, float) and not math.isfinite(key):
+        return str(key)
+    return key if isinstance(key, (int, float, bool)) or key is None else str(key)
+
+def jsonable(obj: Any) -> Any:
+    """Plain JSON-ready Python structure with NaN/Inf/NaT as None.
+
+    Arrays, Series and DataFrames are converted column-wise in bulk; only
+    Python containers are walked."""
+    if isinstance(obj, dict):
+        return {_key(k): jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [jsonable(v) for v in obj]
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if obj is None or isinstance(obj, (str, int)):
+        return obj
+    if isinstance(obj, pd.DataFrame):
+        return frame_records(obj)
+    if isinstance(obj, (np.ndarray, pd.Series, pd.Index)):
+        return _array_values(obj)
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, (pd.Timestamp, datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return jsonable(obj.item())
+    if isinstance(obj, (set, frozenset)):
+        return [jsonable(v) for v in obj]
+    if isinstance(obj, pd.Timedelta):
+        return str(obj)
+    return str(obj)
+
+def _orjson_default(obj: Any) -> Any:
+    # Called by orjson for anything it does not encode natively
+    if isinstance(obj, pd.DataFrame):
+        return frame_records(obj)
+    if isinstance(obj, (np.ndarray, pd.Series, pd.Index)):
+        return _array_values(obj)
+    return jsonable(obj)
+
+def dumps(obj: Any) -> bytes:
+    """Compact JSON bytes; NaN/Inf/NaT become null"""
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(obj, default=_orjson_default, option=_ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. NaT inside a datetime64 array or numpy dict keys
+            return orjson.dumps(jsonable(obj), option=_ORJSON_OPTIONS)
+    try:
+        # Most payloads hold no arrays or NaN; the C encoder rejects the rest
+        return json.dumps(obj, allow_nan=False, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    except (TypeError, ValueError):
+        return json.dumps(jsonable(obj), allow_nan=False, separators=(",", ":"),
+                          ensure_ascii=False).encode("utf-8")
+
+def _value_count(obj: Any) -> int:
+    """Values held in arrays and frames of a payload (containers are not walked element-wise)"""
+    if isinstance(obj, dict):
+        return sum(_value_count(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return len(obj) if len(obj) > 64 else sum(_value_count(v) for v in obj)
+    if isinstance(obj, pd.DataFrame):
+        return obj.size
+    if isinstance(obj, (np.ndarray, pd.Series, pd.Index)):
+        return obj.size
+    return 1
+
+def iter_json(obj: Any, chunk_values: int = JSON_STREAM_CHUNK_VALUES) -> Iterator[bytes]:
+    """Encode obj as a sequence of byte fragments, long arrays and frames a chunk at a time"""
+    if isinstance(obj, dict):
+        yield b"{"
+        for i, (key, value) in enumerate(obj.items()):
+            key = _key(key)
+            yield (b"," if i else b"") + dumps(key if isinstance(key, str) else str(key)) + b":"
+            yield from iter_json(value, chunk_values)
+        yield b"}"
+        return
+    if isinstance(obj, pd.DataFrame):
+        rows = max(1, chunk_values // max(1, obj.shape[1]))
+        chunks = (obj.iloc[start:start + rows] for start in range(0, len(obj), rows))
+    elif isinstance(obj, (np.ndarray, pd.Series, pd.Index, list, tuple)) and len(obj) > chunk_values:
+        sliceable = obj.iloc if isinstance(obj, pd.Series) else obj
+        chunks = (sliceable[start:start + chunk_values] for start in range(0, len(obj), chunk_values))
+    else:
+        yield dumps(obj)
+        return
+    yield b"["
+    first = True
+    for chunk in chunks:
+        # Each chunk encodes as "[...]"; splice the elements into one array
+        body = dumps(chunk)[1:-1]
+        if body:
+            yield body if first else b"," + body
+            first = False
+    yield b"]"
+
+class NaNSafeJSONResponse(JSONResponse):
+    """JSONResponse that accepts numpy/pandas values and writes NaN/Inf/NaT as null"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None,
+                  background: Optional[BackgroundTask] = None):
+    """Encoded response for content; payloads with many array values are streamed"""
+    if _value_count(content) >= JSON_STREAM_MIN_VALUES:
+        return StreamingResponse(iter_json(content), status_code=status_code, headers=headers,
+                                 media_type="application/json", background=background)
+    return NaNSafeJSONResponse(content, status_code=status_code, headers=headers, background=background)
+
+def render_json(func, *args, **kwargs):
+    """Run a handler and encode its result in the calling (worker) thread.
+
+    Returning a Response skips FastAPI's per-value jsonable_encoder walk."""
+    return json_response(func(*args, **kwargs))
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager
+
+# pyplot keeps global figure state, so at most one thread may draw at a time
+pyplot_lock = threading.Lock()
+
+class AsyncRWLock:
+    """Reader/writer lock for coroutines. Readers share it, writers are exclusive,
+    and a waiting writer blocks new readers so mutations are not starved."""
+
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @asynccontextmanager
+    async def reader(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._writer and self._waiting_writers == 0)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+
+    @asynccontextmanager
+    async def writer(self):
+        async with self._cond:
+            self._waiting_writers += 1
+            try:
+                await self._cond.wait_for(lambda: not self._writer and self._readers == 0)
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+_dataset_locks = weakref.WeakValueDictionary()
+
+def dataset_lock(file_id: str) -> AsyncRWLock:
+    """The lock guarding one dataset; it lives as long as someone holds or awaits it"""
+    lock = _dataset_locks.get(file_id)
+    if lock is None:
+        lock = AsyncRWLock()
+        _dataset_locks[file_id] = lock
+    return lock
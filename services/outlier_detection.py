@@ -0,0 +1,300 @@
+import base64
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import IsolationForest
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from config import (ISOLATION_FIT_ROWS, ISOLATION_CHUNK_ROWS, ISOLATION_N_JOBS, ISOLATION_CACHE_ENTRIES,
+                    ISOLATION_CONTAMINATION, OUTLIER_BLOCK_BYTES)
+from services.column_stats import json_scalar
+
+BATCH_METHODS = ("iqr", "zscore")
+
+# Methods with per-group / rolling bounds, and their default thresholds
+# (IQR multiplier, standard deviations, robust z-score of the MAD rule)
+GROUPED_METHODS = ("iqr", "zscore", "mad")
+DEFAULT_THRESHOLDS = {"iqr": 1.5, "zscore": 3.0, "mad": 3.5}
+
+def block_columns(rows: int, budget_bytes: int = OUTLIER_BLOCK_BYTES) -> int:
+    """Columns per float64 block of rows x columns that fit the byte budget (at least one)"""
+    return max(1, budget_bytes // (8 * max(1, rows)))
+
+def numeric_columns(df: pd.DataFrame) -> List[Any]:
+    """Numeric, non-boolean columns in frame order"""
+    return [col for col in df.columns
+            if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])]
+
+def compact_mask(mask: np.ndarray, packed: Optional[np.ndarray] = None) -> Tuple[str, np.ndarray]:
+    """Boolean row mask in whichever form is smaller: ("indices", little-endian
+    uint32 row positions) for sparse masks, otherwise ("bitmap", np.packbits
+    output: row i is bit i, most significant bit first). packed may supply the
+    already packed bitmap."""
+    count = int(np.count_nonzero(mask))
+    if count * 4 < (len(mask) + 7) // 8:
+        return "indices", np.flatnonzero(mask).astype("<u4")
+    return "bitmap", np.ascontiguousarray(packed) if packed is not None else np.packbits(mask)
+
+def expand_mask(encoding: str, data: np.ndarray, rows: int) -> np.ndarray:
+    if encoding == "indices":
+        mask = np.zeros(rows, dtype=bool)
+        mask[data] = True
+        return mask
+    return np.unpackbits(data, count=rows).astype(bool)
+
+def encode_mask(mask: np.ndarray, packed: Optional[np.ndarray] = None) -> Dict[str, str]:
+    """compact_mask() as JSON: {"encoding": ..., "data": base64 of the bytes}"""
+    encoding, data = compact_mask(mask, packed)
+    return {"encoding": encoding, "data": base64.b64encode(data.tobytes()).decode("ascii")}
+
+def decode_mask(encoded: Dict[str, str], rows: int) -> np.ndarray:
+    dtype = "<u4" if encoded["encoding"] == "indices" else np.uint8
+    return expand_mask(encoded["encoding"], np.frombuffer(base64.b64decode(encoded["data"]), dtype=dtype), rows)
+
+def iqr_bounds(q1: np.ndarray, q3: np.ndarray, k: float = 1.5):
+    iqr = q3 - q1
+    return q1 - k * iqr, q3 + k * iqr
+
+def column_quantiles(block: np.ndarray, qs: Sequence[float]) -> np.ndarray:
+    """Linearly interpolated quantiles (as numpy/pandas compute them) of every column
+    of a float block, ignoring NaN. Columns are sorted one at a time in a single
+    scratch buffer, so the block is never copied whole."""
+    result = np.full((len(qs), block.shape[1]), np.nan)
+    scratch = np.empty(block.shape[0], dtype=np.float64)
+    for j in range(block.shape[1]):
+        np.copyto(scratch, block[:, j])
+        scratch.sort()  # NaN sorts last
+        valid = block.shape[0] - int(np.count_nonzero(np.isnan(scratch)))
+        if valid == 0:
+            continue
+        for i, q in enumerate(qs):
+            position = q * (valid - 1)
+            below, above = int(np.floor(position)), int(np.ceil(position))
+            result[i, j] = scratch[below] + (scratch[above] - scratch[below]) * (position - below)
+    return result
+
+def column_moments(block: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean and sample standard deviation of every column of a float block, ignoring
+    NaN (NaN where a column has too few values); one column is copied at a time"""
+    mean = np.full(block.shape[1], np.nan)
+    std = np.full(block.shape[1], np.nan)
+    for j in range(block.shape[1]):
+        column = block[:, j]
+        values = column[~np.isnan(column)]
+        if len(values):
+            mean[j] = values.mean()
+        if len(values) > 1:
+            values -= mean[j]
+            std[j] = np.sqrt(np.dot(values, values) / (len(values) - 1))
+    return mean, std
+
+def _block_masks(block: np.ndarray, methods: Sequence[str], z_threshold: float,
+                 quartiles: Optional[np.ndarray]) -> Dict[str, Dict[str, np.ndarray]]:
+    """Bounds and (rows x columns) outlier masks of a float block for each method.
+    NaN never compares outside a bound, so missing values are never outliers."""
+    results = {}
+    if "iqr" in methods:
+        if quartiles is None:
+            quartiles = column_quantiles(block, (0.25, 0.75))
+        lower, upper = iqr_bounds(quartiles[0], quartiles[1])
+        results["iqr"] = {"lower": lower, "upper": upper, "mask": (block < lower) | (block > upper)}
+    if "zscore" in methods:
+        mean, std = column_moments(block)
+        lower, upper = mean - z_threshold * std, mean + z_threshold * std
+        results["zscore"] = {"lower": lower, "upper": upper, "mask": (block < lower) | (block > upper),
+                             "mean": mean, "std": std}
+    return results
+
+def detect_batch(df: pd.DataFrame, columns: Sequence[Any], methods: Sequence[str] = BATCH_METHODS,
+                 z_threshold: float = 3.0, quartiles: Optional[Dict[Any, Sequence[float]]] = None,
+                 include_masks: bool = True,
+                 compact_masks: Optional[Dict[Tuple[Any, str], Tuple[str, np.ndarray]]] = None) -> Dict[Any, Dict[str, Any]]:
+    """IQR and z-score bounds, counts and packed masks for many columns at once.
+
+    Columns are processed as 2-D float64 blocks sized by block_columns(), so
+    working memory stays within OUTLIER_BLOCK_BYTES (plus one column of scratch)
+    whatever the row count, and comparisons are one vectorized call per block. quartiles
+    optionally supplies (Q1, Q3) per column, e.g. from sketches; compact_masks,
+    if given, receives compact_mask() of every (column, method)."""
+    results: Dict[Any, Dict[str, Any]] = {}
+    width = block_columns(len(df))
+    for start in range(0, len(columns), width):
+        names = list(columns[start:start + width])
+        # Column-major, so per-column sorts and reductions read contiguous memory
+        block = np.empty((len(df), len(names)), dtype=np.float64, order="F")
+        for j, col in enumerate(names):
+            block[:, j] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        block_quartiles = None
+        if quartiles is not None:
+            block_quartiles = np.array([quartiles[col] for col in names], dtype=np.float64).T
+        per_method = _block_masks(block, methods, z_threshold, block_quartiles)
+        counts = {method: np.count_nonzero(r["mask"], axis=0) for method, r in per_method.items()}
+        # Packing the whole block along rows gives each column its encode_mask bitmap
+        packed = {method: np.packbits(r["mask"], axis=0) for method, r in per_method.items()} \
+            if include_masks or compact_masks is not None else {}
+        for i, col in enumerate(names):
+            column_result = {}
+            for method, r in per_method.items():
+                column_result[method] = {
+                    "count": int(counts[method][i]),
+                    "lower_bound": json_scalar(r["lower"][i]),
+                    "upper_bound": json_scalar(r["upper"][i])
+                }
+                for stat in ("mean", "std"):
+                    if stat in r:
+                        column_result[method][stat] = json_scalar(r[stat][i])
+                if packed:
+                    encoding, data = compact_mask(r["mask"][:, i], packed[method][:, i])
+                    if compact_masks is not None:
+                        compact_masks[(col, method)] = (encoding, data)
+                    if include_masks:
+                        column_result[method]["mask"] = {"encoding": encoding,
+                                                         "data": base64.b64encode(data.tobytes()).decode("ascii")}
+            results[col] = column_result
+    return results
+
+# Fitted isolation forests and their scores, most recently used last
+_forests: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_forests_lock = threading.Lock()
+
+def _feature_block(df: pd.DataFrame, columns: Sequence[Any]) -> np.ndarray:
+    block = np.empty((len(df), len(columns)), dtype=np.float64, order="F")
+    for j, col in enumerate(columns):
+        block[:, j] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+    return block
+
+def isolation_forest(df: pd.DataFrame, columns: Sequence[Any], cache_key: Optional[tuple] = None,
+                     n_estimators: int = 100, max_samples: int = 256,
+                     contamination: float = ISOLATION_CONTAMINATION, fit_rows: int = ISOLATION_FIT_ROWS,
+                     chunk_rows: int = ISOLATION_CHUNK_ROWS, n_jobs: int = ISOLATION_N_JOBS,
+                     random_state: int = 42) -> Dict[str, Any]:
+    """Multivariate isolation forest over columns.
+
+    The forest is fitted on at most fit_rows sampled rows and scores every row
+    in chunks on n_jobs threads (tree traversal releases the GIL). Missing values
+    are imputed with the fitted sample's medians. The threshold flags the
+    contamination fraction of the fitted sample. Returns decision scores
+    (negative: outlier), the mask, the threshold on sklearn's score_samples
+    scale and fit details; with cache_key (e.g. (file_id, version)) the result
+    is reused for the same columns and params."""
+    params = (tuple(columns), n_estimators, max_samples, contamination, fit_rows, random_state)
+    key = None if cache_key is None else tuple(cache_key) + params
+    if key is not None:
+        with _forests_lock:
+            cached = _forests.get(key)
+            if cached is not None:
+                _forests.move_to_end(key)
+                return {**cached, "cached": True, "seconds": 0.0}
+
+    start = time.perf_counter()
+    X = _feature_block(df, columns)
+    rng = np.random.default_rng(random_state)
+    sample = np.sort(rng.choice(len(X), fit_rows, replace=False)) if len(X) > fit_rows else slice(None)
+    fit_block = X[sample]
+    medians = np.nan_to_num(np.nanmedian(fit_block, axis=0)) if np.isnan(fit_block).any() else None
+    if medians is not None:
+        fit_block = np.where(np.isnan(fit_block), medians, fit_block)
+    model = IsolationForest(n_estimators=n_estimators, max_samples=min(max_samples, len(fit_block)),
+                            contamination=contamination,
+                            random_state=random_state)
+    model.fit(fit_block)
+
+    def score(chunk: np.ndarray) -> np.ndarray:
+        if medians is not None:
+            chunk = np.where(np.isnan(chunk), medians, chunk)
+        return model.decision_function(chunk)
+
+    chunks = [X[i:i + chunk_rows] for i in range(0, len(X), chunk_rows)]
+    if n_jobs > 1 and len(chunks) > 1:
+        scores = np.concatenate(Parallel(n_jobs=n_jobs, prefer="threads")(delayed(score)(c) for c in chunks))
+    else:
+        scores = np.concatenate([score(c) for c in chunks]) if chunks else np.empty(0)
+
+    result = {
+        "model": model,
+        "scores": scores.astype(np.float32),
+        "mask": scores < 0,
+        "contamination": contamination,
+        "threshold": float(model.offset_),
+        "fit_rows": len(fit_block),
+        "cached": False,
+        "seconds": round(time.perf_counter() - start, 4)
+    }
+    if key is not None:
+        with _forests_lock:
+            _forests[key] = result
+            while len(_forests) > ISOLATION_CACHE_ENTRIES:
+                _forests.popitem(last=False)
+    return result
+
+def grouped_bounds(values: pd.Series, method: str, keys: Optional[Sequence[pd.Series]] = None,
+                   window: Optional[int] = None, threshold: Optional[float] = None,
+                   min_periods: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-row (lower, upper) bounds of the method within each group of keys,
+    over a trailing window of rows if given, else over the whole group.
+
+    Every statistic is one groupby().transform or groupby().rolling call.
+    Rolling MAD takes the rolling median of deviations from the rolling median.
+    Rows whose bounds are undefined (e.g. a missing key in rolling mode) get NaN
+    bounds and are never flagged."""
+    threshold = DEFAULT_THRESHOLDS[method] if threshold is None else threshold
+    values = pd.Series(values.to_numpy(dtype=np.float64, na_value=np.nan))
+    keys = [key.reset_index(drop=True) for key in keys] if keys else None
+    min_periods = min(window, 2) if window and min_periods is None else min_periods
+
+    def stat(series: pd.Series, name: str, *args) -> np.ndarray:
+        if window:
+            if keys:
+                grouped = series.groupby(keys, sort=False, observed=True, dropna=False)
+                rolled = getattr(grouped.rolling(window, min_periods=min_periods), name)(*args)
+                # Rows come back grouped; drop the key levels to restore row order
+                rolled = rolled.droplevel(list(range(len(keys))))
+                return rolled.reindex(series.index).to_numpy()
+            return getattr(series.rolling(window, min_periods=min_periods), name)(*args).to_numpy()
+        if keys:
+            return series.groupby(keys, sort=False, observed=True, dropna=False).transform(name, *args).to_numpy()
+        return np.full(len(series), getattr(series, name)(*args))
+
+    if method == "iqr":
+        q1, q3 = stat(values, "quantile", 0.25), stat(values, "quantile", 0.75)
+        return iqr_bounds(q1, q3, threshold)
+    if method == "zscore":
+        mean, std = stat(values, "mean"), stat(values, "std")
+        return mean - threshold * std, mean + threshold * std
+    if method == "mad":
+        median = stat(values, "median")
+        # 0.6745 scales the MAD to a standard deviation for normal data
+        scale = stat((values - median).abs(), "median") / 0.6745
+        return median - threshold * scale, median + threshold * scale
+    raise ValueError(f"Unsupported method: {method}")
+
+def grouped_outliers(df: pd.DataFrame, column: Any, method: str, group_by: Optional[Sequence[Any]] = None,
+                     window: Optional[int] = None, threshold: Optional[float] = None) -> Dict[str, Any]:
+    """Combined outlier mask of a column with bounds per group and/or rolling window,
+    plus a summary of every group, most outliers first.
+
+    A group's summary counts its rows, non-null values, rows with defined bounds
+    ("evaluated"; 0 when the group is too small for the method) and outliers,
+    and holds the group's bounds (None in rolling mode, where they vary per row)."""
+    keys = [df[col] for col in group_by] if group_by else None
+    lower, upper = grouped_bounds(df[column], method, keys, window, threshold)
+    values = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+    mask = (values < lower) | (values > upper)
+    groups = None
+    if keys:
+        evaluated = ~np.isnan(values) & ~(np.isnan(lower) & np.isnan(upper))
+        summary = pd.DataFrame({"rows": 1, "values": ~np.isnan(values), "evaluated": evaluated,
+                                "outliers": mask, "lower": lower, "upper": upper})
+        counts = summary.groupby([key.reset_index(drop=True) for key in keys], sort=False,
+                                 observed=True, dropna=False).agg(
+            {"rows": "sum", "values": "sum", "evaluated": "sum", "outliers": "sum", "lower": "first", "upper": "first"})
+        counts = counts.sort_values("outliers", ascending=False, kind="stable")
+        groups = [{"group": list(key) if isinstance(key, tuple) else [key],
+                   "rows": int(row.rows), "values": int(row.values), "evaluated": int(row.evaluated),
+                   "outliers": int(row.outliers),
+                   "lower_bound": None if window else json_scalar(row.lower),
+                   "upper_bound": None if window else json_scalar(row.upper)}
+                  for key, row in zip(counts.index, counts.itertuples(index=False))]
+    return {"mask": mask, "lower": lower, "upper": upper, "groups": groups}
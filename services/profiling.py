@@ -0,0 +1,155 @@
+import os
+import json
+import glob
+import time
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence
+from config import (
+    PROCESS_POOL_WORKERS,
+    PROFILE_HISTOGRAM_BINS,
+    PROFILE_TOP_K,
+    PROFILE_PARALLEL_MIN_CELLS,
+)
+from services.column_stats import estimate_distinct, json_scalar
+from services.executors import get_process_pool
+from services.snapshots import read_columns
+from services.sketches import ColumnSketch
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.0, 0.05, 0.25, 0.5, 0.75, 0.95, 1.0)
+
+# Profiles computed by this process, most recently used last
+_profiles: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_profiles_lock = threading.Lock()
+PROFILE_MEMORY_ENTRIES = 32
+
+def profile_column(series: pd.Series, bins: int = PROFILE_HISTOGRAM_BINS,
+                   top_k: int = PROFILE_TOP_K) -> Dict[str, Any]:
+    """Summary of one column; numeric columns also get quantiles, moments,
+    sign counts and a histogram"""
+    count = int(series.count())
+    top = series.value_counts(dropna=True).head(top_k)
+    profile = {
+        "name": json_scalar(series.name),
+        "dtype": str(series.dtype),
+        "count": count,
+        "null_count": len(series) - count,
+        "cardinality": estimate_distinct(series) if count else 0,
+        "top": [{"value": json_scalar(value), "count": int(n)} for value, n in top.items()]
+    }
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        finite = values[np.isfinite(values)]
+        profile.update({
+            "mean": json_scalar(finite.mean()) if len(finite) else None,
+            "std": json_scalar(finite.std(ddof=1)) if len(finite) > 1 else None,
+            "quantiles": {
+                str(q): json_scalar(v)
+                for q, v in zip(QUANTILES, np.quantile(finite, QUANTILES) if len(finite) else [None] * len(QUANTILES))
+            },
+            "zeros": int(np.count_nonzero(finite == 0)),
+            "negatives": int(np.count_nonzero(finite < 0)),
+        })
+        if len(finite):
+            counts, edges = np.histogram(finite, bins=bins)
+            profile["histogram"] = {"counts": counts.tolist(), "edges": edges.tolist()}
+        else:
+            profile["histogram"] = {"counts": [], "edges": []}
+    elif pd.api.types.is_datetime64_any_dtype(series) and count:
+        profile["quantiles"] = {"0.0": json_scalar(series.min()), "1.0": json_scalar(series.max())}
+    return profile
+
+def _profile_block(path: str, positions: Sequence[int], bins: int, top_k: int) -> List[Dict[str, Any]]:
+    """Profile some columns of a snapshot in a worker process; numeric columns are
+    memory-mapped, so the block costs no copy of the dataset"""
+    df = read_columns(path, positions)
+    return [profile_column(df.iloc[:, i], bins, top_k) for i in range(df.shape[1])]
+
+def compute_profile(df: pd.DataFrame, snapshot_path: Optional[str] = None,
+                    workers: int = PROCESS_POOL_WORKERS, bins: int = PROFILE_HISTOGRAM_BINS,
+                    top_k: int = PROFILE_TOP_K,
+                    min_parallel_cells: int = PROFILE_PARALLEL_MIN_CELLS) -> Dict[str, Any]:
+    """Profile every column, fanning blocks of columns out to the process pool
+    when the frame is large and backed by a snapshot the workers can map"""
+    start = time.perf_counter()
+    parallel = (snapshot_path is not None and workers > 1 and df.shape[1] > 1
+                and df.shape[0] * df.shape[1] >= min_parallel_cells)
+    if parallel:
+        blocks = [block for block in np.array_split(np.arange(df.shape[1]), min(workers, df.shape[1])) if len(block)]
+        pool = get_process_pool()
+        futures = [pool.submit(_profile_block, snapshot_path, block.tolist(), bins, top_k) for block in blocks]
+        try:
+            columns = [profile for future in futures for profile in future.result()]
+        except FileNotFoundError:
+            # A newer version was published and pruned the files; profile what we hold
+            logger.info("Snapshot changed while profiling; falling back to this process")
+            parallel = False
+    if not parallel:
+        columns = [profile_column(df.iloc[:, i], bins, top_k) for i in range(df.shape[1])]
+    return {
+        "rows": len(df),
+        "columns": columns,
+        "parallel": parallel,
+        "seconds": round(time.perf_counter() - start, 4)
+    }
+
+def approximate_profile(sketches: Dict[Any, ColumnSketch], rows: int,
+                        top_k: int = PROFILE_TOP_K) -> Dict[str, Any]:
+    """Profile read from per-column sketches: no pass over the data, and every
+    figure comes with its error bound"""
+    start = time.perf_counter()
+    columns = [{"name": json_scalar(col), **sketch.summary(QUANTILES, top_k)} for col, sketch in sketches.items()]
+    return {
+        "rows": rows,
+        "columns": columns,
+        "approximate": True,
+        "seconds": round(time.perf_counter() - start, 4)
+    }
+
+def _profile_path(directory: str, version: int) -> str:
+    return os.path.join(directory, f"profile-v{version}.json")
+
+def cached_profile(file_id: str, version: int, directory: str) -> Optional[Dict[str, Any]]:
+    """Profile of this version computed earlier by this or any other worker"""
+    with _profiles_lock:
+        profile = _profiles.get((file_id, version))
+        if profile is not None:
+            _profiles.move_to_end((file_id, version))
+            return profile
+    try:
+        with open(_profile_path(directory, version)) as f:
+            profile = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    _remember(file_id, version, profile)
+    return profile
+
+def store_profile(file_id: str, version: int, directory: str, profile: Dict[str, Any]):
+    """Keep the profile in memory and next to the snapshot; profiles of older versions are removed"""
+    _remember(file_id, version, profile)
+    path = _profile_path(directory, version)
+    try:
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(profile, f)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logger.warning(f"Could not save profile of {file_id} v{version}: {str(e)}")
+        return
+    for older in glob.glob(os.path.join(directory, "profile-v*.json")):
+        try:
+            if int(os.path.basename(older)[len("profile-v"):-len(".json")]) < version:
+                os.remove(older)
+        except (ValueError, OSError):
+            continue
+
+def _remember(file_id: str, version: int, profile: Dict[str, Any]):
+    with _profiles_lock:
+        _profiles[(file_id, version)] = profile
+        _profiles.move_to_end((file_id, version))
+        while len(_profiles) > PROFILE_MEMORY_ENTRIES:
+            _profiles.popitem(last=False)
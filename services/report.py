@@ -47,7 +47,7 @@ def generate_eda_report(data_store, file_id, action_history):
     # Basic stats
     missing_values = df.isnull().sum().sum()
     duplicate_rows = df.duplicated().sum()
-    numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
+    numeric_cols = df.select_dtypes(include='number').columns.tolist()
     categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
     
     pdf.cell(200, 6, txt=f"• Missing Values: {missing_values}", ln=True)
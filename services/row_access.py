@@ -0,0 +1,104 @@
+import io
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from typing import Iterator, Optional, Sequence, Tuple
+from config import ROWS_BATCH_SIZE, SORT_CACHE_BUDGET
+from services.dtype_optimizer import HAS_PYARROW
+
+if HAS_PYARROW:
+    import pyarrow as pa
+
+INDEX_FIELD = "_index"
+
+class SortOrderCache:
+    """LRU of sort orders keyed by (file_id, version, column, ascending).
+
+    A version never changes, so an order stays valid until evicted; bytes are
+    bounded by budget_bytes (int64 positions, 8 bytes per row)."""
+
+    def __init__(self, budget_bytes: int = SORT_CACHE_BUDGET):
+        self.budget_bytes = budget_bytes
+        self._orders: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[np.ndarray]:
+        with self._lock:
+            order = self._orders.get(key)
+            if order is not None:
+                self._orders.move_to_end(key)
+            return order
+
+    def put(self, key: tuple, order: np.ndarray):
+        with self._lock:
+            if key in self._orders or order.nbytes > self.budget_bytes:
+                return
+            self._orders[key] = order
+            self._bytes += order.nbytes
+            while self._bytes > self.budget_bytes:
+                _, evicted = self._orders.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+sort_orders = SortOrderCache()
+
+def sort_order(file_id: str, version: int, series: pd.Series, ascending: bool = True) -> np.ndarray:
+    """Row positions of the column in sorted order (stable, missing values last),
+    computed once per column and version"""
+    key = (file_id, version, series.name, ascending)
+    order = sort_orders.get(key)
+    if order is None:
+        positions = pd.Series(series.to_numpy(), copy=False)
+        order = positions.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy(np.int64)
+        order.flags.writeable = False
+        sort_orders.put(key, order)
+    return order
+
+def row_window(df: pd.DataFrame, offset: int, limit: int, columns: Optional[Sequence] = None,
+               order: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """Rows [offset, offset + limit) of the projected frame, in sort order if given.
+    Unsorted windows are views of the stored columns."""
+    if columns is not None:
+        df = df[list(columns)]
+    if order is None:
+        return df.iloc[offset:offset + limit]
+    return df.take(order[offset:offset + limit])
+
+def iter_ndjson(df: pd.DataFrame, include_index: bool = False,
+                batch_rows: int = ROWS_BATCH_SIZE) -> Iterator[bytes]:
+    """Newline-delimited JSON records, encoded by pandas one batch at a time.
+    NaN/NaT become null and datetimes ISO 8601 strings."""
+    for start in range(0, len(df), batch_rows):
+        batch = df.iloc[start:start + batch_rows]
+        if include_index:
+            batch = batch.copy(deep=False)
+            batch.insert(0, INDEX_FIELD, batch.index)
+        # Each batch ends with a newline, so batches concatenate into one stream
+        yield batch.to_json(orient="records", lines=True, date_format="iso",
+                            default_handler=str).encode("utf-8")
+
+def iter_arrow(df: pd.DataFrame, include_index: bool = False,
+               batch_rows: int = ROWS_BATCH_SIZE) -> Iterator[bytes]:
+    """Arrow IPC stream, one record batch per batch_rows rows"""
+    if not HAS_PYARROW:
+        raise RuntimeError("pyarrow is not installed")
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=include_index)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for start in range(0, len(df), batch_rows):
+            batch = pa.RecordBatch.from_pandas(df.iloc[start:start + batch_rows], schema=schema,
+                                               preserve_index=include_index)
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+def parse_sort(sort: Optional[str]) -> Tuple[Optional[str], bool]:
+    """'col' sorts ascending, '-col' descending"""
+    if not sort:
+        return None, True
+    if sort.startswith("-"):
+        return sort[1:], False
+    return sort, True
@@ -0,0 +1,310 @@
+import math
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from config import SKETCH_KLL_K, SKETCH_HLL_PRECISION, SKETCH_CMS_WIDTH, SKETCH_CMS_DEPTH, SKETCH_TOP_K
+from services.column_stats import json_scalar
+
+# Entry key holding {column: ColumnSketch} for the current version; each sketch is
+# saved in its own file next to the snapshot's column files
+SKETCHES_KEY = "sketches"
+
+# Rows folded into the sketches per step of the ingest pass; a step allocates
+# about 100 bytes of temporaries per row (hashes, value counts, sorted items)
+SKETCH_CHUNK_ROWS = 1 << 18
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Bit length of each uint64, exact (frexp on 32-bit halves)"""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+def _hashes(values: pd.Series) -> np.ndarray:
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+class KLLSketch:
+    """Mergeable quantile sketch (Karnin-Lang-Liberty compactors).
+
+    Level h holds items of weight 2**h; a level over capacity is sorted and
+    every other item (random offset) is promoted. Memory is O(k) and rank
+    error about rank_error() of n with 99% confidence."""
+
+    def __init__(self, k: int = SKETCH_KLL_K, seed: Optional[int] = None):
+        self.k = k
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values: np.ndarray):
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate((self.levels[0], values.astype(np.float64)))
+        self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind at its weight (copied, so the sorted level is freed)
+                keep = items[len(items) - len(items) % 2:].copy()
+                promoted = items[self._rng.integers(2):len(items) - len(items) % 2:2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+            level += 1
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        if not self.n:
+            return [None] * len(qs)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** h, dtype=np.float64)
+                                  for h, items in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cumulative = items[order], np.cumsum(weights[order])
+        result = []
+        for q in qs:
+            if q <= 0:
+                result.append(self.min)
+            elif q >= 1:
+                result.append(self.max)
+            else:
+                position = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+                result.append(float(items[min(position, len(items) - 1)]))
+        return result
+
+    @property
+    def nbytes(self) -> int:
+        return sum(items.nbytes for items in self.levels)
+
+    def rank_error(self) -> float:
+        """Normalized rank error at 99% confidence (empirical KLL constant)"""
+        return 2.296 / self.k ** 0.9723
+
+class HyperLogLog:
+    """Distinct-count sketch: 2**p one-byte registers, standard error 1.04/sqrt(2**p)"""
+
+    def __init__(self, p: int = SKETCH_HLL_PRECISION):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update(self, hashes: np.ndarray):
+        if not len(hashes):
+            return
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        # A sentinel bit bounds the rank at 64 - p + 1
+        rest = (hashes << np.uint64(self.p)) | np.uint64(1 << (self.p - 1))
+        rank = (65 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are empty
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    @property
+    def nbytes(self) -> int:
+        return self.registers.nbytes
+
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+class CountMinTopK:
+    """Count-min sketch plus a bounded candidate set for the most frequent values.
+
+    Estimates never undercount and overcount by at most e/width of the total
+    with probability 1 - exp(-depth)."""
+
+    # Hash multipliers of the sketch rows (odd 64-bit constants)
+    _SEEDS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                       0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53], dtype=np.uint64)
+
+    def __init__(self, width: int = SKETCH_CMS_WIDTH, depth: int = SKETCH_CMS_DEPTH, top_k: int = SKETCH_TOP_K):
+        self.width = 1 << max(1, int(width - 1).bit_length())
+        self.depth = min(depth, len(self._SEEDS))
+        self.top_k = top_k
+        self.total = 0
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        # value -> its hash, for values that were among the most frequent of some chunk
+        self.candidates: Dict[Any, np.uint64] = {}
+
+    def _columns(self, hashes: np.ndarray) -> np.ndarray:
+        shift = np.uint64(64 - int(math.log2(self.width)))
+        with np.errstate(over="ignore"):
+            return np.stack([(hashes * seed) >> shift for seed in self._SEEDS[:self.depth]]).astype(np.intp)
+
+    def update(self, values: pd.Series):
+        # Exact counts within the chunk; only distinct values touch the sketch
+        counts = values.value_counts(dropna=True, sort=True)
+        if counts.empty:
+            return
+        counts = counts[counts > 0]
+        hashes = _hashes(counts.index.to_series())
+        columns = self._columns(hashes)
+        weights = counts.to_numpy(dtype=np.float64)
+        for row in range(self.depth):
+            self.table[row] += np.bincount(columns[row], weights=weights, minlength=self.width).astype(np.int64)
+        self.total += int(weights.sum())
+        self.candidates.update(zip(counts.index[:self._capacity()], hashes[:self._capacity()]))
+        self._trim()
+
+    def merge(self, other: "CountMinTopK"):
+        self.table += other.table
+        self.total += other.total
+        self.candidates.update(other.candidates)
+        self._trim()
+
+    def _capacity(self) -> int:
+        return 4 * self.top_k
+
+    def _estimates(self, hashes: np.ndarray) -> np.ndarray:
+        columns = self._columns(hashes)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def _trim(self):
+        if len(self.candidates) <= self._capacity():
+            return
+        values = list(self.candidates)
+        estimates = self._estimates(np.array([self.candidates[v] for v in values], dtype=np.uint64))
+        keep = np.argsort(-estimates, kind="stable")[:self._capacity()]
+        self.candidates = {values[i]: self.candidates[values[i]] for i in keep}
+
+    def top(self, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        if not self.candidates:
+            return []
+        values = list(self.candidates)
+        estimates = self._estimates(np.array([self.candidates[v] for v in values], dtype=np.uint64))
+        order = np.argsort(-estimates, kind="stable")[:k or self.top_k]
+        return [{"value": json_scalar(values[i]), "count": int(estimates[i])} for i in order]
+
+    @property
+    def nbytes(self) -> int:
+        # Candidates are at most 4 * top_k values with their hashes
+        return self.table.nbytes + 64 * len(self.candidates)
+
+    def count_error(self) -> int:
+        """Absolute overcount bound (at 1 - exp(-depth) confidence)"""
+        return int(math.ceil(math.e / self.width * self.total))
+
+class ColumnSketch:
+    """Sketches of one column, built in one pass and mergeable across chunks"""
+
+    def __init__(self, dtype: str, numeric: bool):
+        self.dtype = dtype
+        self.rows = 0
+        self.null_count = 0
+        self.distinct = HyperLogLog()
+        self.frequent = CountMinTopK()
+        self.quantiles = KLLSketch() if numeric else None
+
+    @classmethod
+    def for_series(cls, series: pd.Series) -> "ColumnSketch":
+        numeric = pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+        return cls(str(series.dtype), numeric)
+
+    def update(self, chunk: pd.Series):
+        present = chunk.dropna()
+        self.rows += len(chunk)
+        self.null_count += len(chunk) - len(present)
+        self.distinct.update(_hashes(present))
+        self.frequent.update(present)
+        if self.quantiles is not None:
+            self.quantiles.update(present.to_numpy(dtype=np.float64, na_value=np.nan))
+
+    def merge(self, other: "ColumnSketch"):
+        self.rows += other.rows
+        self.null_count += other.null_count
+        self.distinct.merge(other.distinct)
+        self.frequent.merge(other.frequent)
+        if self.quantiles is not None and other.quantiles is not None:
+            self.quantiles.merge(other.quantiles)
+
+    @property
+    def nbytes(self) -> int:
+        return self.distinct.nbytes + self.frequent.nbytes + (self.quantiles.nbytes if self.quantiles else 0)
+
+    def summary(self, qs: Sequence[float], top_k: Optional[int] = None) -> Dict[str, Any]:
+        """Approximate profile with the error bound of each figure"""
+        summary = {
+            "dtype": self.dtype,
+            "count": self.rows - self.null_count,
+            "null_count": self.null_count,
+            "cardinality": self.distinct.estimate(),
+            "top": self.frequent.top(top_k),
+            "error": {
+                "cardinality_relative": round(self.distinct.relative_error(), 4),
+                "top_count_absolute": self.frequent.count_error()
+            }
+        }
+        if self.quantiles is not None:
+            summary["quantiles"] = {str(q): v for q, v in zip(qs, self.quantiles.quantiles(qs))}
+            summary["error"]["quantile_rank"] = round(self.quantiles.rank_error(), 4)
+        return summary
+
+def build_sketches(df: pd.DataFrame, columns: Optional[Iterable[Any]] = None,
+                   chunk_rows: int = SKETCH_CHUNK_ROWS) -> Dict[Any, ColumnSketch]:
+    """Sketch the given columns (default: all) in one pass over row chunks"""
+    columns = list(df.columns if columns is None else columns)
+    sketches = {col: ColumnSketch.for_series(df[col]) for col in columns}
+    for start in range(0, max(len(df), 1), chunk_rows):
+        for col in columns:
+            sketches[col].update(df[col].iloc[start:start + chunk_rows])
+    return sketches
+
+def column_sketches(entry: Dict[str, Any], columns: Optional[Iterable[Any]] = None) -> Dict[Any, ColumnSketch]:
+    """Sketches of the current version, building only columns without a valid one"""
+    df = entry["current_df"]
+    cached = entry.get(SKETCHES_KEY) or {}
+    wanted = list(df.columns if columns is None else columns)
+    stale = [col for col in wanted
+             if col not in cached or cached[col].dtype != str(df[col].dtype) or cached[col].rows != len(df)]
+    if stale or any(col not in df.columns for col in cached):
+        # Rebuilding the dict also drops sketches of removed columns
+        cached = {col: sketch for col, sketch in cached.items() if col in df.columns}
+        cached.update(build_sketches(df, stale))
+        entry[SKETCHES_KEY] = cached
+    return {col: cached[col] for col in wanted}
+
+def invalidate_sketches(entry: Dict[str, Any], columns: Optional[Iterable[Any]] = None):
+    """Forget sketches of the given columns, or of all of them"""
+    cached = entry.get(SKETCHES_KEY)
+    if not cached:
+        return
+    if columns is None:
+        entry[SKETCHES_KEY] = {}
+        return
+    # Copy so a snapshot of the previous version never sees the change
+    cached = dict(cached)
+    for col in columns:
+        cached.pop(col, None)
+    entry[SKETCHES_KEY] = cached
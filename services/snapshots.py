@@ -0,0 +1,244 @@
+import os
+import uuid
+import pickle
+import weakref
+import logging
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from services.dataset import FRAME_KEYS, column_buffer_key
+
+logger = logging.getLogger(__name__)
+
+# Column objects backed by (or just written to) a column file, so an unchanged
+# column can point at its existing file instead of being written again
+_objects_by_path = weakref.WeakValueDictionary()
+_paths_by_id: Dict[int, str] = {}
+
+def _register_origin(values: Any, path: str):
+    _objects_by_path[path] = values
+    _paths_by_id[id(values)] = path
+    weakref.finalize(values, _paths_by_id.pop, id(values), None)
+
+def _origin_path(values: Any, directory: str) -> Optional[str]:
+    """File already holding exactly these values, found by walking the view chain"""
+    candidate = values
+    while candidate is not None:
+        path = _paths_by_id.get(id(candidate))
+        if path is not None and _objects_by_path.get(path) is candidate:
+            same_extent = (
+                not isinstance(values, np.ndarray)
+                or (values.__array_interface__["data"][0] == candidate.__array_interface__["data"][0]
+                    and values.nbytes == candidate.nbytes)
+            )
+            if same_extent and os.path.dirname(path) == directory and os.path.exists(path):
+                return path
+        candidate = getattr(candidate, "base", None)
+    return None
+
+def _is_mappable(dtype) -> bool:
+    return isinstance(dtype, np.dtype) and dtype.kind in "biufcmM"
+
+def _load_array(path: str) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # Zero-length arrays cannot be mapped
+        return np.load(path)
+
+def _new_path(directory: str, suffix: str) -> str:
+    return os.path.join(directory, f"c-{uuid.uuid4().hex}{suffix}")
+
+def _pickle_to(path: str, obj: Any):
+    with open(path, "wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def _unpickle_from(path: str) -> Any:
+    live = _objects_by_path.get(path)
+    if live is not None:
+        # Already resident in this process (e.g. the writer just published it)
+        return live
+    with open(path, "rb") as f:
+        values = pickle.load(f)
+    _register_origin(values, path)
+    return values
+
+def _write_values(values: Any, directory: str, new_files: List[str]) -> Dict[str, Any]:
+    """Write one column (or index) unless a file already holds it, and describe it for the manifest"""
+    if isinstance(values, pd.Categorical):
+        path = _origin_path(values.codes, directory)
+        if path is None:
+            path = _new_path(directory, ".npy")
+            np.save(path, values.codes)
+            new_files.append(path)
+        categories_path = _origin_path(values.categories, directory)
+        if categories_path is None:
+            categories_path = _new_path(directory, ".pkl")
+            _pickle_to(categories_path, values.categories)
+            new_files.append(categories_path)
+            _register_origin(values.categories, categories_path)
+        return {"kind": "categorical", "file": os.path.basename(path),
+                "categories": os.path.basename(categories_path), "ordered": bool(values.ordered)}
+
+    path = _origin_path(values, directory)
+    mappable = isinstance(values, np.ndarray) and _is_mappable(values.dtype)
+    if path is None:
+        path = _new_path(directory, ".npy" if mappable else ".pkl")
+        if mappable:
+            np.save(path, values)
+        else:
+            _pickle_to(path, values)
+            _register_origin(values, path)
+        new_files.append(path)
+    return {"kind": "numpy" if mappable else "pickle", "file": os.path.basename(path)}
+
+def _write_object(obj: Any, directory: str, new_files: List[str]) -> str:
+    """Pickle a derived object (e.g. a column sketch) unless a file already holds it"""
+    path = _origin_path(obj, directory)
+    if path is None:
+        path = _new_path(directory, ".pkl")
+        _pickle_to(path, obj)
+        _register_origin(obj, path)
+        new_files.append(path)
+    return os.path.basename(path)
+
+def _read_values(record: Dict[str, Any], directory: str, cache: Dict[str, Any]) -> Any:
+    """Load a column described by the manifest; numeric data and category codes are memory-mapped read-only"""
+    path = os.path.join(directory, record["file"])
+    if path in cache:
+        return cache[path]
+    if record["kind"] == "pickle":
+        values = _unpickle_from(path)
+    else:
+        values = _load_array(path)
+        _register_origin(values, path)
+        if record["kind"] == "categorical":
+            categories = _unpickle_from(os.path.join(directory, record["categories"]))
+            dtype = pd.CategoricalDtype(categories, ordered=record["ordered"])
+            values = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+    cache[path] = values
+    return values
+
+def _column_values(series: pd.Series) -> Any:
+    # Plain ndarrays for numpy dtypes so views can be traced back to their file
+    return series.values if isinstance(series.dtype, np.dtype) else series.array
+
+def write_snapshot(directory: str, entry: Dict[str, Any], version: int,
+                   meta_keys: Iterable[str] = (), object_keys: Iterable[str] = ()) -> Tuple[str, List[str]]:
+    """Write the entry's frames as one file per column plus a manifest.
+
+    Columns that already live in a file of this dataset (because they were
+    mapped from it or written earlier) are referenced instead of rewritten, so
+    a new version only costs the columns it changed. meta_keys are small values
+    stored in the manifest; object_keys hold {label: object} dicts whose objects
+    get a file each and are likewise only written once. The manifest is renamed
+    into place last, which publishes the snapshot atomically. Returns the
+    manifest path and the files created for it."""
+    os.makedirs(directory, exist_ok=True)
+    new_files: List[str] = []
+    written: Dict[Tuple[str, int], Tuple[pd.Series, Dict[str, Any]]] = {}
+    frames = {}
+    try:
+        for key in FRAME_KEYS:
+            df = entry.get(key)
+            if df is None:
+                continue
+            if isinstance(df.index, pd.RangeIndex):
+                index = {"kind": "range", "range": df.index}
+            else:
+                index_values = df.index.values if isinstance(df.index.dtype, np.dtype) else df.index.array
+                index = _write_values(index_values, directory, new_files)
+                index["name"] = df.index.name
+            columns = []
+            for i in range(df.shape[1]):
+                series = df.iloc[:, i]
+                # Columns shared between the frames are written once per snapshot
+                buffer_key = column_buffer_key(series)
+                if buffer_key not in written:
+                    written[buffer_key] = (series, _write_values(_column_values(series), directory, new_files))
+                columns.append(written[buffer_key][1])
+            frames[key] = {"index": index, "labels": df.columns, "columns": columns}
+
+        objects = {key: {label: _write_object(obj, directory, new_files) for label, obj in entry[key].items()}
+                   for key in object_keys if entry.get(key)}
+        manifest = {
+            "version": version,
+            "frames": frames,
+            "meta": {k: entry[k] for k in meta_keys if k in entry},
+            "objects": objects
+        }
+        path = os.path.join(directory, f"v{version}-{uuid.uuid4().hex[:8]}.manifest")
+        with open(f"{path}.tmp", "wb") as f:
+            pickle.dump(manifest, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{path}.tmp", path)
+    except Exception:
+        remove_files(new_files)
+        raise
+    return path, new_files
+
+def _read_frame(frame: Dict[str, Any], directory: str, cache: Dict[str, Any],
+                series_cache: Dict[Tuple[str, int], pd.Series],
+                positions: Optional[Iterable[int]] = None) -> pd.DataFrame:
+    if frame["index"]["kind"] == "range":
+        index = frame["index"]["range"]
+    else:
+        index = pd.Index(_read_values(frame["index"], directory, cache),
+                         name=frame["index"]["name"], copy=False)
+    positions = range(len(frame["columns"])) if positions is None else list(positions)
+    arrays = {}
+    for i, position in enumerate(positions):
+        record = frame["columns"][position]
+        # One Series per file and index so pandas tracks the sharing between frames
+        cache_key = (record["file"], id(index))
+        if cache_key not in series_cache:
+            series_cache[cache_key] = pd.Series(_read_values(record, directory, cache), index=index, copy=False)
+        arrays[i] = series_cache[cache_key]
+    df = pd.DataFrame(arrays, index=index, copy=False)
+    df.columns = frame["labels"][positions]
+    return df
+
+def read_snapshot(path: str) -> Dict[str, Any]:
+    """Rebuild an entry from a manifest without deserializing numeric columns.
+    Frames sharing a column file share one read-only mapping."""
+    directory = os.path.dirname(path)
+    with open(path, "rb") as f:
+        manifest = pickle.load(f)
+    cache: Dict[str, Any] = {}
+    series_cache: Dict[Tuple[str, int], pd.Series] = {}
+    entry = dict(manifest["meta"])
+    for key, frame in manifest["frames"].items():
+        entry[key] = _read_frame(frame, directory, cache, series_cache)
+    for key, files in manifest.get("objects", {}).items():
+        entry[key] = {label: _unpickle_from(os.path.join(directory, name)) for label, name in files.items()}
+    return entry
+
+def read_columns(path: str, positions: Optional[Iterable[int]] = None,
+                 key: str = "current_df") -> pd.DataFrame:
+    """Load only some columns (by position) of one frame, e.g. in a worker process
+    that needs a projection without unpickling the rest of the dataset"""
+    with open(path, "rb") as f:
+        manifest = pickle.load(f)
+    return _read_frame(manifest["frames"][key], os.path.dirname(path), {}, {}, positions)
+
+def snapshot_files(path: str) -> Set[str]:
+    """Every file a manifest depends on, including the manifest itself"""
+    directory = os.path.dirname(path)
+    with open(path, "rb") as f:
+        manifest = pickle.load(f)
+    files = {path}
+    for frame in manifest["frames"].values():
+        for record in [frame["index"]] + frame["columns"]:
+            if "file" in record:
+                files.add(os.path.join(directory, record["file"]))
+            if "categories" in record:
+                files.add(os.path.join(directory, record["categories"]))
+    for names in manifest.get("objects", {}).values():
+        files.update(os.path.join(directory, name) for name in names.values())
+    return files
+
+def remove_files(paths: Iterable[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
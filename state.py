@@ -1,2 +1,5 @@
 # state.py
-data_store = {}
+from services.dataset_store import DatasetStore
+
+# Bounded by config.DATASET_MEMORY_BUDGET; cold datasets spill to disk
+data_store = DatasetStore()
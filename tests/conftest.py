@@ -0,0 +1,37 @@
+import io
+import os
+import sys
+import tempfile
+import pytest
+
+# The catalog database and snapshot directory are read from the environment when
+# config is imported, so point them at a scratch directory before the app loads
+TEST_ROOT = tempfile.mkdtemp(prefix="eda-tests-")
+os.environ.setdefault("EDA_DATABASE_URL", f"sqlite:///{os.path.join(TEST_ROOT, 'eda.db')}")
+os.environ.setdefault("EDA_DATA_DIR", os.path.join(TEST_ROOT, "data"))
+os.environ.setdefault("EDA_PROCESS_POOL_WORKERS", "2")
+os.environ.setdefault("EDA_CHART_RENDER_WORKERS", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+def csv_bytes(df) -> bytes:
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False)
+    return buf.getvalue()
+
+@pytest.fixture(scope="session")
+def client():
+    from main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def upload(client):
+    """Upload a DataFrame as CSV and return the upload response"""
+    def upload_frame(df, filename: str = "data.csv", **params):
+        response = client.post("/api/upload", params=params,
+                               files={"file": (filename, csv_bytes(df), "text/csv")})
+        assert response.status_code == 200, response.text
+        return response.json()
+    return upload_frame
@@ -0,0 +1,76 @@
+import uuid
+import pandas as pd
+import pytest
+from services.catalog import DatasetCatalog, DatasetConflictError
+from services.dataset import commit_version, new_dataset, working_copy
+from services.dataset_store import DatasetStore
+from state import data_store
+
+@pytest.fixture
+def dataset(upload):
+    df = pd.DataFrame({"a": [1.0, None, 3.0, 4.0, 100.0], "b": ["x", "y", None, "x", "y"]})
+    return upload(df)["file_id"]
+
+@pytest.fixture
+def concurrent_writer(monkeypatch):
+    """Make every version publish lose to another worker"""
+    def publish(file_id, entry, expected_version=None):
+        raise DatasetConflictError(f"Dataset {file_id} was modified by another worker; reload and retry")
+    monkeypatch.setattr(data_store.catalog, "publish", publish)
+
+@pytest.mark.parametrize("path, body", [
+    ("/api/cleaning/fill_missing", {"column": "a", "method": "mean"}),
+    ("/api/cleaning/fill_missing_batch", {"rules": {"numeric": "median"}}),
+    ("/api/cleaning/remove_columns", {"columns": ["b"]}),
+    ("/api/outliers/handle", {"column": "a", "action": "cap", "outlier_indices": [4]}),
+])
+def test_conflicting_commit_is_409(client, dataset, concurrent_writer, path, body):
+    response = client.post(path, json={"file_id": dataset, **body})
+    assert response.status_code == 409, response.text
+    assert "retry" in response.json()["detail"]
+
+def test_commit_after_conflict_applies_to_published_version(client, dataset, monkeypatch):
+    def publish(file_id, entry, expected_version=None):
+        raise DatasetConflictError("conflict")
+    with monkeypatch.context() as patch:
+        patch.setattr(data_store.catalog, "publish", publish)
+        assert client.post("/api/cleaning/fill_missing",
+                           json={"file_id": dataset, "column": "a", "method": "mean"}).status_code == 409
+    # The losing copy was dropped, so the retry starts from version 0 again
+    response = client.post("/api/cleaning/fill_missing", json={"file_id": dataset, "column": "a", "method": "mean"})
+    assert response.status_code == 200, response.text
+    assert data_store.catalog.version(dataset) == 1
+    assert data_store[dataset]["actions"] == ["Filled missing values in a using mean"]
+
+def test_second_worker_reloads_newer_version_and_real_conflict(tmp_path):
+    # Two stores over one catalog stand in for two worker processes
+    catalog = DatasetCatalog(data_dir=str(tmp_path))
+    first = DatasetStore(catalog=catalog, version_check_interval=0)
+    second = DatasetStore(catalog=catalog, version_check_interval=0)
+    file_id = uuid.uuid4().hex
+    first[file_id] = new_dataset(pd.DataFrame({"a": [1.0, None, 3.0]}), "data.csv")
+    stale = second[file_id]
+    entry = first[file_id]
+    df = working_copy(entry)
+    df["a"] = df["a"].fillna(0.0)
+    commit_version(entry, df, "fill a", touched=["a"])
+    assert catalog.version(file_id) == 1
+    # A commit on top of the version the other worker still holds loses
+    with pytest.raises(DatasetConflictError):
+        commit_version(stale, working_copy(stale), "stale edit")
+    assert catalog.version(file_id) == 1
+    # and that worker loads the winning version on its next access
+    reloaded = second[file_id]
+    assert reloaded["version"] == 1 and reloaded["actions"] == ["fill a"]
+    assert reloaded["current_df"]["a"].tolist() == [1.0, 0.0, 3.0]
+    # A resident copy is also replaced once the catalog moves past it
+    entry = first[file_id]
+    commit_version(entry, working_copy(entry).drop(columns="a"), "drop a")
+    assert list(second[file_id]["current_df"].columns) == []
+    assert second[file_id]["version"] == 2
+
+def test_dataset_survives_dropping_the_resident_copy(client, dataset):
+    data_store._drop(dataset)
+    response = client.get(f"/api/overview/{dataset}")
+    assert response.status_code == 200, response.text
+    assert response.json()["shape"] == [5, 2]
@@ -0,0 +1,66 @@
+import email
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+@pytest.fixture
+def dataset(upload):
+    rng = np.random.default_rng(0)
+    n = 500
+    df = pd.DataFrame({"a": rng.normal(size=n), "b": rng.normal(size=n), "c": rng.integers(0, 5, n),
+                       "g": rng.choice(["x", "y"], n)})
+    return upload(df)["file_id"]
+
+def parts(response):
+    """(manifest, [(headers, bytes)]) of a multipart/mixed response"""
+    message = email.message_from_bytes(
+        f"Content-Type: {response.headers['content-type']}\r\n\r\n".encode() + response.content)
+    payloads = message.get_payload()
+    manifest = json.loads(payloads[0].get_payload(decode=True))
+    return manifest, [(dict(part.items()), part.get_payload(decode=True)) for part in payloads[1:]]
+
+def test_multipart_batch_with_preset_and_failures(client, dataset):
+    body = {"file_id": dataset, "preset": "numeric_histograms",
+            "charts": [{"chart_type": "box", "x_col": "g", "y_col": "a"},
+                       {"chart_type": "bar", "x_col": "g", "y_col": "g"}]}
+    response = client.post("/api/visualization/batch", json=body)
+    assert response.status_code == 200, response.text
+    manifest, images = parts(response)
+    statuses = [chart["status"] for chart in manifest["charts"]]
+    # A bar chart with no numeric column fails alone
+    assert statuses == ["ok", "error", "ok", "ok", "ok"]
+    assert [chart["x"] for chart in manifest["charts"][2:]] == ["a", "b", "c"]
+    assert len(images) == 4 and all(content.startswith(b"\x89PNG") for _, content in images)
+    assert images[0][0]["Content-ID"] == "<chart-0>"
+    # Rendered charts are cached individually and the whole batch revalidates
+    again = client.post("/api/visualization/batch", json=body)
+    assert all(chart["cached"] for chart in parts(again)[0]["charts"] if chart["status"] == "ok")
+    not_modified = client.post("/api/visualization/batch", json=body,
+                               headers={"If-None-Match": response.headers["etag"]})
+    assert not_modified.status_code == 304
+
+def test_composite_and_pair_grid(client, dataset):
+    charts = [{"chart_type": "histogram", "x_col": "a"}, {"chart_type": "bar", "x_col": "g", "y_col": "b"}]
+    response = client.post("/api/visualization/batch",
+                           json={"file_id": dataset, "charts": charts, "output": "composite", "grid_columns": 2})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "image/png"
+    assert len(json.loads(response.headers["x-chart-timings"])) == 2
+    response = client.post("/api/visualization/batch",
+                           json={"file_id": dataset, "preset": "pair_grid", "columns": ["a", "b", "c"],
+                                 "hue_col": "g"})
+    manifest, images = parts(response)
+    assert manifest["charts"][0]["chart_type"] == "pair_grid" and len(images) == 1
+
+@pytest.mark.parametrize("body", [
+    {},
+    {"preset": "pair_grid", "columns": ["a"]},
+    {"preset": "pair_grid", "output": "composite"},
+    {"charts": [{"chart_type": "pie", "x_col": "a"}]},
+    {"charts": [{"chart_type": "histogram", "x_col": "nope"}]},
+    {"preset": "unknown"},
+])
+def test_invalid_batches(client, dataset, body):
+    response = client.post("/api/visualization/batch", json={"file_id": dataset, **body})
+    assert response.status_code == 400, response.text
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from services.chart_data import chart_data
+from services.chart_reduction import (aggregate_bars, bar_intervals, box_stats, lttb_indices, minmax_indices,
+                                      plan_reduction)
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    n = 20_000
+    return pd.DataFrame({"g": rng.choice(["a", "b"], n), "v": rng.normal(size=n), "t": np.arange(n)})
+
+def spec(chart_type, x, y=None, hue=None):
+    return {"chart_type": chart_type, "x": x, "y": y, "hue": hue}
+
+@pytest.mark.parametrize("chart_type,method", [("box", "box_stats"), ("bar", "aggregate")])
+def test_single_column_box_and_bar_are_reduced(frame, chart_type, method):
+    plan = plan_reduction(frame, spec(chart_type, "v"), aggregate_rows=1000)
+    assert plan == {"method": method, "rows": len(frame)}
+    # Unless there is nothing numeric to reduce, or a hue seaborn cannot apply
+    assert plan_reduction(frame, spec(chart_type, "g"), aggregate_rows=1000) is None
+    assert plan_reduction(frame, spec(chart_type, "v", hue="g"), aggregate_rows=1000) is None
+
+def test_single_column_box_stats_match_the_column(frame):
+    stats, value, category, horizontal = box_stats(frame, spec("box", "v"))
+    assert (value, category, horizontal) == ("v", None, True)
+    assert len(stats) == 1 and stats[0]["key"] == (None,)
+    q1, med, q3 = frame["v"].quantile([0.25, 0.5, 0.75])
+    assert stats[0]["q1"] == pytest.approx(q1)
+    assert stats[0]["med"] == pytest.approx(med)
+    assert stats[0]["q3"] == pytest.approx(q3)
+    assert stats[0]["count"] == len(frame)
+
+def test_single_column_bar_is_the_mean(frame):
+    assert aggregate_bars(frame, spec("bar", "v"))["v"].tolist() == pytest.approx([frame["v"].mean()])
+    bars, value, category = bar_intervals(frame, spec("bar", "v"))
+    assert (value, category) == ("v", None)
+    assert bars["count"].tolist() == [len(frame)]
+    assert bars["ci_low"].iloc[0] < frame["v"].mean() < bars["ci_high"].iloc[0]
+
+def test_grouped_box_stats_per_category(frame):
+    stats, value, category, horizontal = box_stats(frame, spec("box", "g", "v"))
+    assert (value, category, horizontal) == ("v", "g", False)
+    assert [box["key"] for box in stats] == [("a",), ("b",)]
+    for box in stats:
+        assert box["med"] == pytest.approx(frame.loc[frame["g"] == box["key"][0], "v"].median())
+
+def test_chart_data_single_column_box(frame):
+    data = chart_data(frame, spec("box", "v"))
+    assert data["category"] is None and len(data["boxes"]) == 1
+    with pytest.raises(ValueError):
+        chart_data(frame, spec("box", "v", hue="g"))
+    with pytest.raises(ValueError):
+        chart_data(frame, spec("line", "t"))
+
+def test_line_decimation_keeps_ends_and_extremes():
+    y = np.sin(np.linspace(0, 20, 10_000))
+    y[1234] = 5.0
+    positions = lttb_indices(np.arange(len(y), dtype=np.float64), y, 200)
+    assert len(positions) == 200
+    assert positions[0] == 0 and positions[-1] == len(y) - 1
+    assert 1234 in positions
+    assert 1234 in minmax_indices(y, 200)
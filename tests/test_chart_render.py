@@ -0,0 +1,40 @@
+import asyncio
+import multiprocessing
+import time
+import pandas as pd
+import pytest
+from services.chart_render import ChartRenderer, ChartTimeoutError
+
+def _sleep(seconds, snapshot_path, positions, frame):
+    time.sleep(seconds)
+    return seconds
+
+@pytest.fixture
+def renderer():
+    renderer = ChartRenderer(workers=1, timeout=60)
+    # Wait for the worker to come up, so its warm-up does not count against a timeout
+    assert asyncio.run(renderer._run(_sleep, 0, None, None, None, 60)) == 0
+    yield renderer
+    renderer.shutdown()
+
+def test_timeout_kills_the_worker_and_restarts(renderer):
+    pids = renderer.worker_pids()
+    assert len(pids) == 1
+    with pytest.raises(ChartTimeoutError):
+        asyncio.run(renderer._run(_sleep, 60, None, None, None, 0.5))
+    deadline = time.monotonic() + 10
+    while pids & {p.pid for p in multiprocessing.active_children()} and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not pids & {p.pid for p in multiprocessing.active_children()}
+    # A fresh pool serves the next render
+    assert asyncio.run(renderer._run(_sleep, 0, None, None, None, 60)) == 0
+    assert renderer.worker_pids().isdisjoint(pids)
+
+def test_render_sends_frame_without_snapshot(renderer):
+    frame = pd.DataFrame({"x": [1.0, 2.0, 3.0]})
+    spec = {"chart_type": "histogram", "x": "x", "width": 4, "height": 3, "dpi": 50, "format": "png"}
+    content = asyncio.run(renderer.render(spec, frame))
+    assert content.startswith(b"\x89PNG")
+    results = asyncio.run(renderer.render_many([spec, dict(spec, x="missing")], frame))
+    assert results[0]["content"] == content
+    assert results[1]["content"] is None and results[1]["error"]
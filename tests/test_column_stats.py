@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from services import column_stats as column_stats_module
+from services.column_stats import STATS_KEY, column_stats, estimate_distinct
+from services.dataset import commit_version, new_dataset, working_copy
+
+@pytest.fixture
+def computed(monkeypatch):
+    """Columns whose stats were computed from scratch"""
+    names = []
+    compute = column_stats_module.compute_column_stats
+    def counting(series):
+        names.append(series.name)
+        return compute(series)
+    monkeypatch.setattr(column_stats_module, "compute_column_stats", counting)
+    return names
+
+def test_only_touched_columns_are_recomputed(computed):
+    entry = new_dataset(pd.DataFrame({"a": [1.0, None, 3.0], "b": ["x", "y", None]}), "data.csv")
+    stats = column_stats(entry)
+    assert stats["a"] == {"dtype": "float64", "rows": 3, "null_count": 1, "min": 1.0, "max": 3.0, "mean": 2.0,
+                          "distinct": 2, "memory": 24}
+    assert stats["b"]["null_count"] == 1 and stats["b"]["min"] is None
+    df = working_copy(entry)
+    df["a"] = df["a"].fillna(2.0)
+    commit_version(entry, df, "fill a", touched=["a"])
+    assert column_stats(entry)["a"]["null_count"] == 0
+    assert computed == ["a", "b", "a"]
+    # Removed columns disappear from the cache
+    commit_version(entry, working_copy(entry).drop(columns="b"), "drop b", touched=[])
+    assert list(column_stats(entry)) == ["a"] and list(entry[STATS_KEY]) == ["a"]
+
+def test_distinct_estimate():
+    assert estimate_distinct(pd.Series([1, 2, 2, None])) == 2
+    assert estimate_distinct(pd.Series(["a", "b", "a"], dtype="category")) == 2
+    many = pd.Series(np.arange(200_000))
+    assert abs(estimate_distinct(many) - 200_000) < 200_000 * 0.1
+
+def test_overview_reports_column_stats(client, upload):
+    file_id = upload(pd.DataFrame({"a": [1, 2, 3], "b": ["x", None, "z"]}))["file_id"]
+    body = client.get(f"/api/overview/{file_id}").json()
+    assert body["column_stats"]["a"]["mean"] == 2.0
+    assert body["null_counts"] == {"a": 0, "b": 1}
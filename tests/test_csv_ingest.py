@@ -0,0 +1,41 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from services.csv_ingest import read_csv_spool, sniff_delimiter
+from tests.conftest import csv_bytes
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    n = 20_000
+    df = pd.DataFrame({"id": np.arange(n), "value": rng.normal(size=n),
+                       "name": rng.choice(["alpha", "beta", "gamma"], n)})
+    df.loc[::97, "value"] = np.nan
+    return df
+
+def parse(data: bytes, **kwargs):
+    return read_csv_spool(io.BytesIO(data), workers=2, chunk_size=64 * 1024, min_parallel_bytes=0, **kwargs)
+
+def test_parallel_parse_matches_read_csv(frame):
+    data = csv_bytes(frame)
+    df, stats = parse(data)
+    assert stats["chunks"] > 1
+    assert stats["bytes"] == len(data) and stats["mb_per_s"] > 0
+    pd.testing.assert_frame_equal(df, pd.read_csv(io.BytesIO(data)))
+
+def test_quoted_newlines_fall_back_to_one_core(frame):
+    frame["name"] = frame["name"].str.cat(["\nnote"] * len(frame))
+    data = csv_bytes(frame)
+    df, stats = parse(data)
+    assert stats["chunks"] == 1
+    pd.testing.assert_frame_equal(df, pd.read_csv(io.BytesIO(data)))
+
+def test_delimiter_and_progress(frame):
+    data = frame.to_csv(index=False, sep=";").encode()
+    phases = []
+    df, stats = parse(data, progress=lambda phase, **fields: phases.append((phase, fields)))
+    assert stats["delimiter"] == ";"
+    assert list(df.columns) == ["id", "value", "name"]
+    assert phases[-1] == ("parsing", {"bytes_read": len(data), "rows": len(frame)})
+    assert sniff_delimiter("a\tb\n1\t2\n") == "\t"
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+from services.column_stats import STATS_KEY
+from services.dataset import (column_buffer_key, commit_version, entry_nbytes, new_dataset,
+                              working_copy)
+
+def frame():
+    n = 100_000
+    return pd.DataFrame({"a": np.arange(n, dtype=np.float64), "b": np.ones(n), "c": np.zeros(n)})
+
+def test_versions_share_untouched_column_buffers():
+    entry = new_dataset(frame(), "data.csv")
+    single = entry_nbytes(entry)
+    # original and current share every column, so the entry costs one frame
+    assert single - entry["original_df"].memory_usage(index=False).sum() < 1024
+    df = working_copy(entry)
+    df["a"] = df["a"].fillna(0) * 2
+    assert commit_version(entry, df, "double a", touched=["a"]) == 1
+    original, current = entry["original_df"], entry["current_df"]
+    assert column_buffer_key(current["b"]) == column_buffer_key(original["b"])
+    assert column_buffer_key(current["a"]) != column_buffer_key(original["a"])
+    assert original["a"].iloc[1] == 1.0 and current["a"].iloc[1] == 2.0
+    # Only the written column costs memory
+    assert entry_nbytes(entry) == single + current["a"].nbytes
+    assert entry["actions"] == ["double a"]
+
+def test_commit_drops_only_touched_column_stats():
+    entry = new_dataset(frame(), "data.csv", **{STATS_KEY: {"a": {"mean": 1}, "b": {"mean": 1}}})
+    commit_version(entry, working_copy(entry), "noop", touched=["a"])
+    assert set(entry[STATS_KEY]) == {"b"}
+    commit_version(entry, working_copy(entry), "drop rows")
+    assert not entry[STATS_KEY]
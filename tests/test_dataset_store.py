@@ -0,0 +1,109 @@
+import threading
+import uuid
+import numpy as np
+import pandas as pd
+import pytest
+from services.catalog import DatasetCatalog, DatasetConflictError
+from services.dataset import commit_version, new_dataset, working_copy
+from services.dataset_store import DatasetStore
+
+@pytest.fixture
+def catalog(tmp_path):
+    return DatasetCatalog(data_dir=str(tmp_path))
+
+def text_frame(rows: int = 20_000) -> pd.DataFrame:
+    # Text columns are pickled rather than memory-mapped, so they count against the budget
+    return pd.DataFrame({"name": [f"row-{i}" for i in range(rows)], "value": np.arange(rows, dtype=np.float64)})
+
+def test_least_recently_used_dataset_spills_and_reloads(catalog):
+    size = int(text_frame()["name"].memory_usage(deep=True, index=False))
+    store = DatasetStore(budget_bytes=int(size * 2.5), catalog=catalog)
+    ids = [uuid.uuid4().hex for _ in range(3)]
+    store[ids[0]] = new_dataset(text_frame(), "a.csv")
+    store[ids[1]] = new_dataset(text_frame(), "b.csv")
+    store[ids[0]]  # ids[1] is now the least recently used
+    store[ids[2]] = new_dataset(text_frame(), "c.csv")
+    stats = store.stats()
+    assert stats["spills"] == 1 and stats["resident"] == 2
+    assert stats["resident_bytes"] <= store.budget_bytes
+    assert stats["hits"] == 1 and stats["misses"] == 0
+    # The spilled dataset comes back from its snapshot
+    reloaded = store[ids[1]]
+    assert store.stats()["misses"] == 1
+    pd.testing.assert_frame_equal(reloaded["current_df"], text_frame())
+    assert reloaded["filename"] == "b.csv"
+
+def test_health_reports_store_counters(client):
+    body = client.get("/health").json()
+    assert set(body["data_store"]) >= {"hits", "misses", "spills", "resident_bytes", "budget_bytes"}
+
+def test_commit_on_an_evicted_entry_is_published(catalog):
+    size = int(text_frame()["name"].memory_usage(deep=True, index=False))
+    store = DatasetStore(budget_bytes=int(size * 1.5), catalog=catalog)
+    first, second = uuid.uuid4().hex, uuid.uuid4().hex
+    store[first] = new_dataset(text_frame(), "a.csv")
+    entry = store[first]
+    # Another upload evicts the dataset while a request still holds it
+    store[second] = new_dataset(text_frame(), "b.csv")
+    assert store.stats()["spills"] == 1
+    assert commit_version(entry, working_copy(entry).drop(columns="name"), "drop name") == 1
+    assert catalog.version(first) == 1
+    reloaded = store[first]
+    assert reloaded is entry
+    assert list(reloaded["current_df"].columns) == ["value"] and reloaded["actions"] == ["drop name"]
+    store._drop(first)
+    assert list(store[first]["current_df"].columns) == ["value"]
+
+def test_commit_on_an_evicted_entry_behind_the_catalog_conflicts(catalog):
+    store = DatasetStore(catalog=catalog)
+    file_id = uuid.uuid4().hex
+    store[file_id] = new_dataset(text_frame(100), "a.csv")
+    stale = store[file_id]
+    store._drop(file_id)
+    fresh = store[file_id]
+    commit_version(fresh, working_copy(fresh), "first")
+    with pytest.raises(DatasetConflictError):
+        commit_version(stale, working_copy(stale).drop(columns="name"), "stale")
+    assert catalog.version(file_id) == 1 and store[file_id]["actions"] == ["first"]
+
+def test_resident_hits_skip_the_catalog_within_the_check_interval(catalog, monkeypatch):
+    store = DatasetStore(catalog=catalog, version_check_interval=60)
+    file_id = uuid.uuid4().hex
+    store[file_id] = new_dataset(text_frame(100), "a.csv")
+    calls = []
+    version = catalog.version
+    monkeypatch.setattr(catalog, "version", lambda fid: calls.append(fid) or version(fid))
+    for _ in range(5):
+        store[file_id]
+    assert calls == [] and store.stats()["hits"] == 5
+    store.version_check_interval = 0
+    store[file_id]
+    assert calls == [file_id]
+
+def test_snapshots_are_written_outside_the_store_lock(catalog, monkeypatch):
+    store = DatasetStore(catalog=catalog)
+    held = []
+    publish = catalog.publish
+
+    def checked_publish(*args, **kwargs):
+        # Another thread must be able to take the lock while the snapshot is written
+        result = []
+
+        def probe():
+            acquired = store._lock.acquire(blocking=False)
+            if acquired:
+                store._lock.release()
+            result.append(acquired)
+
+        thread = threading.Thread(target=probe)
+        thread.start()
+        thread.join()
+        held.append(not result[0])
+        return publish(*args, **kwargs)
+
+    monkeypatch.setattr(catalog, "publish", checked_publish)
+    file_id = uuid.uuid4().hex
+    store[file_id] = new_dataset(text_frame(100), "a.csv")
+    entry = store[file_id]
+    commit_version(entry, working_copy(entry), "edit")
+    assert held == [False, False]
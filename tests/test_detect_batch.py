@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from services import outlier_detection
+from services.outlier_detection import (block_columns, column_moments, column_quantiles, decode_mask,
+                                         detect_batch)
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    n = 4000
+    df = pd.DataFrame({"a": rng.normal(size=n), "b": rng.exponential(size=n), "c": rng.integers(0, 10, n),
+                       "label": rng.choice(["x", "y"], n)})
+    df.loc[::40, "a"] = np.nan
+    df.loc[7, "a"] = 25.0
+    return df
+
+def test_batch_matches_per_column_rules(frame):
+    results = detect_batch(frame, ["a", "b", "c"])
+    for col in ("a", "b", "c"):
+        values = frame[col]
+        q1, q3 = values.quantile([0.25, 0.75])
+        lower, upper = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        iqr = results[col]["iqr"]
+        assert iqr["lower_bound"] == pytest.approx(lower) and iqr["upper_bound"] == pytest.approx(upper)
+        expected = ((values < lower) | (values > upper)).to_numpy()
+        np.testing.assert_array_equal(decode_mask(iqr["mask"], len(frame)), expected)
+        z = (values - values.mean()) / values.std()
+        assert results[col]["zscore"]["count"] == int((z.abs() > 3).sum())
+    assert decode_mask(results["a"]["zscore"]["mask"], len(frame))[7]
+
+def test_detect_batch_endpoint_stores_a_detection(client, upload, frame):
+    file_id = upload(frame)["file_id"]
+    response = client.post("/api/outliers/detect_batch",
+                           json={"file_id": file_id, "methods": ["iqr"], "include_masks": False})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert list(body["columns"]) == ["a", "b", "c"]
+    assert "mask" not in body["columns"]["a"]["iqr"]
+    handled = client.post("/api/outliers/handle", json={"file_id": file_id, "action": "remove",
+                                                        "detection_id": body["detection_id"], "column": "a"})
+    assert handled.status_code == 200, handled.text
+    overview = client.get(f"/api/overview/{file_id}").json()
+    assert overview["shape"][0] == len(frame) - body["columns"]["a"]["iqr"]["count"]
+    bad = client.post("/api/outliers/detect_batch", json={"file_id": file_id, "columns": ["label"]})
+    assert bad.status_code == 400
+
+def test_block_width_follows_the_byte_budget(frame, monkeypatch):
+    assert block_columns(5_000_000, budget_bytes=64 << 20) == 1
+    assert block_columns(1000, budget_bytes=64 << 20) == 8388
+    wide = detect_batch(frame, ["a", "b", "c"])
+    monkeypatch.setattr(outlier_detection, "block_columns", lambda rows: 1)
+    assert detect_batch(frame, ["a", "b", "c"]) == wide
+
+def test_column_statistics_match_numpy():
+    block = np.asfortranarray(np.random.default_rng(2).normal(size=(101, 3)))
+    block[::7, 0] = np.nan
+    block[:, 2] = np.nan
+    quartiles = column_quantiles(block, (0.25, 0.75))
+    np.testing.assert_allclose(quartiles[:, :2], np.nanquantile(block[:, :2], (0.25, 0.75), axis=0))
+    assert np.isnan(quartiles[:, 2]).all()
+    mean, std = column_moments(block)
+    np.testing.assert_allclose(mean[:2], np.nanmean(block[:, :2], axis=0))
+    np.testing.assert_allclose(std[:2], np.nanstd(block[:, :2], axis=0, ddof=1))
+    assert np.isnan(mean[2]) and np.isnan(std[2])
@@ -0,0 +1,68 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+import pytest
+import services.detections as detections
+from state import data_store
+
+@pytest.fixture
+def dataset(upload):
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=1000)
+    values[[3, 500, 900]] = [25.0, -30.0, 40.0]
+    return upload(pd.DataFrame({"v": values, "w": rng.normal(size=1000)}))["file_id"]
+
+def _detect(client, file_id, **body):
+    response = client.post("/api/outliers/detect", json={"file_id": file_id, "column": "v", "method": "iqr", **body})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def _saved(file_id):
+    directory = os.path.join(data_store.catalog.directory(file_id), detections.DETECTIONS_DIR)
+    return sorted(os.listdir(directory))
+
+def test_detect_returns_counts_not_indices(client, dataset):
+    body = _detect(client, dataset, sample_size=2)
+    assert body["outlier_count"] >= 3
+    assert len(body["outlier_sample"]) == 2
+    assert "outlier_indices" not in body
+
+def test_handle_by_detection_id_after_memory_eviction(client, dataset, monkeypatch):
+    detection_id = _detect(client, dataset)["detection_id"]
+    # Another worker only has the saved file
+    monkeypatch.setattr(detections, "_detections", type(detections._detections)())
+    response = client.post("/api/outliers/handle",
+                           json={"file_id": dataset, "action": "remove", "detection_id": detection_id})
+    assert response.status_code == 200, response.text
+    assert 40.0 not in data_store[dataset]["current_df"]["v"].to_numpy()
+
+def test_stale_detection_is_409(client, dataset):
+    detection_id = _detect(client, dataset)["detection_id"]
+    client.post("/api/cleaning/remove_columns", json={"file_id": dataset, "columns": ["w"]})
+    response = client.post("/api/outliers/handle",
+                           json={"file_id": dataset, "action": "remove", "detection_id": detection_id})
+    assert response.status_code == 409
+
+def test_saved_detections_are_capped_per_dataset(client, dataset, monkeypatch):
+    monkeypatch.setattr(detections, "DETECTIONS_PER_DATASET", 3)
+    ids = []
+    for _ in range(3):
+        ids.append(_detect(client, dataset)["detection_id"])
+        time.sleep(0.01)
+    # Using the oldest one makes it the most recently used
+    assert detections.load_detection(dataset, ids[0], data_store.catalog.directory(dataset)) is not None
+    time.sleep(0.01)
+    for _ in range(2):
+        ids.append(_detect(client, dataset)["detection_id"])
+        time.sleep(0.01)
+    saved = _saved(dataset)
+    assert len(saved) == 3
+    kept = {name.split("-", 1)[1][:-len(".npz")] for name in saved}
+    assert kept == {ids[0], ids[3], ids[4]}
+
+def test_detections_of_older_versions_are_removed(client, dataset):
+    _detect(client, dataset)
+    client.post("/api/cleaning/remove_columns", json={"file_id": dataset, "columns": ["w"]})
+    _detect(client, dataset)
+    assert [name.split("-", 1)[0] for name in _saved(dataset)] == ["v1"]
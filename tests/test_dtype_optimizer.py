@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+from services.dtype_optimizer import fillna_compact, optimize_dtypes
+
+def test_optimize_dtypes_shrinks_safely_and_reports_memory():
+    n = 10_000
+    df = pd.DataFrame({"small": np.arange(n) % 100, "halves": np.arange(n) / 2,
+                       "precise": np.linspace(0, 1, n) + 1e-12, "city": ["Oslo", "Lima"] * (n // 2),
+                       "flag": [True, False] * (n // 2)})
+    optimized, report = optimize_dtypes(df, arrow_strings=False)
+    assert str(optimized["small"].dtype) == "int8"
+    assert str(optimized["halves"].dtype) == "float32"
+    # float32 would lose precision, so the column keeps float64
+    assert str(optimized["precise"].dtype) == "float64"
+    assert isinstance(optimized["city"].dtype, pd.CategoricalDtype)
+    assert optimized["flag"].dtype == bool
+    for col in df.columns:
+        assert (optimized[col].astype(df[col].dtype) == df[col]).all()
+    assert report["total_after"] < report["total_before"]
+    assert report["columns"]["small"] == {"before": n * 8, "after": n, "dtype": "int8"}
+
+def test_fillna_compact_keeps_compacted_dtypes():
+    city = pd.Series(["Oslo", None, "Lima"], dtype="category")
+    filled = fillna_compact(city, "Rome")
+    assert isinstance(filled.dtype, pd.CategoricalDtype)
+    assert filled.tolist() == ["Oslo", "Rome", "Lima"]
+    value = pd.Series([1.5, np.nan], dtype=np.float32)
+    assert fillna_compact(value, 2.0).dtype == np.float32
+    assert fillna_compact(value, pd.Series([0.0, 3.0])).tolist() == [1.5, 3.0]
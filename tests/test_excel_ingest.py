@@ -0,0 +1,39 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from services.excel_ingest import SheetNotFoundError, read_excel_spool
+
+@pytest.fixture
+def workbook() -> bytes:
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        pd.DataFrame({"a": [1, 2, 3], "b": ["x", None, "z"]}).to_excel(writer, sheet_name="first", index=False)
+        pd.DataFrame({"a": [4.5, np.nan], "b": ["u", "v"]}).to_excel(writer, sheet_name="second", index=False)
+    return buf.getvalue()
+
+def test_first_sheet_by_default(workbook, tmp_path):
+    df, stats = read_excel_spool(io.BytesIO(workbook), "book.xlsx", cache_dir=str(tmp_path))
+    assert stats["engine"] == "openpyxl-stream" and stats["sheets"] == ["first"]
+    assert df["a"].tolist() == [1, 2, 3]
+    assert df["b"].isna().tolist() == [False, True, False]
+
+def test_all_sheets_are_stacked_and_cached(workbook, tmp_path):
+    df, stats = read_excel_spool(io.BytesIO(workbook), "book.xlsx", sheets=["*"], cache_dir=str(tmp_path))
+    assert df["sheet"].tolist() == ["first"] * 3 + ["second"] * 2
+    assert df["a"].tolist()[:4] == [1, 2, 3, 4.5]
+    again, stats = read_excel_spool(io.BytesIO(workbook), "book.xlsx", sheets=["*"], cache_dir=str(tmp_path))
+    assert stats["cache_hit"] and stats["engine"] == "cache"
+    pd.testing.assert_frame_equal(again, df, check_categorical=False)
+
+def test_unknown_sheet(workbook, tmp_path):
+    with pytest.raises(SheetNotFoundError):
+        read_excel_spool(io.BytesIO(workbook), "book.xlsx", sheets=["third"], cache_dir=str(tmp_path))
+
+def test_upload_selects_sheets(client, workbook):
+    files = {"file": ("book.xlsx", workbook, "application/vnd.ms-excel")}
+    response = client.post("/api/upload", params={"sheets": "second"}, files=files)
+    assert response.status_code == 200, response.text
+    assert response.json()["shape"] == [2, 2]
+    response = client.post("/api/upload", params={"sheets": "third"}, files=files)
+    assert response.status_code == 400
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from services.imputation import apply_fills, fill_plan, fill_values
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({"g": ["a", "a", "b", "b", "b"], "x": [1.0, None, 10.0, None, 20.0],
+                         "n": [1, 2, None, 4, 4], "c": ["u", None, "v", "v", None]})
+
+def nulls(df):
+    return df.isna().sum().to_dict()
+
+def test_plan_from_columns_and_rules(frame):
+    plan = fill_plan(frame, nulls(frame), {"x": "median"}, {"numeric": "mean", "categorical": "mode"})
+    assert plan == {"x": "median", "n": "mean", "c": "mode"}
+    with pytest.raises(ValueError):
+        fill_plan(frame, nulls(frame), {"c": "mean"})
+    with pytest.raises(ValueError):
+        fill_plan(frame, nulls(frame), rules={"text": "mode"})
+
+def test_fills_in_one_pass(frame):
+    plan = {"x": "median", "n": "mean", "c": "mode"}
+    values, grouped = fill_values(frame, plan)
+    assert values == {"x": 10.0, "n": 2.75, "c": "v"} and not grouped
+    filled = apply_fills(frame, values, nulls(frame))
+    assert filled == {"x": 2, "n": 1, "c": 2}
+    assert frame["x"].tolist() == [1.0, 10.0, 10.0, 10.0, 20.0]
+
+def test_group_values_come_first(frame):
+    frame.loc[len(frame)] = ["c", None, 0, "w"]
+    values, grouped = fill_values(frame, {"x": "mean", "c": "mode"}, group_by=["g"])
+    apply_fills(frame, values, nulls(frame), grouped)
+    # Group c has no x of its own and falls back to the column mean
+    assert frame["x"].tolist() == [1.0, 1.0, 10.0, 15.0, 20.0, pytest.approx(31 / 3)]
+    assert frame["c"].tolist() == ["u", "u", "v", "v", "v", "w"]
+
+def test_fill_missing_batch_endpoint(client, upload, frame):
+    file_id = upload(frame)["file_id"]
+    response = client.post("/api/cleaning/fill_missing_batch",
+                           json={"file_id": file_id, "rules": {"numeric": "median"},
+                                 "columns": {"c": "custom"}, "custom_values": {"c": "none"}})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["methods"] == {"x": "median", "n": "median", "c": "custom"}
+    assert body["filled"] == {"x": 2, "n": 1, "c": 2}
+    assert set(body["null_counts"].values()) == {0} and body["version"] == 1
+    response = client.post("/api/cleaning/fill_missing_batch", json={"file_id": file_id, "columns": {"c": "custom"}})
+    assert response.status_code == 200 and response.json()["action"] == "No missing values to fill"
+    response = client.post("/api/cleaning/fill_missing_batch", json={"file_id": file_id, "group_by": ["nope"],
+                                                                     "rules": {"numeric": "mean"}})
+    assert response.status_code == 400
@@ -0,0 +1,51 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.responses import StreamingResponse
+from services import json_encoding
+from services.json_encoding import dumps, iter_json, json_response, jsonable
+
+def payload():
+    return {
+        "floats": np.array([1.5, np.nan, np.inf, -np.inf]),
+        "ints": pd.Series([1, 2], dtype=np.int8),
+        "scalar": np.float32(0.5),
+        "missing": [float("nan"), pd.NaT, None],
+        "when": pd.Timestamp("2024-01-02 03:04:05"),
+        "frame": pd.DataFrame({"a": [1.0, np.nan], "t": pd.to_datetime(["2024-01-01", None]),
+                               "c": pd.Categorical(["x", None])}),
+        np.int64(3): "numpy key",
+    }
+
+EXPECTED = {
+    "floats": [1.5, None, None, None],
+    "ints": [1, 2],
+    "scalar": 0.5,
+    "missing": [None, None, None],
+    "when": "2024-01-02T03:04:05",
+    "frame": [{"a": 1.0, "t": "2024-01-01T00:00:00", "c": "x"}, {"a": None, "t": None, "c": None}],
+    "3": "numpy key",
+}
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_is_nan_safe(monkeypatch, use_orjson):
+    if use_orjson and not json_encoding.HAS_ORJSON:
+        pytest.skip("orjson is not installed")
+    monkeypatch.setattr(json_encoding, "HAS_ORJSON", use_orjson)
+    assert json.loads(dumps(payload())) == EXPECTED
+
+def test_jsonable_matches_dumps():
+    assert json.loads(json.dumps(jsonable(payload()))) == EXPECTED
+
+def test_streamed_encoding_matches_dumps():
+    values = {"z": np.where(np.arange(10_000) % 7 == 0, np.nan, np.arange(10_000) / 3),
+              "rows": pd.DataFrame({"a": np.arange(1000), "b": np.arange(1000) / 2})}
+    fragments = list(iter_json(values, chunk_values=256))
+    assert len(fragments) > 10
+    assert json.loads(b"".join(fragments)) == json.loads(dumps(values))
+
+def test_large_payloads_are_streamed(monkeypatch):
+    monkeypatch.setattr(json_encoding, "JSON_STREAM_MIN_VALUES", 100)
+    assert isinstance(json_response({"z": np.zeros(1000)}), StreamingResponse)
+    assert not isinstance(json_response({"z": np.zeros(10)}), StreamingResponse)
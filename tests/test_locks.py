@@ -0,0 +1,38 @@
+import asyncio
+from services.executors import run_cpu
+from services.locks import AsyncRWLock, dataset_lock
+
+def test_readers_share_and_writers_exclude():
+    async def scenario():
+        lock, events = AsyncRWLock(), []
+
+        async def read(name, seconds):
+            async with lock.reader():
+                events.append(f"{name} in")
+                await asyncio.sleep(seconds)
+                events.append(f"{name} out")
+
+        async def write():
+            async with lock.writer():
+                events.append("writer in")
+                events.append("writer out")
+
+        first = asyncio.create_task(read("r1", 0.05))
+        await asyncio.sleep(0)
+        writer = asyncio.create_task(write())
+        await asyncio.sleep(0)
+        # Queued behind the waiting writer rather than joining r1
+        late = asyncio.create_task(read("r2", 0))
+        await asyncio.gather(first, writer, late)
+        return events
+
+    assert asyncio.run(scenario()) == ["r1 in", "r1 out", "writer in", "writer out", "r2 in", "r2 out"]
+
+def test_dataset_lock_is_shared_per_file_and_cpu_work_runs_off_loop():
+    async def scenario():
+        lock = dataset_lock("a")
+        assert dataset_lock("a") is lock and dataset_lock("b") is not lock
+        async with lock.reader():
+            return await run_cpu(sum, range(10))
+
+    assert asyncio.run(scenario()) == 45
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+from services.outlier_detection import grouped_outliers, isolation_forest
+
+@pytest.fixture
+def devices():
+    rng = np.random.default_rng(7)
+    frames = []
+    for device, level in (("a", 0.0), ("b", 100.0), ("c", 1000.0)):
+        values = rng.normal(level, 1.0, 300)
+        frames.append(pd.DataFrame({"device": device, "value": values}))
+    df = pd.concat(frames, ignore_index=True)
+    df.loc[10, "value"] = 25.0  # an anomaly within device a only
+    # A device with a single reading cannot have z-score bounds
+    return pd.concat([df, pd.DataFrame({"device": ["d"], "value": [5.0]})], ignore_index=True)
+
+def test_grouped_bounds_flag_anomalies_within_each_group(devices):
+    result = grouped_outliers(devices, "value", "zscore", ["device"])
+    assert result["mask"][10]
+    # Global bounds would flag nothing in a: 25 is well inside [0, 1000]
+    assert not grouped_outliers(devices, "value", "zscore")["mask"][10]
+
+def test_grouped_summary_lists_every_group(devices):
+    groups = {g["group"][0]: g for g in grouped_outliers(devices, "value", "iqr", ["device"])["groups"]}
+    assert set(groups) == {"a", "b", "c", "d"}
+    assert groups["a"]["outliers"] >= 1
+    assert groups["b"]["rows"] == groups["b"]["evaluated"] == 300
+    assert groups["b"]["lower_bound"] < 100 < groups["b"]["upper_bound"]
+    # IQR of a single value is zero, so d is evaluated and not flagged
+    assert groups["d"]["evaluated"] == 1 and groups["d"]["outliers"] == 0
+
+def test_grouped_summary_marks_groups_too_small_for_the_method(devices):
+    groups = {g["group"][0]: g for g in grouped_outliers(devices, "value", "zscore", ["device"])["groups"]}
+    assert groups["d"] == {"group": ["d"], "rows": 1, "values": 1, "evaluated": 0, "outliers": 0,
+                           "lower_bound": None, "upper_bound": None}
+
+def test_rolling_mad_has_no_group_bounds(devices):
+    result = grouped_outliers(devices, "value", "mad", ["device"], window=50)
+    assert len(result["mask"]) == len(devices)
+    assert all(g["lower_bound"] is None for g in result["groups"])
+
+def test_detect_grouped_over_http(client, upload, devices):
+    file_id = upload(devices)["file_id"]
+    response = client.post("/api/outliers/detect", json={"file_id": file_id, "column": "value",
+                                                         "method": "mad", "group_by": ["device"]})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert len(body["groups"]) == 4
+    assert body["lower_bound"] is None
+
+def test_detect_grouped_rejects_approx(client, upload, devices):
+    file_id = upload(devices)["file_id"]
+    response = client.post("/api/outliers/detect", json={"file_id": file_id, "column": "value", "method": "iqr",
+                                                         "group_by": ["device"], "approx": True})
+    assert response.status_code == 400
+
+def test_isolation_forest_default_flags_a_small_fraction():
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({"x": rng.normal(size=20_000), "y": rng.normal(size=20_000)})
+    df.loc[:9, ["x", "y"]] = 12.0
+    forest = isolation_forest(df, ["x", "y"])
+    assert forest["contamination"] == 0.01
+    assert forest["mask"].mean() == pytest.approx(0.01, abs=0.005)
+    assert forest["mask"][:10].all()
+
+def test_detect_isolation_forest_reports_threshold_and_reuses_model(client, upload):
+    rng = np.random.default_rng(4)
+    file_id = upload(pd.DataFrame({"x": rng.normal(size=5000), "y": rng.normal(size=5000)}))["file_id"]
+    body = {"file_id": file_id, "method": "isolation_forest", "columns": ["x", "y"], "contamination": 0.02}
+    first = client.post("/api/outliers/detect", json=body).json()
+    assert first["contamination"] == 0.02
+    assert first["threshold"] < 0
+    assert first["outlier_count"] == pytest.approx(100, abs=30)
+    again = client.post("/api/outliers/detect", json=body).json()
+    assert again["cached"] and again["outlier_count"] == first["outlier_count"]
+    invalid = client.post("/api/outliers/detect", json={**body, "contamination": 0.9})
+    assert invalid.status_code == 422
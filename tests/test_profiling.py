@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+from services.dataset import new_dataset
+from services.profiling import compute_profile, profile_column
+from services.snapshots import write_snapshot
+
+def frame():
+    rng = np.random.default_rng(0)
+    n = 5000
+    return pd.DataFrame({"x": rng.normal(size=n), "k": rng.integers(-3, 4, n), "c": rng.choice(["a", "b"], n)})
+
+def test_numeric_column_profile():
+    series = pd.Series([0.0, -1.0, 2.0, np.nan, 2.0], name="v")
+    profile = profile_column(series, bins=4)
+    assert (profile["count"], profile["null_count"], profile["cardinality"]) == (4, 1, 3)
+    assert (profile["zeros"], profile["negatives"]) == (1, 1)
+    assert profile["top"][0] == {"value": 2.0, "count": 2}
+    assert profile["quantiles"]["0.5"] == 1.0
+    assert sum(profile["histogram"]["counts"]) == 4
+
+def test_parallel_profile_matches_serial(tmp_path):
+    df = frame()
+    path, _ = write_snapshot(str(tmp_path), new_dataset(df, "data.csv"), 0)
+    serial = compute_profile(df, workers=1)
+    parallel = compute_profile(df, path, workers=2, min_parallel_cells=0)
+    assert not serial["parallel"] and parallel["parallel"]
+    assert parallel["columns"] == serial["columns"]
+
+def test_profile_endpoint_caches_per_version(client, upload):
+    file_id = upload(frame())["file_id"]
+    first = client.get(f"/api/overview/{file_id}/profile").json()
+    assert not first["cached"] and [c["name"] for c in first["columns"]] == ["x", "k", "c"]
+    again = client.get(f"/api/overview/{file_id}/profile").json()
+    assert again["cached"] and again["columns"] == first["columns"]
+    approx = client.get(f"/api/overview/{file_id}/profile", params={"approx": "true"}).json()
+    assert approx["approximate"] and approx["rows"] == 5000
@@ -0,0 +1,44 @@
+import io
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from services.dtype_optimizer import HAS_PYARROW
+
+@pytest.fixture
+def dataset(upload):
+    df = pd.DataFrame({"id": np.arange(50), "score": np.r_[np.arange(49, 0, -1), np.nan],
+                       "name": [f"n{i}" for i in range(50)]})
+    return upload(df)["file_id"]
+
+def records(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_window_with_projection(client, dataset):
+    response = client.get(f"/api/overview/{dataset}/rows",
+                          params={"offset": 10, "limit": 5, "columns": ["name", "id"], "index": "true"})
+    assert response.status_code == 200, response.text
+    assert response.headers["x-total-rows"] == "50" and response.headers["x-row-count"] == "5"
+    rows = records(response)
+    assert rows[0] == {"_index": 10, "name": "n10", "id": 10}
+    assert [row["id"] for row in rows] == list(range(10, 15))
+
+def test_sorted_pages_put_missing_values_last(client, dataset):
+    url = f"/api/overview/{dataset}/rows"
+    first = records(client.get(url, params={"sort": "score", "limit": 3}))
+    assert [row["score"] for row in first] == [1.0, 2.0, 3.0]
+    last = records(client.get(url, params={"sort": "-score", "offset": 48, "limit": 5}))
+    assert [row["score"] for row in last] == [1.0, None]
+
+def test_unknown_columns_are_rejected(client, dataset):
+    url = f"/api/overview/{dataset}/rows"
+    assert client.get(url, params={"columns": ["nope"]}).status_code == 400
+    assert client.get(url, params={"sort": "nope"}).status_code == 400
+    assert client.get(url, params={"limit": 0}).status_code == 422
+
+@pytest.mark.skipif(not HAS_PYARROW, reason="pyarrow is not installed")
+def test_arrow_stream(client, dataset):
+    import pyarrow as pa
+    response = client.get(f"/api/overview/{dataset}/rows", params={"format": "arrow", "limit": 20})
+    table = pa.ipc.open_stream(io.BytesIO(response.content)).read_all()
+    assert table.num_rows == 20 and table.column_names == ["id", "score", "name"]
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from services.dataset import commit_version, new_dataset, working_copy
+from services.sketches import SKETCHES_KEY, ColumnSketch, build_sketches, column_sketches
+from services.snapshots import read_snapshot, write_snapshot
+
+def test_sketch_estimates_stay_within_their_error_bounds():
+    rng = np.random.default_rng(0)
+    n = 200_000
+    values = pd.Series(np.where(rng.random(n) < 0.1, 7.0, rng.normal(size=n)))
+    values[::1000] = np.nan
+    sketch = build_sketches(pd.DataFrame({"v": values}), chunk_rows=1 << 14)["v"]
+    summary = sketch.summary((0.25, 0.5, 0.75))
+    assert summary["null_count"] == 200 and summary["count"] == n - 200
+    present = values.dropna().sort_values().to_numpy()
+    for q, estimate in summary["quantiles"].items():
+        rank = np.searchsorted(present, estimate) / len(present)
+        assert abs(rank - float(q)) <= summary["error"]["quantile_rank"]
+    exact = values.nunique()
+    assert abs(summary["cardinality"] - exact) <= 3 * summary["error"]["cardinality_relative"] * exact
+    top = summary["top"][0]
+    assert top["value"] == 7.0
+    assert 0 <= top["count"] - (values == 7.0).sum() <= summary["error"]["top_count_absolute"]
+
+def test_merged_sketches_match_one_pass():
+    series = pd.Series(np.arange(10_000) % 97, dtype=np.int64)
+    left, right = ColumnSketch.for_series(series), ColumnSketch.for_series(series)
+    left.update(series.iloc[:5000])
+    right.update(series.iloc[5000:])
+    left.merge(right)
+    assert left.rows == 10_000
+    assert left.summary((0.5,))["cardinality"] == 97
+    assert left.summary((0.5,), top_k=1)["top"][0]["count"] >= 103
+
+def test_unchanged_columns_keep_their_sketch_files(tmp_path):
+    directory = str(tmp_path)
+    entry = new_dataset(pd.DataFrame({"a": np.arange(1000.0), "b": np.arange(1000) % 5}), "data.csv")
+    column_sketches(entry)
+    first, _ = write_snapshot(directory, entry, 0, object_keys=(SKETCHES_KEY,))
+    entry = read_snapshot(first)
+    entry.update(actions=[], version=0)
+    df = working_copy(entry)
+    df["a"] = df["a"] * 2
+    commit_version(entry, df, "double a", touched=["a"])
+    assert list(entry[SKETCHES_KEY]) == ["b"]
+    column_sketches(entry)
+    _, new_files = write_snapshot(directory, entry, 1, object_keys=(SKETCHES_KEY,))
+    # The new a column and its sketch; b's sketch file is referenced, not rewritten
+    assert len(new_files) == 2
+    assert read_snapshot(first)[SKETCHES_KEY]["b"].rows == 1000
+
+def test_approx_iqr_over_http(client, upload):
+    rng = np.random.default_rng(1)
+    values = np.r_[rng.normal(size=20_000), [50.0, -50.0]]
+    file_id = upload(pd.DataFrame({"v": values}))["file_id"]
+    exact = client.post("/api/outliers/detect", json={"file_id": file_id, "column": "v", "method": "iqr"}).json()
+    approx = client.post("/api/outliers/detect",
+                         json={"file_id": file_id, "column": "v", "method": "iqr", "approx": True}).json()
+    assert approx["approximate"] and 0 < approx["rank_error"] < 0.05
+    assert abs(approx["outlier_count"] - exact["outlier_count"]) <= 0.01 * len(values)
@@ -0,0 +1,42 @@
+import os
+import numpy as np
+import pandas as pd
+from services.dataset import is_memory_mapped, new_dataset
+from services.snapshots import read_columns, read_snapshot, snapshot_files, write_snapshot
+
+def frame():
+    n = 1000
+    return pd.DataFrame({"x": np.arange(n, dtype=np.float64), "city": pd.Categorical(["a", "b"] * (n // 2)),
+                         "note": [f"n{i}" for i in range(n)]})
+
+def test_snapshot_round_trip_maps_numeric_columns(tmp_path):
+    entry = new_dataset(frame(), "data.csv", memory={"total_after": 1})
+    path, new_files = write_snapshot(str(tmp_path), entry, 0, meta_keys=("memory",))
+    loaded = read_snapshot(path)
+    pd.testing.assert_frame_equal(loaded["current_df"], frame(), check_categorical=False)
+    assert loaded["memory"] == {"total_after": 1}
+    assert is_memory_mapped(loaded["current_df"]["x"])
+    assert is_memory_mapped(loaded["current_df"]["city"])
+    assert not is_memory_mapped(loaded["current_df"]["note"])
+    # Columns shared by original_df and current_df are written once
+    assert len(new_files) == 4
+    assert snapshot_files(path) == set(new_files) | {path}
+
+def test_new_version_only_writes_changed_columns(tmp_path):
+    directory = str(tmp_path)
+    path, _ = write_snapshot(directory, new_dataset(frame(), "data.csv"), 0)
+    entry = read_snapshot(path)
+    df = entry["current_df"].copy(deep=False)
+    df["x"] = df["x"] * 2
+    entry["current_df"] = df
+    second, new_files = write_snapshot(directory, entry, 1)
+    assert [os.path.splitext(name)[1] for name in new_files] == [".npy"]
+    # original_df still holds the old x, so every file of version 0 is reused
+    assert snapshot_files(second) - {second} == snapshot_files(path) - {path} | set(new_files)
+    assert read_snapshot(second)["current_df"]["x"].iloc[3] == 6.0
+
+def test_read_columns_loads_a_projection(tmp_path):
+    path, _ = write_snapshot(str(tmp_path), new_dataset(frame(), "data.csv"), 0)
+    projected = read_columns(path, [2, 0])
+    assert list(projected.columns) == ["note", "x"]
+    pd.testing.assert_frame_equal(projected, frame()[["note", "x"]])
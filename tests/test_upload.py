@@ -0,0 +1,104 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from tests.conftest import csv_bytes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Peak RSS growth of one ingest, measured in a fresh interpreter so earlier tests don't
+# count; "read_csv" is the floor: pandas parsing the same file straight from disk
+_RSS_SCRIPT = """
+import asyncio, json, re, sys
+import pandas as pd
+from starlette.datastructures import UploadFile
+from routers.file_upload import _ingest_upload
+from services.file_handling import spool_upload
+
+def status(field):
+    with open("/proc/self/status") as f:
+        return int(re.search(field + r":\\s+(\\d+)", f.read()).group(1)) * 1024
+
+if __name__ == "__main__":
+    path, mode = sys.argv[1], sys.argv[2]
+    # Reset the high-water mark so import-time peaks don't hide the ingest
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    base = status("VmRSS")
+    if mode == "read_csv":
+        df = pd.read_csv(path)
+    else:
+        with open(path, "rb") as f:
+            spool = asyncio.run(spool_upload(UploadFile(f, filename="big.csv")))
+        with spool:
+            _, df, *_ = _ingest_upload(spool, "big.csv")
+    print(json.dumps({"growth": status("VmHWM") - base, "rows": len(df)}))
+"""
+
+def _peak_growth(path, mode, tmp_path):
+    env = dict(os.environ, PYTHONPATH=ROOT, EDA_PROCESS_POOL_WORKERS="1",
+               EDA_DATABASE_URL=f"sqlite:///{tmp_path / 'rss.db'}", EDA_DATA_DIR=str(tmp_path / "data"))
+    result = subprocess.run([sys.executable, "-c", _RSS_SCRIPT, str(path), mode], env=env, cwd=ROOT,
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_upload_returns_schema_and_head(upload):
+    df = pd.DataFrame({"a": [1, 2, None], "b": ["x", "y", "z"]})
+    body = upload(df)
+    assert body["shape"] == [3, 2]
+    assert body["columns"] == ["a", "b"]
+    assert body["null_counts"] == {"a": 1, "b": 0}
+    assert len(body["head"]) == 3
+
+def test_upload_detects_encoding_from_prefix(client):
+    content = "name,city\n" + "".join(f"row{i},Zürich\n" for i in range(5000))
+    response = client.post("/api/upload", files={"file": ("latin.csv", content.encode("latin-1"), "text/csv")})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["shape"] == [5000, 2]
+    assert body["head"][0]["city"] == "Zürich"
+
+def test_upload_rejects_unsupported_type(client):
+    response = client.post("/api/upload", files={"file": ("data.json", b"{}", "application/json")})
+    assert response.status_code == 400
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads peak RSS from /proc")
+def test_upload_peak_rss_stays_near_parse_cost(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 1_000_000
+    path = tmp_path / "big.csv"
+    pd.DataFrame({"a": rng.normal(size=n), "b": rng.integers(0, 1000, n),
+                  "c": rng.integers(0, 5, n), "d": rng.normal(size=n)}).to_csv(path, index=False)
+    size = path.stat().st_size
+
+    floor = _peak_growth(path, "read_csv", tmp_path)
+    ingest = _peak_growth(path, "upload", tmp_path)
+    assert ingest["rows"] == n
+    # Buffering the upload would add several copies of the file on top of parsing it;
+    # spooling, dtype compaction, sketches and the snapshot stay under one copy
+    assert ingest["growth"] <= floor["growth"] + size, (ingest, floor, size)
+
+def test_background_upload_reports_progress_until_done(client):
+    df = pd.DataFrame({"a": np.arange(5000), "b": ["x", "y"] * 2500})
+    content = csv_bytes(df)
+    response = client.post("/api/upload", params={"background": "true"},
+                           files={"file": ("jobs.csv", content, "text/csv")})
+    assert response.status_code == 202, response.text
+    status_url = response.json()["status_url"]
+    deadline = time.monotonic() + 60
+    while True:
+        job = client.get(status_url).json()
+        if job["status"] in ("completed", "failed") or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert job["status"] == "completed", job
+    assert job["bytes_read"] == job["bytes_total"] == len(content) and job["progress"] == 1
+    assert job["result"]["shape"] == [5000, 2]
+    overview = client.get(f"/api/overview/{job['file_id']}")
+    assert overview.status_code == 200
+    assert client.get("/api/upload/jobs/unknown").status_code == 404
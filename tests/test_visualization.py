@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+@pytest.fixture
+def dataset(upload):
+    rng = np.random.default_rng(0)
+    n = 2000
+    df = pd.DataFrame({"g": rng.choice(["a", "b", "c"], n), "x": rng.normal(size=n),
+                       "y": rng.normal(size=n), "t": np.arange(n)})
+    df.loc[::50, "x"] = np.nan
+    return upload(df)["file_id"]
+
+def test_get_chart_without_optional_columns(client, dataset):
+    params = {"file_id": dataset, "chart_type": "histogram", "x_col": "x"}
+    response = client.get("/api/visualization/generate", params=params)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "image/png"
+    assert response.content.startswith(b"\x89PNG")
+
+def test_get_chart_revalidates_with_etag(client, dataset):
+    params = {"file_id": dataset, "chart_type": "box", "x_col": "y"}
+    first = client.get("/api/visualization/generate", params=params)
+    etag = first.headers["etag"]
+    again = client.get("/api/visualization/generate", params=params, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    # POST and GET share one cache entry and ETag
+    posted = client.post("/api/visualization/generate", json=params)
+    assert posted.headers["etag"] == etag
+    assert posted.content == first.content
+
+def test_chart_etag_changes_with_dataset_version(client, dataset):
+    params = {"file_id": dataset, "chart_type": "histogram", "x_col": "x"}
+    etag = client.get("/api/visualization/generate", params=params).headers["etag"]
+    filled = client.post("/api/cleaning/fill_missing", json={"file_id": dataset, "column": "x", "method": "mean"})
+    assert filled.status_code == 200, filled.text
+    response = client.get("/api/visualization/generate", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.headers["x-dataset-version"] == "1"
+
+def test_chart_rejects_unknown_column_and_type(client, dataset):
+    response = client.post("/api/visualization/generate",
+                           json={"file_id": dataset, "chart_type": "histogram", "x_col": "nope"})
+    assert response.status_code == 400
+    response = client.post("/api/visualization/generate",
+                           json={"file_id": dataset, "chart_type": "pie", "x_col": "x"})
+    assert response.status_code == 400
+
+def test_chart_data_returns_aggregates(client, dataset):
+    response = client.post("/api/visualization/data", json={"file_id": dataset, "chart_type": "histogram",
+                                                           "x_col": "x"})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["kind"] == "histogram" and body["reduction"] is None
+    assert len(body["edges"]) == len(body["series"][0]["counts"]) + 1
+    assert sum(body["series"][0]["counts"]) == 2000 - 40
+
+    params = {"file_id": dataset, "chart_type": "box", "x_col": "g", "y_col": "y"}
+    response = client.post("/api/visualization/data", json=params)
+    boxes = response.json()["boxes"]
+    assert [box["category"] for box in boxes] == ["a", "b", "c"]
+    assert sum(box["count"] for box in boxes) == 2000
+    again = client.post("/api/visualization/data", json=params, headers={"If-None-Match": response.headers["etag"]})
+    assert again.status_code == 304
+
+def test_chart_data_rejects_charts_it_cannot_aggregate(client, dataset):
+    response = client.post("/api/visualization/data", json={"file_id": dataset, "chart_type": "line", "x_col": "t"})
+    assert response.status_code == 400
+    response = client.post("/api/visualization/data", json={"file_id": dataset, "chart_type": "bar", "x_col": "g",
+                                                           "y_col": "g"})
+    assert response.status_code == 400
@@ -1,30 +1,18 @@
 # You can add any shared utility functions here
-import math
 import pandas as pd
-from typing import Any, Union, Dict, List
-
-def sanitize_value(value: Any) -> Any:
-    """Replace NaN/Inf values with None for JSON compatibility"""
-    if isinstance(value, float):
-        if math.isnan(value) or math.isinf(value):
-            return None
-    return value
+from typing import Union, Dict, List
+from services.json_encoding import jsonable
 
 def sanitize_dict(data: Union[Dict, List]) -> Union[Dict, List]:
-    """Recursively sanitize a dictionary or list"""
-    if isinstance(data, dict):
-        return {k: sanitize_dict(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [sanitize_dict(item) for item in data]
-    else:
-        return sanitize_value(data)
+    """JSON-safe copy of data: NaN/Inf become None, numpy/pandas values plain Python"""
+    return jsonable(data)
 
 def safe_convert_df(df: pd.DataFrame) -> Dict:
     """Safely convert DataFrame to JSON-serializable format"""
     return {
         "columns": list(df.columns),
-        "dtypes": sanitize_dict(df.dtypes.astype(str).to_dict()),
-        "null_counts": sanitize_dict(df.isnull().sum().to_dict()),
-        "head": sanitize_dict(df.head(20).to_dict(orient="records")),
+        "dtypes": df.dtypes.astype(str).to_dict(),
+        "null_counts": jsonable(df.isnull().sum().to_dict()),
+        "head": jsonable(df.head(20)),
         "shape": list(df.shape)
     }